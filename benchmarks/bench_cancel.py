@@ -0,0 +1,80 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from cancel import CancellationToken
+from generator import generate_program
+from pipeline import CompilerPipeline
+
+PHASES = ('lexer', 'preprocessor', 'parser', 'semantic', 'codegen')
+
+
+def best_of(runs, func):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def cancel_latency(pipeline, source, phase):
+    # Cancels from another thread as soon as `phase` starts and returns the
+    # milliseconds until the compile gave up
+    token = CancellationToken()
+    enter = token.enter
+    cancelled_at = []
+
+    def canceller():
+        cancelled_at.append(time.perf_counter())
+        token.cancel()
+
+    def watch(name):
+        enter(name)
+        if name == phase:
+            threading.Thread(target=canceller).start()
+
+    token.enter = watch
+    result = pipeline.compile_source(source, cancel=token)
+    stopped = time.perf_counter()
+    if not result.aborted:
+        return None, result
+    return (stopped - cancelled_at[0]) * 1000, result
+
+
+def main():
+    source = generate_program(256 * 1024)
+    pipeline = CompilerPipeline()
+    print(f"{len(source):,} byte program")
+
+    budgeted = CompilerPipeline(budget=3600)
+    unchecked, checked = [], []
+    # Interleaved so drift affects both the same way
+    for _ in range(3):
+        unchecked.append(best_of(1, lambda: pipeline.compile_source(source)))
+        checked.append(best_of(1, lambda: budgeted.compile_source(source)))
+    unchecked, checked = min(unchecked), min(checked)
+    print(f"compile without a token {unchecked:.3f}s, with budget checks {checked:.3f}s "
+          f"({checked / unchecked - 1:+.1%})\n")
+
+    print(f"{'phase':<14}{'cancel latency':>16}")
+    worst = 0.0
+    for phase in PHASES:
+        latency, result = cancel_latency(pipeline, source, phase)
+        if latency is None:
+            print(f"{phase:<14}{'finished first':>16}")
+            continue
+        worst = max(worst, latency)
+        # A phase that ends before the cancelling thread runs passes the
+        # abort on to the next one
+        stopped_in = result.aborted.split(" in phase ")[1].split()[0]
+        print(f"{phase:<14}{latency:>14.1f}ms" + (f"  (stopped in {stopped_in})" if stopped_in != phase else ""))
+    print(f"\nworst case {worst:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from bench_vm import arithmetic_program
+from bytecode import BytecodeCompiler
+from code_gen import CodeGenerator
+from generator import generate_program
+from lexer import LexicalAnalyzer
+from native import NativeRunner, ToolchainError
+from parser import SyntaxParser
+from symbol_table import SymbolTable
+from vm import VirtualMachine
+
+REWRITES = ('common-subexpression', 'reload')
+
+
+def called_program(size, seed=1):
+    # A generated program whose main calls every function, so the output
+    # covers all of them
+    source = generate_program(size, seed)
+    ast = parse(source)
+    calls = [f"    cout << {node[2]}({', '.join(str(3 + i) for i in range(len(node[3])))}) << endl;"
+             for node in ast if node[0] == 'function' and node[2] != 'main']
+    source = source[:source.rindex("int main()")]
+    return source + "int main() {\n" + "\n".join(calls) + "\n    return 0;\n}\n"
+
+
+def formula_program(statements, seed=1):
+    # Formulas over a few variables that share subexpressions, like
+    # distances and polynomials, inside a loop and across if/else arms
+    rng = random.Random(seed)
+    names = ['x', 'y', 'z', 'w']
+    shared = [f"({a} {op} {b})" for a in names for b in names if a < b for op in ('+', '-', '*')]
+    lines = ["int main() {", "    int x = 3;", "    int y = 7;", "    int z = 11;", "    int w = 2;",
+             "    int acc = 0;", "    for (int i = 0; i < 100; i++) {"]
+
+    def formula():
+        a, b = rng.sample(shared, 2)
+        return rng.choice([f"{a} * {a} + {b} * {b}", f"({a} + {b}) * ({a} - {b})",
+                           f"{a} * {b} + {a}", f"({a} * {b}) % 1009 + ({b} * {a}) % 1009"])
+
+    for _ in range(statements):
+        roll = rng.random()
+        if roll < 0.6:
+            lines.append(f"        acc = (acc + {formula()}) % 1000003;")
+        elif roll < 0.8:
+            a, b = rng.sample(shared, 2)
+            lines.append(f"        if ({a} > {b}) {{ acc = (acc + {a} * 3) % 1000003; }}"
+                         f" else {{ acc = (acc + {b} * {a}) % 1000003; }}")
+        else:
+            lines.append(f"        {rng.choice(names)} = (i + {formula()}) % 100;")
+    lines += ["    }", "    cout << acc << \" \" << x << \" \" << y << endl;", "    return 0;", "}"]
+    return "\n".join(lines)
+
+
+def parse(source):
+    symbol_table = SymbolTable()
+    tokens = LexicalAnalyzer(symbol_table).tokenize(source)
+    parser = SyntaxParser(symbol_table)
+    ast = parser.parse(tokens)
+    assert ast is not None, parser.errors
+    return ast
+
+
+def main():
+    runner = NativeRunner()
+    native = True
+    workloads = [(f"generated {size // 1024}KB", called_program(size)) for size in (16 * 1024, 64 * 1024)]
+    workloads += [(f"arithmetic x{statements}", arithmetic_program(statements)) for statements in (1000, 10000)]
+    workloads += [(f"formulas x{statements}", formula_program(statements)) for statements in (100, 1000)]
+    print(f"{'workload':<22}{'before':>9}{'after':>9}{'saved':>8}  rewrites")
+    for name, source in workloads:
+        ast = parse(source)
+        vm = VirtualMachine()
+        vm.run(BytecodeCompiler().compile(ast))
+        expected = vm.get_output()
+
+        counts = []
+        for value_numbering in (False, True):
+            codegen = CodeGenerator(None, value_numbering=value_numbering)
+            assembly = codegen.generate(ast)
+            counts.append(codegen.instruction_count)
+            if native:
+                try:
+                    result = runner.run(assembly)
+                    assert result.stdout == expected, (name, value_numbering)
+                except ToolchainError as e:
+                    print(f"native runs skipped: {e}")
+                    native = False
+        before, after = counts
+        rewrites = ", ".join(f"{rule} {codegen.peephole.stats[rule]}" for rule in REWRITES
+                             if codegen.peephole.stats[rule])
+        print(f"{name:<22}{before:>9}{after:>9}{(before - after) / before:>8.1%}  {rewrites}")
+
+
+if __name__ == "__main__":
+    main()
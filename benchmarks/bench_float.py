@@ -0,0 +1,135 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from bytecode import BytecodeCompiler
+from code_gen import CodeGenerator
+from lexer import LexicalAnalyzer
+from native import NativeRunner, ToolchainError
+from parser import SyntaxParser
+from semantic import SemanticAnalyzer
+from symbol_table import SymbolTable
+from vm import VirtualMachine
+
+# Float-heavy kernels; `n` is a global so the trip count is not known when
+# compiling. Checked against the VM with a small n, which is also timed,
+# then timed natively with a larger one.
+KERNELS = {
+    'midpoint integral': """
+        float f(float x) {
+            return 4.0 / (1.0 + x * x);
+        }
+        int main() {
+            float h = 1.0 / n;
+            float sum = 0.0;
+            for (int i = 0; i < n; i++) {
+                sum = sum + f((i + 0.5) * h);
+            }
+            cout << sum * h << endl;
+            return 0;
+        }
+    """,
+    'horner polynomial': """
+        int main() {
+            float total = 0.0;
+            for (int i = 0; i < n; i++) {
+                float x = (i % 1000) * 0.001;
+                total = total + ((((0.5 * x - 1.25) * x + 2.0) * x - 0.75) * x + 1.0);
+            }
+            cout << total << endl;
+            return 0;
+        }
+    """,
+    'newton square roots': """
+        float root(float v) {
+            float r = v;
+            int steps = 0;
+            while (steps < 20) {
+                r = 0.5 * (r + v / r);
+                steps++;
+            }
+            return r;
+        }
+        int main() {
+            float total = 0.0;
+            for (int i = 1; i <= n / 20; i++) {
+                total = total + root(i * 1.0);
+            }
+            cout << total << endl;
+            return 0;
+        }
+    """,
+    'spring': """
+        int main() {
+            float x = 1.0;
+            float v = 0.0;
+            float dt = 0.001;
+            int crossings = 0;
+            for (int i = 0; i < n; i++) {
+                float a = -4.0 * x;
+                v = v + a * dt;
+                float next = x + v * dt;
+                if ((x > 0.0) != (next > 0.0)) crossings++;
+                x = next;
+            }
+            cout << x << " " << crossings << endl;
+            return 0;
+        }
+    """,
+}
+CHECK_N = 20000
+RUN_N = 20_000_000
+# Native runs per timing; the fastest is reported
+RUNS = 3
+
+
+def program(kernel, n):
+    return f"int n = {n};\n{kernel}"
+
+
+def parse(source):
+    symbol_table = SymbolTable()
+    tokens = LexicalAnalyzer(symbol_table).tokenize(source)
+    parser = SyntaxParser(symbol_table)
+    ast = parser.parse(tokens)
+    assert ast is not None, parser.errors
+    analyzer = SemanticAnalyzer(symbol_table)
+    assert analyzer.analyze(ast), analyzer.errors
+    return ast
+
+
+def main():
+    runner = NativeRunner()
+    native = True
+    print(f"{'kernel':<22}{'instr':>7}{'vm n=' + str(CHECK_N):>14}{'native n=' + str(RUN_N):>20}"
+          f"{'per iteration':>16}")
+    for name, kernel in KERNELS.items():
+        ast = parse(program(kernel, CHECK_N))
+        vm = VirtualMachine(max_instructions=None, time_limit=None)
+        start = time.perf_counter()
+        vm.run(BytecodeCompiler().compile(ast))
+        vm_time = time.perf_counter() - start
+        expected = vm.get_output()
+
+        codegen = CodeGenerator(None)
+        assembly = codegen.generate(ast)
+        line = f"{name:<22}{codegen.instruction_count:>7}{vm_time * 1000:>11.1f} ms"
+        if native:
+            try:
+                result = runner.run(assembly)
+                assert result.stdout == expected, (name, result.stdout, expected)
+                timed = CodeGenerator(None).generate(parse(program(kernel, RUN_N)))
+                best = min(runner.run(timed).timings['execute'] for _ in range(RUNS))
+                vm_per = vm_time / CHECK_N
+                native_per = best / RUN_N
+                line += f"{best * 1000:>17.1f} ms{native_per * 1e9:>10.2f} ns  ({vm_per / native_per:,.0f}x the VM)"
+            except ToolchainError as e:
+                print(f"native runs skipped: {e}")
+                native = False
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
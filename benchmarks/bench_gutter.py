@@ -0,0 +1,76 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import tkinter as tk
+from tkinter import scrolledtext
+
+from gui_base import CompilerGUIBase
+
+LINES = 50000
+KEYSTROKES = 50
+
+
+class Editor(CompilerGUIBase):
+    # Just the editor and its gutter, laid out like gui_main
+
+    def __init__(self, root):
+        super().__init__(root)
+        self.line_numbers = tk.Text(root, width=4, state="disabled", font=("Consolas", 12))
+        self.line_numbers.pack(side="left", fill="y")
+        self.editor = scrolledtext.ScrolledText(root, wrap=tk.NONE, font=("Consolas", 12))
+        self.editor.pack(side="left", fill="both", expand=True)
+        self.editor.insert("1.0", "".join(f"    int x{i} = {i};\n" for i in range(LINES)))
+        self.attach_line_numbers()
+
+
+def rebuild_line_numbers(app):
+    # The gutter update this replaced: copy the buffer, split it and
+    # rewrite every number on each key release
+    lines = app.editor.get("1.0", "end-1c").split("\n")
+    app.line_numbers.config(state="normal")
+    app.line_numbers.delete("1.0", "end")
+    app.line_numbers.insert("1.0", "\n".join(str(i) for i in range(1, len(lines) + 1)))
+    app.line_numbers.config(state="disabled")
+    cursor = app.editor.index(tk.INSERT)
+    app.set_status(f"Line: {cursor.split('.')[0]}, Column: {cursor.split('.')[1]} | Ready")
+
+
+def keystrokes(root, app, update, text):
+    # Milliseconds per key: the edit, the gutter update and the redraw
+    times = []
+    for _ in range(KEYSTROKES):
+        start = time.perf_counter()
+        app.editor.insert(tk.INSERT, text)
+        update(app)
+        root.update_idletasks()
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return times[len(times) // 2] * 1000, times[-1] * 1000
+
+
+def main():
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        print(f"needs a display: {e}")
+        return
+    app = Editor(root)
+    root.update()
+    app.editor.mark_set(tk.INSERT, f"{LINES // 2}.0")
+    print(f"{LINES} line editor, ms per keystroke (median / worst)")
+    for label, text in (("character", "x"), ("newline", "\n")):
+        for name, update in (("full rebuild", rebuild_line_numbers),
+                             ("incremental", CompilerGUIBase.update_line_numbers)):
+            # Start each run from a complete gutter
+            rebuild_line_numbers(app)
+            app.gutter_lines = int(app.editor.index("end-1c").split(".")[0])
+            median, worst = keystrokes(root, app, update, text)
+            print(f"  {label:<10}{name:<14}{median:>8.2f}{worst:>8.2f}")
+    root.destroy()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from generator import generate_program
+from highlighter import LINE_REGEX, TAGS, SyntaxHighlighter, line_state
+
+SIZE = 2 * 1024 * 1024
+VIEWPORT_LINES = 40
+
+
+def token_ranges(lines):
+    # The tagging work of a pass, without Tk: the coloured token spans
+    return sum(1 for line in lines for mo in LINE_REGEX.finditer(line) if mo.lastgroup in TAGS)
+
+
+def timed(func, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def tk_pass(lines):
+    # A real pass on a Tk text widget, where there is a display
+    import tkinter as tk
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        print(f"Tk passes skipped, needs a display: {e}")
+        return
+    text = tk.Text(root, height=VIEWPORT_LINES)
+    text.pack()
+    text.insert("1.0", "\n".join(lines))
+    root.update()
+    highlighter = SyntaxHighlighter(text)
+    text.see(f"{len(lines) // 2}.0")
+    root.update()
+    print(f"Tk pass, middle of the file:   {timed(highlighter.highlight, 1):8.2f} ms (states scanned)")
+    print(f"Tk pass, same viewport again:  {timed(highlighter.highlight):8.2f} ms")
+    text.mark_set("insert", f"{len(lines) // 2 + 5}.0")
+    text.insert("insert", "/* ")
+    print(f"edit recorded in key handler:  {timed(highlighter.edited) * 1000:8.2f} us")
+    print(f"Tk pass after the edit:        {timed(highlighter.highlight):8.2f} ms")
+    root.destroy()
+
+
+def main():
+    lines = generate_program(SIZE).split("\n")
+    middle = len(lines) // 2
+    print(f"{len(lines):,} lines")
+    print(f"tag the whole buffer:          {timed(lambda: token_ranges(lines), 1):8.2f} ms")
+    print(f"tag a {VIEWPORT_LINES}-line viewport:        "
+          f"{timed(lambda: token_ranges(lines[middle:middle + VIEWPORT_LINES])):8.2f} ms")
+
+    def scan_states():
+        state = False
+        for line in lines:
+            state = line_state(line, state)
+    print(f"comment states, whole buffer:  {timed(scan_states, 1):8.2f} ms (once, on the first jump to the end)")
+    tk_pass(lines)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from generator import ProgramGenerator
+from project import HeaderCache, Project
+from pipeline import CompilerPipeline, output_path
+
+UNITS = 100
+HEADER_GLOBALS = 2000
+
+
+def write_project(workdir):
+    include_dir = os.path.join(workdir, 'include')
+    os.makedirs(include_dir)
+    generator = ProgramGenerator(seed=1)
+    with open(os.path.join(include_dir, 'common.h'), 'w') as f:
+        for _ in range(HEADER_GLOBALS):
+            f.write(generator.global_declaration())
+    units = []
+    for i in range(UNITS):
+        path = os.path.join(workdir, f"unit{i}.cpp")
+        with open(path, 'w') as f:
+            f.write(f'#include "common.h"\n\nint main() {{\n    int x = g{i} + {i};\n    return x;\n}}\n')
+        units.append(path)
+    return include_dir, units
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    value = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<36}{elapsed:>9.3f}s")
+    return value
+
+
+def main():
+    with tempfile.TemporaryDirectory() as workdir:
+        include_dir, units = write_project(workdir)
+        print(f"{UNITS} units including a {HEADER_GLOBALS}-declaration header\n")
+
+        def without_cache():
+            # A fresh cache per unit re-lexes and re-parses the header every time
+            for unit in units:
+                CompilerPipeline(headers=HeaderCache([include_dir])).compile_file(unit, output_path(unit))
+
+        timed("no header cache", without_cache)
+
+        build_dir = os.path.join(workdir, 'build')
+        os.makedirs(build_dir)
+        state = os.path.join(build_dir, 'state.json')
+
+        def build():
+            project = Project(units, [include_dir], build_dir, state)
+            results, up_to_date = project.build()
+            assert all(result.succeeded for result in results)
+            return len(results), project.headers.stats()
+
+        compiled, stats = timed("shared header cache (cold build)", build)
+        print(f"{'':<4}{compiled} compiled, header parsed {stats['misses']}x, reused {stats['hits']}x")
+        compiled, _ = timed("no-op rebuild", build)
+        assert compiled == 0
+
+        with open(units[0], 'a') as f:
+            f.write("\n")
+        compiled, _ = timed("rebuild after editing one unit", build)
+        assert compiled == 1
+
+        with open(os.path.join(include_dir, 'common.h'), 'a') as f:
+            f.write("int added = 1;\n")
+        compiled, _ = timed("rebuild after editing the header", build)
+        assert compiled == UNITS
+
+
+if __name__ == "__main__":
+    main()
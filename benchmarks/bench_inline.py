@@ -0,0 +1,139 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from bytecode import BytecodeCompiler
+from code_gen import CodeGenerator
+from inline import INLINE_THRESHOLD
+from lexer import LexicalAnalyzer
+from native import NativeRunner, ToolchainError
+from parser import SyntaxParser
+from symbol_table import SymbolTable
+from vm import VirtualMachine
+
+# Call-heavy kernels; `n` is a global so the trip count is not known when
+# compiling. Checked against the VM with a small n, timed natively with a
+# larger one.
+KERNELS = {
+    'leaf helpers': """
+        int square(int x) {
+            return x * x;
+        }
+        int mix(int a, int b) {
+            return (a * 31 + b) % 1000003;
+        }
+        int main() {
+            int h = 0;
+            for (int i = 0; i < n; i++) {
+                h = mix(h, square(i % 1000));
+            }
+            cout << h << endl;
+            return 0;
+        }
+    """,
+    'branchy callee': """
+        int clamp(int v, int lo, int hi) {
+            if (v < lo) return lo;
+            if (v > hi) return hi;
+            return v;
+        }
+        int main() {
+            int total = 0;
+            for (int i = 0; i < n; i++) {
+                int c = clamp(i % 100 - 20, 0, 50);
+                total = (total + c) % 1000003;
+            }
+            cout << total << endl;
+            return 0;
+        }
+    """,
+    'callee with a loop': """
+        int digits(int v) {
+            int count = 1;
+            while (v >= 10) {
+                v = v / 10;
+                count++;
+            }
+            return count;
+        }
+        int main() {
+            int total = 0;
+            for (int i = 0; i < n; i++) {
+                int d = digits(i);
+                total = total + d;
+            }
+            cout << total << endl;
+            return 0;
+        }
+    """,
+    'recursive stays a call': """
+        int fib(int k) {
+            if (k < 2) return k;
+            return fib(k - 1) + fib(k - 2);
+        }
+        int half(int v) {
+            return v / 2;
+        }
+        int main() {
+            int total = 0;
+            for (int i = 0; i < n / 1000; i++) {
+                total = total + fib(half(i % 30));
+            }
+            cout << total << endl;
+            return 0;
+        }
+    """,
+}
+CHECK_N = 3000
+RUN_N = 10_000_000
+# Native runs per timing; the fastest is reported
+RUNS = 3
+THRESHOLDS = {'off': 0, 'default': INLINE_THRESHOLD, 'large': 1000}
+
+
+def program(kernel, n):
+    return f"int n = {n};\n{kernel}"
+
+
+def parse(source):
+    symbol_table = SymbolTable()
+    tokens = LexicalAnalyzer(symbol_table).tokenize(source)
+    parser = SyntaxParser(symbol_table)
+    ast = parser.parse(tokens)
+    assert ast is not None, parser.errors
+    return ast
+
+
+def main():
+    runner = NativeRunner()
+    native = True
+    print(f"{'kernel':<24}" + "".join(f"{name:>22}" for name in THRESHOLDS) + "  inlined")
+    for name, kernel in KERNELS.items():
+        ast = parse(program(kernel, CHECK_N))
+        vm = VirtualMachine()
+        vm.run(BytecodeCompiler().compile(ast))
+        expected = vm.get_output()
+
+        columns = []
+        for threshold in THRESHOLDS.values():
+            codegen = CodeGenerator(None, inline_threshold=threshold)
+            assembly = codegen.generate(ast)
+            column = f"{codegen.instruction_count} instr"
+            if native:
+                try:
+                    result = runner.run(assembly)
+                    assert result.stdout == expected, (name, threshold, result.stdout, expected)
+                    timed = CodeGenerator(None, inline_threshold=threshold).generate(parse(program(kernel, RUN_N)))
+                    best = min(runner.run(timed).timings['execute'] for _ in range(RUNS))
+                    column += f" {best * 1000:7.1f} ms"
+                except ToolchainError as e:
+                    print(f"native runs skipped: {e}")
+                    native = False
+            columns.append(column)
+        inlined = ", ".join(sorted({callee for _, callee, _ in codegen.inliner.sites})) or "-"
+        print(f"{name:<24}" + "".join(f"{column:>22}" for column in columns) + f"  {inlined}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from bench_vm import arithmetic_program, best_of
+from instrument import Profiler
+from pipeline import CompilerPipeline
+
+
+def per_call_ns(profiler, calls=200_000):
+    def loop():
+        for _ in range(calls):
+            with profiler.timer('t'):
+                pass
+            profiler.count('c')
+    return best_of(5, loop) / calls * 1e9
+
+
+def main():
+    print(f"{'hook cost per call':<28}{'ns':>8}")
+    print(f"{'  disabled':<28}{per_call_ns(Profiler(enabled=False)):>8.0f}")
+    print(f"{'  enabled':<28}{per_call_ns(Profiler()):>8.0f}")
+
+    source = arithmetic_program(3000)
+    configurations = [
+        ('no profiler', lambda: CompilerPipeline()),
+        ('disabled profiler', lambda: CompilerPipeline(profiler=Profiler(enabled=False))),
+        ('enabled profiler', lambda: CompilerPipeline(profiler=Profiler())),
+    ]
+    print(f"\n{'pipeline (3000 statements)':<28}{'ms':>8}{'overhead':>10}")
+    baseline = None
+    for name, make in configurations:
+        elapsed = best_of(7, lambda: make().compile_source(source))
+        baseline = baseline or elapsed
+        print(f"{'  ' + name:<28}{elapsed * 1000:>8.1f}{(elapsed / baseline - 1) * 100:>9.1f}%")
+
+
+if __name__ == "__main__":
+    main()
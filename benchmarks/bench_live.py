@@ -0,0 +1,55 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from bench_worker import event_loop
+from compile_worker import CompileWorker
+from generator import generate_program
+from pipeline import CompilerPipeline
+
+SIZES = (16 * 1024, 64 * 1024, 256 * 1024)
+
+
+def check(worker, source, last_phase):
+    worst, total, phases, result = event_loop(worker, worker.submit(source, last_phase=last_phase))
+    assert not result.errors, result.errors[:3]
+    return total, worst, result
+
+
+def main():
+    # What a live check costs compared to a full compile, and what it costs
+    # again for input already checked. Latencies are as seen by a 20 ms
+    # polling loop, so anything under one tick reads as about 20 ms.
+    print(f"{'size':>8}{'full ms':>10}{'check ms':>10}{'cached ms':>11}{'worst delay ms':>16}")
+    for size in SIZES:
+        source = generate_program(size)
+        full_worker = CompileWorker(CompilerPipeline())
+        full, _, result = check(full_worker, source, None)
+        assert result.assembly is not None
+
+        worker = CompileWorker(CompilerPipeline())
+        live, worst, result = check(worker, source, 'semantic')
+        assert result.assembly is None and 'codegen' not in result.timings
+        cached, cached_worst, _ = check(worker, source, 'semantic')
+        assert worker.hits == 1
+        print(f"{size // 1024:>6}KB{full * 1000:>10.0f}{live * 1000:>10.0f}{cached * 1000:>11.0f}"
+              f"{max(worst, cached_worst) * 1000:>16.1f}")
+
+    # Typing faster than the debounce: only the last edit is compiled, and
+    # a compile still running when an edit arrives is superseded
+    source = generate_program(SIZES[-1])
+    worker = CompileWorker(CompilerPipeline())
+    start = time.perf_counter()
+    for i in range(5):
+        generation = worker.submit(source + f"\nint edit{i};\n", last_phase='semantic')
+        time.sleep(0.05)
+    worst, total, _, result = event_loop(worker, generation)
+    assert not result.aborted and result.tokens[-2]['value'] == 'edit4'
+    print(f"5 edits 50 ms apart: last result {(time.perf_counter() - start) * 1000:.0f} ms after the first "
+          f"edit, worst delay {worst * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
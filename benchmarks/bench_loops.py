@@ -0,0 +1,139 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from asm import Instruction, Label, count_instructions
+from bytecode import BytecodeCompiler
+from code_gen import CodeGenerator
+from lexer import LexicalAnalyzer
+from native import NativeRunner, ToolchainError
+from parser import SyntaxParser
+from symbol_table import SymbolTable
+from vm import VirtualMachine
+
+# Loop kernels; `n` is a global so its value is not known when compiling.
+# Small enough for the VM to check the output, and run natively with a
+# larger n for timing.
+KERNELS = {
+    'sum range': """
+        int sum = 0;
+        for (int i = 0; i < n; i++) {
+            sum = sum + i;
+        }
+        cout << sum << endl;
+    """,
+    'scaled index': """
+        int total = 0;
+        int stride = 12;
+        int base = 40;
+        for (int i = 0; i < n; i++) {
+            total = (total + i * stride + base * stride) % 1000003;
+        }
+        cout << total << endl;
+    """,
+    'nested rows': """
+        int acc = 0;
+        int cols = 100;
+        int rows = n / cols;
+        for (int r = 0; r < rows; r++) {
+            for (int c = 0; c < cols; c++) {
+                acc = (acc + r * cols + c) % 1000003;
+            }
+        }
+        cout << acc << endl;
+    """,
+    'countdown': """
+        int k = n;
+        int count = 0;
+        int limit = 7;
+        while (k > limit * 2 - 1) {
+            k = k - 3;
+            --count;
+        }
+        cout << k << " " << count << endl;
+    """,
+    'break and continue': """
+        int hits = 0;
+        int i = 0;
+        while (1) {
+            i = i + 1;
+            if (i > n) break;
+            if (i % 3 == 0) continue;
+            hits = hits + i % 5;
+        }
+        cout << hits << endl;
+    """,
+}
+CHECK_N = 3000
+RUN_N = 30_000_000
+
+
+def program(kernel, n):
+    return f"int n = {n};\nint main() {{\n{kernel}\n    return 0;\n}}\n"
+
+
+def parse(source):
+    symbol_table = SymbolTable()
+    tokens = LexicalAnalyzer(symbol_table).tokenize(source)
+    parser = SyntaxParser(symbol_table)
+    ast = parser.parse(tokens)
+    assert ast is not None, parser.errors
+    return ast
+
+
+def innermost_loop(code):
+    # Instructions between the innermost back edge's target and the branch
+    # back: what one iteration of the hot loop may execute
+    positions = {line.name: index for index, line in enumerate(code) if isinstance(line, Label)}
+    back_edges = [(index - positions[line.operands[0]], positions[line.operands[0]], index)
+                  for index, line in enumerate(code)
+                  if isinstance(line, Instruction) and line.opcode.startswith('j')
+                  and positions.get(line.operands[0], index) < index]
+    if not back_edges:
+        return 0
+    _, start, end = min(back_edges)
+    return count_instructions(code[start:end + 1])
+
+
+def compile_main(ast, optimize):
+    codegen = CodeGenerator(None, optimize)
+    main, = codegen.optimize_functions([node for node in ast if node[0] == 'function'])
+    code, _ = codegen.generate_function_buffer(main)
+    return code, codegen.peephole.stats
+
+
+def main():
+    runner = NativeRunner()
+    native = True
+    print(f"{'kernel':<20}{'function':>14}{'inner loop':>14}{'native run':>22}  rewrites")
+    for name, kernel in KERNELS.items():
+        ast = parse(program(kernel, CHECK_N))
+        vm = VirtualMachine()
+        vm.run(BytecodeCompiler().compile(ast))
+        expected = vm.get_output()
+
+        counts = {}
+        times = {}
+        for optimize in (False, True):
+            code, stats = compile_main(ast, optimize)
+            counts[optimize] = (count_instructions(code), innermost_loop(code))
+            if not native:
+                continue
+            try:
+                result = runner.run(CodeGenerator(None, optimize).generate(ast))
+                assert result.stdout == expected, (name, optimize, result.stdout, expected)
+                result = runner.run(CodeGenerator(None, optimize).generate(parse(program(kernel, RUN_N))))
+                times[optimize] = result.timings['execute']
+            except ToolchainError as e:
+                print(f"native runs skipped: {e}")
+                native = False
+        rewrites = ", ".join(f"{rule} {stats[rule]}" for rule in ('loop-invariant', 'strength-reduced')
+                             if stats[rule])
+        (before, before_loop), (after, after_loop) = counts[False], counts[True]
+        timing = f"{times[False] * 1000:7.1f} -> {times[True] * 1000:6.1f} ms" if len(times) == 2 else "-"
+        print(f"{name:<20}{before:>6} -> {after:<5}{before_loop:>6} -> {after_loop:<5}{timing:>22}  {rewrites}")
+
+
+if __name__ == "__main__":
+    main()
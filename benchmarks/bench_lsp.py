@@ -0,0 +1,178 @@
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, SRC)
+
+from generator import generate_program
+from lsp_server import REQUEST_CANCELLED, read_message, write_message
+
+# Milliseconds from a didChange to its diagnostics, debounce included
+TARGETS = {16 * 1024: 250, 64 * 1024: 600, 256 * 1024: 2000}
+HOVER_TARGET = 50
+URI = "file:///tmp/bench_lsp.cpp"
+
+PROBE = """
+int lsp_probe(int a) {
+    int b = a + 1;
+    return b;
+}
+"""
+
+
+class LspClient:
+    # Talks to lsp_server.py over its stdin and stdout like an editor would
+
+    def __init__(self):
+        self.process = subprocess.Popen([sys.executable, os.path.join(SRC, 'lsp_server.py')],
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self.incoming = queue.Queue()
+        self.next_id = 0
+        threading.Thread(target=self.read, daemon=True).start()
+
+    def read(self):
+        while True:
+            message = read_message(self.process.stdout)
+            self.incoming.put(message)
+            if message is None:
+                return
+
+    def notify(self, method, params):
+        write_message(self.process.stdin, {'jsonrpc': "2.0", 'method': method, 'params': params})
+
+    def send_request(self, method, params):
+        self.next_id += 1
+        write_message(self.process.stdin, {'jsonrpc': "2.0", 'id': self.next_id, 'method': method,
+                                           'params': params})
+        return self.next_id
+
+    def wait(self, match, timeout=60):
+        # The first message `match` accepts; others are dropped
+        deadline = time.perf_counter() + timeout
+        while True:
+            message = self.incoming.get(timeout=max(0.0, deadline - time.perf_counter()))
+            if message is None:
+                raise EOFError("server closed its output")
+            if match(message):
+                return message
+
+    def request(self, method, params):
+        request_id = self.send_request(method, params)
+        return self.wait(lambda message: message.get('id') == request_id)
+
+    def diagnostics(self, version):
+        message = self.wait(lambda message: message.get('method') == 'textDocument/publishDiagnostics'
+                            and message['params'].get('version') == version)
+        return message['params']['diagnostics']
+
+    def close(self):
+        self.request('shutdown', None)
+        self.notify('exit', None)
+        return self.process.wait(timeout=10)
+
+
+def change(client, version, start, end, text):
+    client.notify('textDocument/didChange', {
+        'textDocument': {'uri': URI, 'version': version},
+        'contentChanges': [{'range': {'start': {'line': start[0], 'character': start[1]},
+                                      'end': {'line': end[0], 'character': end[1]}}, 'text': text}],
+    })
+
+
+def timed(func):
+    start = time.perf_counter()
+    value = func()
+    return (time.perf_counter() - start) * 1000, value
+
+
+def verdict(ms, target):
+    return f"{ms:8.1f} ms  {'ok' if ms <= target else 'OVER'} (target {target} ms)"
+
+
+def run_size(client, size, version):
+    source = generate_program(size) + PROBE
+    lines = source.split("\n")
+    middle = len(lines) // 2
+    version += 1
+    client.notify('textDocument/didOpen', {'textDocument': {'uri': URI, 'languageId': 'cpp', 'version': version,
+                                                            'text': source}})
+    ms, found = timed(lambda: client.diagnostics(version))
+    assert found == [], found[:3]
+    print(f"{size // 1024}KB, {len(lines):,} lines")
+    print(f"  open -> diagnostics        {ms:8.1f} ms")
+
+    # Typing a stray character reports it on its line
+    version += 1
+    change(client, version, (middle, 0), (middle, 0), "$")
+    ms, found = timed(lambda: client.diagnostics(version))
+    assert found and found[0]['range']['start']['line'] == middle, found[:3]
+    print(f"  edit -> error              {verdict(ms, TARGETS[size])}")
+
+    # Undoing it is answered from the cache
+    version += 1
+    change(client, version, (middle, 0), (middle, 1), "")
+    ms, found = timed(lambda: client.diagnostics(version))
+    assert found == [], found[:3]
+    print(f"  undo -> clean (cached)     {ms:8.1f} ms")
+
+    # A burst of edits only analyses the last one
+    start = time.perf_counter()
+    for i in range(10):
+        version += 1
+        change(client, version, (middle, 0), (middle, 0), " ")
+        time.sleep(0.005)
+    published = []
+    found = client.wait(lambda message: message.get('method') == 'textDocument/publishDiagnostics'
+                        and (published.append(message['params']['version']) or
+                             message['params']['version'] == version))
+    ms = (time.perf_counter() - start) * 1000
+    print(f"  10 edits 5 ms apart        {ms:8.1f} ms, versions published: {published}")
+
+    # Hover and definition on `b` in `return b;` of the probe function
+    line = len(lines) - 3
+    column = lines[line].index("b;")
+    position = {'textDocument': {'uri': URI}, 'position': {'line': line, 'character': column}}
+    ms, hover = timed(lambda: client.request('textDocument/hover', position))
+    contents = hover['result']['contents']['value']
+    assert "int b" in contents and "lsp_probe" in contents, contents
+    print(f"  hover                      {verdict(ms, HOVER_TARGET)}")
+    ms, definition = timed(lambda: client.request('textDocument/definition', position))
+    assert definition['result']['range']['start']['line'] == line - 1, definition
+    print(f"  definition                 {verdict(ms, HOVER_TARGET)}")
+
+    # A hover waiting on an analysis can be cancelled
+    version += 1
+    change(client, version, (middle, 0), (middle, 0), " ")
+    request_id = client.send_request('textDocument/hover', position)
+    client.notify('$/cancelRequest', {'id': request_id})
+    response = client.wait(lambda message: message.get('id') == request_id)
+    cancelled = response.get('error', {}).get('code') == REQUEST_CANCELLED
+    print(f"  cancelled hover            {'cancelled' if cancelled else 'answered before the cancel'}")
+    client.diagnostics(version)
+
+    client.notify('textDocument/didClose', {'textDocument': {'uri': URI}})
+    assert client.wait(lambda message: message.get('method') == 'textDocument/publishDiagnostics'
+                       )['params']['diagnostics'] == []
+    return version
+
+
+def main():
+    client = LspClient()
+    ms, response = timed(lambda: client.request('initialize', {'processId': os.getpid(), 'capabilities': {}}))
+    assert response['result']['capabilities']['textDocumentSync']['change'] == 2
+    client.notify('initialized', {})
+    print(f"initialize                   {ms:8.1f} ms")
+    version = 0
+    for size in TARGETS:
+        version = run_size(client, size, version)
+    code = client.close()
+    print(f"exit code {code}")
+    assert code == 0
+
+
+if __name__ == "__main__":
+    main()
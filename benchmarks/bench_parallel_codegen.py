@@ -0,0 +1,66 @@
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from code_gen import CodeGenerator
+from lexer import LexicalAnalyzer
+from parser import SyntaxParser
+from symbol_table import SymbolTable
+
+
+def many_functions_program(count, seed=1):
+    # `count` small functions with branches, locals and string output
+    rng = random.Random(seed)
+    lines = ["int total = 0;"]
+    for i in range(count):
+        a, b = rng.randint(2, 9), rng.randint(2, 9)
+        lines += [
+            f"int f{i}(int x, int y) {{",
+            f"    int t = x * {a} + y / {b};",
+            f"    if (t > {rng.randint(0, 50)}) {{",
+            f"        cout << \"f{i} \" << t << endl;",
+            f"        t = t % {rng.randint(3, 17)};",
+            "    } else {",
+            f"        t = (t - y) * {rng.randint(2, 12)};",
+            "    }",
+            "    total = total + t;",
+            "    return t;",
+            "}",
+        ]
+    lines += ["int main() {", "    cout << total << endl;", "    return 0;", "}"]
+    return "\n".join(lines)
+
+
+def parse(source):
+    symbol_table = SymbolTable()
+    tokens = LexicalAnalyzer(symbol_table).tokenize(source)
+    return SyntaxParser(symbol_table).parse(tokens)
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    worker_counts = [2, 4, os.cpu_count() or 1]
+    worker_counts = sorted(set(w for w in worker_counts if w > 1))
+    print(f"{os.cpu_count()} CPUs")
+    print(f"{'functions':<12}{'sequential':>12}" + "".join(f"{f'-j{w}':>12}" for w in worker_counts))
+    for count in (1000, 2000, 5000):
+        ast = parse(many_functions_program(count))
+        expected, sequential = timed(lambda: CodeGenerator(None).generate(ast))
+        row = f"{count:<12}{sequential * 1000:>10.0f}ms"
+        for workers in worker_counts:
+            output, elapsed = timed(lambda: CodeGenerator(None, workers=workers).generate(ast))
+            assert output == expected, f"-j{workers} output differs from sequential"
+            row += f"{elapsed * 1000:>10.0f}ms"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import glob
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from code_gen import CodeGenerator
+from lexer import LexicalAnalyzer
+from parser import SyntaxParser
+from peephole import PeepholeOptimizer
+from symbol_table import SymbolTable
+
+PROGRAMS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'programs', '*.cpp')
+
+
+def compile_program(source, optimize):
+    symbol_table = SymbolTable()
+    tokens = LexicalAnalyzer(symbol_table).tokenize(source)
+    ast = SyntaxParser(symbol_table).parse(tokens)
+    codegen = CodeGenerator(symbol_table, optimize=optimize)
+    codegen.generate(ast)
+    return codegen
+
+
+def main(paths):
+    totals = PeepholeOptimizer().stats
+    before_total = after_total = 0
+    print(f"{'program':<24}{'before':>8}{'after':>8}{'saved':>8}")
+    for path in paths:
+        with open(path) as f:
+            source = f.read()
+        before = compile_program(source, False).instruction_count
+        codegen = compile_program(source, True)
+        after = codegen.instruction_count
+        totals.update(codegen.peephole.stats)
+        before_total += before
+        after_total += after
+        saved = 100.0 * (before - after) / before if before else 0.0
+        print(f"{os.path.basename(path):<24}{before:>8}{after:>8}{saved:>7.1f}%")
+
+    saved = 100.0 * (before_total - after_total) / before_total if before_total else 0.0
+    print(f"{'total':<24}{before_total:>8}{after_total:>8}{saved:>7.1f}%")
+    print()
+    print("Rule firings:")
+    for name, count in totals.most_common():
+        print(f"  {name:<16}{count:>6}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or sorted(glob.glob(PROGRAMS)))
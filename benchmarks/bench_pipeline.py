@@ -0,0 +1,37 @@
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from bench_vm import arithmetic_program
+from pipeline import CompilerPipeline
+
+
+def main():
+    files = 200
+    with tempfile.TemporaryDirectory() as workdir:
+        paths = []
+        for i in range(files):
+            path = os.path.join(workdir, f"prog{i}.cpp")
+            with open(path, 'w') as f:
+                f.write(arithmetic_program(200, seed=i))
+            paths.append(path)
+
+        print(f"{files} files, {os.cpu_count()} CPUs")
+        print(f"{'jobs':<8}{'seconds':>10}{'files/sec':>12}{'speedup':>10}")
+        baseline = None
+        for jobs in sorted({1, 2, 4, os.cpu_count() or 1}):
+            output_dir = os.path.join(workdir, f"out{jobs}")
+            os.makedirs(output_dir)
+            start = time.perf_counter()
+            results = list(CompilerPipeline().compile_files(paths, output_dir, jobs))
+            elapsed = time.perf_counter() - start
+            assert all(result.succeeded for result in results)
+            baseline = baseline or elapsed
+            print(f"{jobs:<8}{elapsed:>10.2f}{files / elapsed:>12.1f}{baseline / elapsed:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from lexer import LexicalAnalyzer
+from pipeline import CompilerPipeline
+from preprocessor import Preprocessor
+from project import HeaderCache
+from symbol_table import SymbolTable
+
+CONSTANTS = 200
+FUNCTION_MACROS = 40
+FUNCTIONS = 300
+GUARDED_INCLUDES = 200
+
+
+def macro_header():
+    # Constants and function-like macros that build on each other
+    rng = random.Random(1)
+    lines = ["#ifndef MACROS_H", "#define MACROS_H"]
+    for i in range(CONSTANTS):
+        lines.append(f"#define C{i} {rng.randint(1, 50)}")
+    lines.append("#define M0(a, b) ((a) + (b))")
+    for i in range(1, FUNCTION_MACROS):
+        op = rng.choice(['+', '-', '*'])
+        lines.append(f"#define M{i}(a, b) (M{i - 1}(a, C{rng.randrange(CONSTANTS)}) {op} (b))")
+    lines.append("#endif")
+    return "\n".join(lines) + "\n"
+
+
+def macro_unit():
+    # Many functions reusing the same few invocations, as generated code does
+    rng = random.Random(2)
+    lines = ['#include "macros.h"'] + ['#include "macros.h"'] * (GUARDED_INCLUDES - 1)
+    for f in range(FUNCTIONS):
+        lines.append(f"#if C{f % CONSTANTS} > 25")
+        lines.append(f"int f{f}(int p) {{")
+        lines.append("#else")
+        lines.append(f"int f{f}(int q) {{")
+        lines.append("#endif")
+        for v in range(4):
+            m = rng.randrange(FUNCTION_MACROS)
+            lines.append(f"    int v{v} = M{m}(C{rng.randrange(8)}, C{rng.randrange(8)});")
+        lines.append("    return v0;")
+        lines.append("}")
+    lines.append("int main() {\n    return 0;\n}")
+    return "\n".join(lines) + "\n"
+
+
+def best_of(runs, func):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        value = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, value
+
+
+def main():
+    with tempfile.TemporaryDirectory() as workdir:
+        with open(os.path.join(workdir, 'macros.h'), 'w') as f:
+            f.write(macro_header())
+        path = os.path.join(workdir, 'unit.cpp')
+        source = macro_unit()
+        with open(path, 'w') as f:
+            f.write(source)
+        tokens = LexicalAnalyzer(SymbolTable()).tokenize(source)
+        headers = HeaderCache()
+
+        def preprocess(memoize):
+            preprocessor = Preprocessor(headers, memoize=memoize)
+            out = preprocessor.process(tokens, path, SymbolTable())
+            assert not [m for m in preprocessor.messages if m[2] == 'error'], preprocessor.messages[:3]
+            return out, preprocessor
+
+        print(f"{len(source):,} bytes, {len(tokens):,} tokens, {GUARDED_INCLUDES} includes of a guarded header\n")
+        plain_time, (plain_out, _) = best_of(3, lambda: preprocess(False))
+        memo_time, (memo_out, preprocessor) = best_of(3, lambda: preprocess(True))
+        assert [(t['type'], t['value']) for t in plain_out] == [(t['type'], t['value']) for t in memo_out]
+        stats = preprocessor.stats()
+        print(f"{'expansion':<24}{'seconds':>10}{'tokens out':>12}")
+        print(f"{'no memo':<24}{plain_time:>10.3f}{len(plain_out):>12,}")
+        print(f"{'memoized':<24}{memo_time:>10.3f}{len(memo_out):>12,}")
+        print(f"\nspeedup {plain_time / memo_time:.1f}x, memo hits {stats['memo_hits']:,}, "
+              f"misses {stats['memo_misses']:,}, repeat includes skipped {stats['skipped_includes']}")
+
+        pipeline = CompilerPipeline(headers=headers)
+        compile_time, result = best_of(3, lambda: pipeline.compile_source(source, path))
+        assert result.succeeded, result.errors[:3]
+        print(f"\nfull compile {compile_time:.3f}s: " +
+              ", ".join(f"{phase} {seconds * 1000:.0f}ms" for phase, seconds in result.timings.items()))
+
+
+if __name__ == "__main__":
+    main()
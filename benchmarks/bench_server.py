@@ -0,0 +1,79 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, SRC)
+
+from compile_client import CompileClient
+
+SOURCE = """int main() {
+    int a = 6;
+    int b = a * 7;
+    if (b > 40) {
+        cout << b << endl;
+    }
+    return b % 256;
+}
+"""
+
+
+def median_ms(runs, func):
+    times = []
+    for i in range(runs):
+        start = time.perf_counter()
+        func(i)
+        times.append(time.perf_counter() - start)
+    return sorted(times)[len(times) // 2] * 1000
+
+
+def wait_for_server(socket_path, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with CompileClient(socket_path) as client:
+                client.ping()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("compile server did not start")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as workdir:
+        socket_path = os.path.join(workdir, 'server.sock')
+        source_path = os.path.join(workdir, 'small.cpp')
+        with open(source_path, 'w') as f:
+            f.write(SOURCE)
+
+        server = subprocess.Popen([sys.executable, os.path.join(SRC, 'compile_server.py'),
+                                   '--socket', socket_path, '-j', '2'], stderr=subprocess.DEVNULL)
+        try:
+            wait_for_server(socket_path)
+
+            def cold_cli(_):
+                subprocess.run([sys.executable, os.path.join(SRC, 'pipeline.py'), source_path,
+                                '-o', workdir], check=True, stderr=subprocess.DEVNULL)
+
+            def thin_client(_):
+                subprocess.run([sys.executable, os.path.join(SRC, 'compile_client.py'), source_path,
+                                '--socket', socket_path, '-o', os.devnull], check=True)
+
+            print(f"{'mode':<36}{'median':>10}")
+            print(f"{'cold pipeline.py process':<36}{median_ms(10, cold_cli):>8.1f}ms")
+            print(f"{'compile_client.py process':<36}{median_ms(10, thin_client):>8.1f}ms")
+            with CompileClient(socket_path) as client:
+                # A distinct comment per run defeats the result cache
+                miss = median_ms(50, lambda i: client.compile(SOURCE + f"// {i}\n"))
+                hit = median_ms(50, lambda i: client.compile(SOURCE))
+                client.shutdown()
+            print(f"{'warm request (cache miss)':<36}{miss:>8.2f}ms")
+            print(f"{'warm request (cache hit)':<36}{hit:>8.2f}ms")
+        finally:
+            server.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import os
+import subprocess
+import sys
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+# Regression budget in milliseconds; the script exits non-zero when a
+# median exceeds it. Generous enough for slow CI machines.
+BUDGET = {
+    'import pipeline': 60,
+    'import gui_main': 150,
+    'first window': 1000,
+}
+
+# Modules the core pipeline must never load
+CORE_FORBIDDEN = ('tkinter', 'multiprocessing', 'concurrent.futures.process')
+
+FIRST_WINDOW = """
+import time
+start = time.perf_counter()
+import tkinter as tk
+try:
+    root = tk.Tk()
+except tk.TclError:
+    print("no-display")
+    raise SystemExit
+from gui_main import CompilerGUI
+CompilerGUI(root)
+root.update()
+print((time.perf_counter() - start) * 1000)
+root.destroy()
+"""
+
+
+def import_times(module):
+    # (total microseconds, {module: cumulative microseconds}) from -X importtime
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+                               cwd=SRC, capture_output=True, text=True, check=True)
+    modules = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, self_us, cumulative_us, name = (part.strip() for part in line.replace("import time:", "|").split("|"))
+        modules[name] = int(cumulative_us)
+    return modules[module], modules
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def first_window_ms():
+    completed = subprocess.run([sys.executable, '-c', FIRST_WINDOW], cwd=SRC,
+                               capture_output=True, text=True, check=True)
+    output = completed.stdout.strip()
+    return None if output == "no-display" else float(output)
+
+
+def main():
+    results = {}
+    for module in ('pipeline', 'gui_main'):
+        runs = [import_times(module) for _ in range(7)]
+        results[f'import {module}'] = median(total for total, _ in runs) / 1000
+        modules = runs[-1][1]
+        if module == 'pipeline':
+            leaked = [name for name in CORE_FORBIDDEN if name in modules]
+            if leaked:
+                print(f"FAIL: importing the core pipeline loads {', '.join(leaked)}")
+                return 1
+        slowest = sorted(modules.items(), key=lambda item: -item[1])[1:6]
+        print(f"import {module}: slowest dependencies " +
+              ", ".join(f"{name} {us / 1000:.1f}ms" for name, us in slowest))
+
+    windows = [first_window_ms() for _ in range(5)]
+    if None in windows:
+        print("first window: skipped (no display available)")
+    else:
+        results['first window'] = median(windows)
+
+    failed = False
+    print(f"\n{'measurement':<20}{'median':>10}{'budget':>10}")
+    for name, value in results.items():
+        status = "" if value <= BUDGET[name] else "  OVER BUDGET"
+        failed = failed or bool(status)
+        print(f"{name:<20}{value:>8.1f}ms{BUDGET[name]:>8}ms{status}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,45 @@
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from bench_parallel_codegen import many_functions_program, parse
+from code_gen import CodeGenerator
+
+
+def measure(func):
+    # Peak memory allocated by `func`, excluding what existed beforehand
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, elapsed
+
+
+def main():
+    print(f"{'functions':<12}{'asm size':>10}{'generate() peak':>18}{'write() peak':>16}")
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'out.s')
+        for count in (500, 2000, 5000):
+            ast = parse(many_functions_program(count))
+
+            def to_file():
+                with open(path, 'w') as f:
+                    CodeGenerator(None).write(ast, f)
+
+            string_peak, _ = measure(lambda: CodeGenerator(None).generate(ast))
+            stream_peak, _ = measure(to_file)
+            with open(path) as f:
+                assert f.read() == CodeGenerator(None).generate(ast)
+            size = os.path.getsize(path)
+            print(f"{count:<12}{size / 1e6:>8.1f}MB{string_peak / 1e6:>16.1f}MB{stream_peak / 1e6:>14.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
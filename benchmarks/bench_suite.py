@@ -0,0 +1,228 @@
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import time
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from code_gen import CodeGenerator
+from generator import format_size, generate_program, parse_size
+from instrument import NULL_TIMER, MemoryProfiler, count_ast_nodes
+from lexer import LexicalAnalyzer
+from parser import SyntaxParser
+from semantic import SemanticAnalyzer
+from symbol_table import SymbolTable
+
+PHASES = ('tokenize', 'parse', 'analyze', 'generate')
+DEFAULT_SIZES = '1KB,10KB,100KB,1MB'
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Timings below this are too noisy to fit or compare
+NOISE_FLOOR = 0.005
+# Peak allocation growth below this many bytes is not reported as a regression
+MEMORY_NOISE_FLOOR = 64 * 1024
+
+
+def run_phases(source, memory=None):
+    # One pass through the pipeline with every phase timed separately;
+    # with a MemoryProfiler each phase is also snapshotted
+    timings = {}
+    symbol_table = SymbolTable()
+
+    @contextmanager
+    def phase(name):
+        with memory.phase(name) if memory else NULL_TIMER:
+            start = time.perf_counter()
+            yield
+            timings[name] = time.perf_counter() - start
+
+    with phase('tokenize'):
+        tokens = LexicalAnalyzer(symbol_table).tokenize(source)
+    with phase('parse'):
+        ast = SyntaxParser(symbol_table).parse(tokens)
+    if ast is None:
+        raise RuntimeError("generated program failed to parse")
+    with phase('analyze'):
+        SemanticAnalyzer(symbol_table).analyze(ast)
+    with phase('generate'):
+        CodeGenerator(symbol_table).generate(ast)
+
+    counts = {'tokens': len(tokens), 'ast_nodes': count_ast_nodes(ast)}
+    return timings, counts
+
+
+def measure(source, repeat):
+    # Best time per phase over `repeat` runs
+    best = None
+    for _ in range(repeat):
+        timings, counts = run_phases(source)
+        best = timings if best is None else {p: min(best[p], timings[p]) for p in PHASES}
+    return best, counts
+
+
+def measure_memory(source):
+    # A separate traced run, since tracemalloc distorts the timings
+    memory = MemoryProfiler(top=5)
+    try:
+        _, counts = run_phases(source, memory)
+    finally:
+        memory.stop()
+    # Per-item sizes are computed here since the suite names its phases differently
+    report = memory.to_dict()
+    report['bytes_per_token'] = report['phases']['tokenize']['retained'] / max(counts['tokens'], 1)
+    report['bytes_per_ast_node'] = report['phases']['parse']['retained'] / max(counts['ast_nodes'], 1)
+    return report
+
+
+def fit_exponent(points):
+    # Least-squares slope of log(time) over log(size): ~1 linear, ~2 quadratic
+    points = [(size, seconds) for size, seconds in points if seconds >= NOISE_FLOOR]
+    if len(points) < 2:
+        return None
+    xs = [math.log(size) for size, _ in points]
+    ys = [math.log(seconds) for _, seconds in points]
+    mean_x = sum(xs) / len(xs)
+    mean_y = sum(ys) / len(ys)
+    variance = sum((x - mean_x) ** 2 for x in xs)
+    if not variance:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / variance
+
+
+def run_suite(sizes, seed, repeat, budget, memory_limit=None):
+    results = {
+        'meta': {
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'seed': seed,
+            'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+        },
+        'sizes': {},
+        'scaling': {},
+    }
+    for size in sizes:
+        label = format_size(size)
+        source = generate_program(size, seed)
+        # Large inputs are measured once; small ones are repeated to cut noise
+        runs = repeat or max(1, min(7, (1 << 20) // max(size, 1)))
+        phases, counts = measure(source, runs)
+        results['sizes'][label] = {'bytes': len(source), 'runs': runs, 'phases': phases, **counts}
+        print(f"{label:>8} {len(source):>11,} bytes  " +
+              "  ".join(f"{phase} {phases[phase] * 1000:9.1f}ms" for phase in PHASES), flush=True)
+        if memory_limit and size <= memory_limit:
+            memory = measure_memory(source)
+            results['sizes'][label]['memory'] = memory
+            print(f"{'':>8} {'memory':>17}  " +
+                  "  ".join(f"{phase} {memory['phases'][phase]['peak'] / 1024:9.0f}KB" for phase in PHASES) +
+                  f"  {memory['bytes_per_token']:.0f} B/token  {memory['bytes_per_ast_node']:.0f} B/node"
+                  f"  peak RSS {memory['peak_rss'] / 2 ** 20:.0f}MB", flush=True)
+        if budget and sum(phases.values()) > budget:
+            print(f"{'':>8} stopping: {sum(phases.values()):.1f}s exceeds the {budget:g}s budget per size")
+            break
+
+    for phase in PHASES:
+        points = [(entry['bytes'], entry['phases'][phase]) for entry in results['sizes'].values()]
+        results['scaling'][phase] = fit_exponent(points)
+    return results
+
+
+def report_scaling(results, max_exponent):
+    problems = []
+    print(f"\n{'phase':<12}{'exponent':>10}")
+    for phase, exponent in results['scaling'].items():
+        if exponent is None:
+            print(f"{phase:<12}{'n/a':>10}")
+            continue
+        flag = ""
+        if exponent > max_exponent:
+            flag = "  SUPERLINEAR"
+            problems.append(f"{phase} scales as size^{exponent:.2f}")
+        print(f"{phase:<12}{exponent:>10.2f}{flag}")
+    return problems
+
+
+def compare(results, baseline, threshold, max_exponent):
+    problems = []
+    print(f"\n{'size':>8} {'phase':<10}{'baseline':>12}{'current':>12}{'change':>9}")
+    for label, entry in results['sizes'].items():
+        old = baseline['sizes'].get(label)
+        if old is None:
+            continue
+        for phase in PHASES:
+            before, after = old['phases'][phase], entry['phases'][phase]
+            change = after / before - 1 if before else 0.0
+            flag = ""
+            if change > threshold and after - before > NOISE_FLOOR:
+                flag = "  REGRESSION"
+                problems.append(f"{phase} at {label} is {change:+.0%} slower")
+            print(f"{label:>8} {phase:<10}{before * 1000:>10.1f}ms{after * 1000:>10.1f}ms{change:>+9.0%}{flag}")
+        problems += compare_memory(label, entry.get('memory'), old.get('memory'), threshold)
+    for phase, exponent in results['scaling'].items():
+        old = baseline.get('scaling', {}).get(phase)
+        if exponent is not None and old is not None and exponent > max(old + 0.15, max_exponent):
+            problems.append(f"{phase} scaling exponent rose from {old:.2f} to {exponent:.2f}")
+    return problems
+
+
+def compare_memory(label, current, baseline, threshold):
+    # Peak traced bytes per phase; only runs that both measured memory count
+    problems = []
+    if not current or not baseline:
+        return problems
+    for phase in PHASES:
+        before, after = baseline['phases'][phase]['peak'], current['phases'][phase]['peak']
+        change = after / before - 1 if before else 0.0
+        flag = ""
+        if change > threshold and after - before > MEMORY_NOISE_FLOOR:
+            flag = "  REGRESSION"
+            problems.append(f"{phase} at {label} allocates {change:+.0%} more at peak")
+        print(f"{label:>8} {phase:<10}{before / 1024:>10.0f}KB{after / 1024:>10.0f}KB{change:>+9.0%}{flag}")
+    return problems
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Per-phase compiler benchmark suite")
+    arg_parser.add_argument('--sizes', default=DEFAULT_SIZES,
+                            help=f"comma-separated program sizes, 1KB to 100MB (default {DEFAULT_SIZES})")
+    arg_parser.add_argument('--seed', type=int, default=1)
+    arg_parser.add_argument('--repeat', type=int, help="runs per size (default: more for small sizes)")
+    arg_parser.add_argument('--budget', type=float, default=120.0,
+                            help="skip larger sizes once one takes longer than this many seconds")
+    arg_parser.add_argument('--save', nargs='?', const=BASELINE, help="store the results as the baseline")
+    arg_parser.add_argument('--compare', nargs='?', const=BASELINE, help="compare against a stored baseline")
+    arg_parser.add_argument('--threshold', type=float, default=0.25, help="allowed slowdown (0.25 = 25%%)")
+    arg_parser.add_argument('--max-exponent', type=float, default=1.3,
+                            help="flag phases whose fitted scaling exponent exceeds this")
+    arg_parser.add_argument('--memory', nargs='?', const='100KB', metavar='MAX_SIZE',
+                            help="also trace allocations per phase for sizes up to MAX_SIZE (default 100KB); "
+                                 "tracing is slow, so larger sizes are skipped")
+    arg_parser.add_argument('--output', help="write the results JSON here")
+    args = arg_parser.parse_args(argv)
+
+    sizes = [parse_size(size) for size in args.sizes.split(',')]
+    memory_limit = parse_size(args.memory) if args.memory else None
+    results = run_suite(sizes, args.seed, args.repeat, args.budget, memory_limit)
+    problems = report_scaling(results, args.max_exponent)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        # Against a baseline only changes are flagged, so known superlinear
+        # phases do not fail every run until they are fixed
+        problems = compare(results, baseline, args.threshold, args.max_exponent)
+    for path in filter(None, (args.save, args.output)):
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+
+    if problems:
+        print("\n" + "\n".join(f"FLAGGED: {problem}" for problem in problems))
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from generator import generate_program
+from gui_views import AstView
+from pipeline import CompilerPipeline
+
+SIZE = 2 * 1024 * 1024
+# Rows a table view shows at a time
+SCREEN_ROWS = 40
+
+
+def timed(func):
+    start = time.perf_counter()
+    value = func()
+    return time.perf_counter() - start, value
+
+
+def text_listings(result):
+    # What the tabs formatted before they became views: every token, every
+    # top-level AST node and the whole symbol table, as text
+    tokens = "\n".join(f"{token['line']}:{token['col']} \t{token['type']} \t'{token['value']}'"
+                       for token in result.tokens)
+    ast = "\n".join(str(node) for node in result.ast)
+    return len(tokens) + len(ast) + len(str(result.symbol_table))
+
+
+def screen(result):
+    # What the views format to show their first screen
+    middle = len(result.tokens) // 2
+    tokens = [(f"{token['line']}:{token['col']}", token['type'], token['value'])
+              for token in result.tokens[middle:middle + SCREEN_ROWS]]
+    symbols = [(entry['name'], entry['type'], str(entry['value']), entry['scope'])
+               for entry in result.symbol_table.table[:SCREEN_ROWS]]
+    # The AST view labels the first batch of top-level nodes up front
+    ast = [AstView.describe(AstView, None, node) for node in result.ast[:AstView.BATCH]]
+    return len(tokens) + len(symbols) + len(ast)
+
+
+def main():
+    # The views hand Tk a screenful of rows, the text tabs everything; this
+    # measures the formatting side, which needs no display
+    result = CompilerPipeline(optimize=False).compile_source(generate_program(SIZE))
+    assert result.succeeded
+    print(f"{len(result.tokens):,} tokens, {len(result.ast):,} top-level AST nodes, "
+          f"{len(result.symbol_table):,} symbols")
+    seconds, characters = timed(lambda: text_listings(result))
+    print(f"text listings: {seconds * 1000:8.1f} ms, {characters / 2 ** 20:.1f} MB of text to insert")
+    seconds, rows = timed(lambda: screen(result))
+    print(f"view screens:  {seconds * 1000:8.3f} ms, {rows} rows")
+
+
+if __name__ == "__main__":
+    main()
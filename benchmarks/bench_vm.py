@@ -0,0 +1,248 @@
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from bytecode import BytecodeCompiler, decode_string
+from lexer import LexicalAnalyzer
+from parser import SyntaxParser
+from symbol_table import SymbolTable
+from vm import VirtualMachine, format_value
+
+
+class ReturnSignal(Exception):
+    def __init__(self, value):
+        self.value = value
+
+
+class BreakSignal(Exception):
+    pass
+
+
+class ContinueSignal(Exception):
+    pass
+
+
+class TreeWalker:
+    # Naive reference evaluator: walks the AST with dict scopes
+
+    def __init__(self):
+        self.output = []
+        self.functions = {}
+
+    def run(self, ast):
+        self.output = []
+        globals_ = {}
+        self.functions = {node[2]: node for node in ast if node[0] == 'function'}
+        for node in ast:
+            if node[0] == 'declaration':
+                globals_[node[2]] = self.evaluate(node[3], [globals_]) if node[3] else 0
+        return self.call('main', [], globals_)
+
+    def call(self, name, args, globals_):
+        _, _, _, params, body = self.functions[name]
+        try:
+            self.execute_block(body, [globals_, {p_name: value for (_, p_name), value in zip(params, args)}])
+        except ReturnSignal as signal:
+            return signal.value
+        return 0
+
+    def execute_block(self, body, scopes):
+        scopes = scopes + [{}]
+        for stmt in body:
+            self.execute(stmt, scopes)
+
+    def execute(self, stmt, scopes):
+        kind = stmt[0]
+        if kind == 'declaration':
+            scopes[-1][stmt[2]] = self.evaluate(stmt[3], scopes) if stmt[3] else 0
+        elif kind == 'expression':
+            self.evaluate(stmt[1], scopes)
+        elif kind == 'if':
+            if self.evaluate(stmt[1], scopes):
+                self.execute_block(stmt[2], scopes)
+            elif stmt[3]:
+                self.execute_block(stmt[3], scopes)
+        elif kind == 'while':
+            self.loop([], stmt[1], [], stmt[2], scopes)
+        elif kind == 'for':
+            self.loop(*stmt[1:], scopes)
+        elif kind == 'break':
+            raise BreakSignal()
+        elif kind == 'continue':
+            raise ContinueSignal()
+        elif kind == 'return':
+            raise ReturnSignal(self.evaluate(stmt[1], scopes) if stmt[1] else 0)
+        elif kind == 'print':
+            for item in stmt[1]:
+                self.output.append(format_value(self.evaluate(item, scopes)))
+
+    def loop(self, init, condition, updates, body, scopes):
+        scopes = scopes + [{}]
+        for stmt in init:
+            self.execute(stmt, scopes)
+        while condition is None or self.evaluate(condition, scopes):
+            try:
+                self.execute_block(body, scopes)
+            except BreakSignal:
+                break
+            except ContinueSignal:
+                pass
+            for update in updates:
+                self.evaluate(update, scopes)
+
+    def lookup(self, name, scopes):
+        for scope in reversed(scopes):
+            if name in scope:
+                return scope
+        raise NameError(name)
+
+    def evaluate(self, expr, scopes):
+        kind = expr[0]
+        if kind == 'literal':
+            if expr[1] == 'int':
+                return int(expr[2])
+            if expr[1] == 'float':
+                return float(expr[2])
+            return decode_string(expr[2])
+        if kind == 'variable':
+            return self.lookup(expr[1], scopes)[expr[1]]
+        if kind == 'assignment':
+            value = self.evaluate(expr[2], scopes)
+            self.lookup(expr[1][1], scopes)[expr[1][1]] = value
+            return value
+        if kind == 'call':
+            return self.call(expr[1], [self.evaluate(arg, scopes) for arg in expr[2]], scopes[0])
+        if kind == 'unary_op':
+            value = self.evaluate(expr[2], scopes)
+            return -value if expr[1] == '-' else int(not value)
+        op = expr[1]
+        a = self.evaluate(expr[2], scopes)
+        b = self.evaluate(expr[3], scopes)
+        if op == '+':
+            return a + b
+        if op == '-':
+            return a - b
+        if op == '*':
+            return a * b
+        if op in ('/', '%'):
+            q = abs(a) // abs(b)
+            if (a < 0) != (b < 0):
+                q = -q
+            return q if op == '/' else a - q * b
+        return int({'<': a < b, '>': a > b, '<=': a <= b, '>=': a >= b,
+                    '==': a == b, '!=': a != b}[op])
+
+
+def arithmetic_program(statements, seed=1):
+    # Straight-line arithmetic over a handful of variables, with branches
+    rng = random.Random(seed)
+    names = ['a', 'b', 'c', 'd', 'e']
+    lines = ["int main() {"]
+    for i, name in enumerate(names):
+        lines.append(f"    int {name} = {i + 3};")
+    for _ in range(statements):
+        target, x, y = rng.choice(names), rng.choice(names), rng.choice(names)
+        op = rng.choice(['+', '-', '*', '%', '/'])
+        if op in ('%', '/'):
+            lines.append(f"    {target} = ({x} * {y} + 7) {op} {rng.randint(2, 9)};")
+        elif rng.random() < 0.2:
+            lines.append(f"    if ({x} > {y}) {{ {target} = {x} - {y}; }} else {{ {target} = {y} {op} 3; }}")
+        else:
+            lines.append(f"    {target} = ({x} {op} {y}) % 1000;")
+    lines.append("    cout << a << \" \" << b << \" \" << c << endl;")
+    lines.append("    return a % 256;")
+    lines.append("}")
+    return "\n".join(lines)
+
+
+def loop_program(iterations, seed=1):
+    # Nested counting loops around arithmetic on the loop variables
+    rng = random.Random(seed)
+    inner = 50
+    lines = ["int main() {", "    int total = 0;", f"    int width = {inner};"]
+    lines.append(f"    for (int i = 0; i < {iterations // inner}; i++) {{")
+    lines.append("        int j = 0;")
+    lines.append("        while (j < width) {")
+    for _ in range(3):
+        op = rng.choice(['+', '-', '*'])
+        lines.append(f"            total = (total + i * width + j {op} {rng.randint(2, 9)}) % 100003;")
+    lines.append("            j = j + 1;")
+    lines.append("            if (j % 7 == 0) continue;")
+    lines.append("            if (total < 0) break;")
+    lines.append("        }")
+    lines.append("    }")
+    lines.append("    cout << total << endl;")
+    lines.append("    return total % 256;")
+    lines.append("}")
+    return "\n".join(lines)
+
+
+def call_program(calls, seed=1):
+    # A recursive function plus small helpers called from a loop
+    rng = random.Random(seed)
+    lines = [
+        "int fib(int n) {",
+        "    if (n < 2) return n;",
+        "    return fib(n - 1) + fib(n - 2);",
+        "}",
+        "int mix(int a, int b) {",
+        "    return (a * 31 + b) % 10007;",
+        "}",
+        "int clamp(int v, int lo, int hi) {",
+        "    if (v < lo) return lo;",
+        "    if (v > hi) return hi;",
+        "    return v;",
+        "}",
+        "int main() {",
+        "    int h = 0;",
+        f"    for (int i = 0; i < {calls // 2}; i++) {{",
+        f"        h = mix(h, clamp(i % {rng.randint(50, 99)}, 10, {rng.randint(20, 40)}));",
+        "    }",
+        f"    cout << h << \" \" << fib({rng.randint(12, 16)}) << endl;",
+        "    return h % 256;",
+        "}",
+    ]
+    return "\n".join(lines)
+
+
+def parse(source):
+    symbol_table = SymbolTable()
+    tokens = LexicalAnalyzer(symbol_table).tokenize(source)
+    return SyntaxParser(symbol_table).parse(tokens)
+
+
+def best_of(runs, func):
+    best = float('inf')
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    print(f"{'workload':<28}{'tree-walk':>12}{'bytecode':>12}{'speedup':>10}")
+    workloads = [(f"arithmetic x{statements}", arithmetic_program(statements))
+                 for statements in (1000, 10000, 50000)]
+    workloads += [(f"loops x{iterations}", loop_program(iterations)) for iterations in (1000, 10000)]
+    workloads += [(f"calls x{calls}", call_program(calls)) for calls in (1000, 10000)]
+    for name, source in workloads:
+        ast = parse(source)
+        program = BytecodeCompiler().compile(ast)
+        walker = TreeWalker()
+        vm = VirtualMachine()
+
+        expected = walker.run(ast)
+        vm.run(program)
+        assert vm.return_value == expected and vm.get_output() == "".join(walker.output)
+
+        walk_time = best_of(5, lambda: walker.run(ast))
+        vm_time = best_of(5, lambda: vm.run(program))
+        print(f"{name:<28}{walk_time * 1000:>10.2f}ms{vm_time * 1000:>10.2f}ms{walk_time / vm_time:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from compile_worker import CompileWorker
+from generator import generate_program
+from pipeline import CompilerPipeline
+
+# The GUI drains the worker queue every 20 ms; this is the delay an event
+# handler waiting behind a compile would see
+TICK = 0.02
+
+
+def event_loop(worker, generation):
+    # Stands in for Tk's main loop: polls every TICK and records how late
+    # each poll ran. Returns (worst delay, seconds until done, phase arrival times).
+    start = time.perf_counter()
+    expected = start + TICK
+    worst = 0.0
+    phases = []
+    while True:
+        time.sleep(max(0.0, expected - time.perf_counter()))
+        now = time.perf_counter()
+        worst = max(worst, now - expected)
+        for kind, event_generation, phase, result in worker.poll():
+            if kind == 'phase':
+                phases.append((phase, now - start))
+            elif event_generation == generation:
+                return worst, now - start, phases, result
+        expected = now + TICK
+
+
+def main():
+    source = generate_program(256 * 1024)
+    pipeline = CompilerPipeline()
+    start = time.perf_counter()
+    pipeline.compile_source(source)
+    blocking = time.perf_counter() - start
+    print(f"{len(source):,} byte program")
+    print(f"synchronous compile blocks the loop for {blocking * 1000:.0f} ms")
+
+    worker = CompileWorker(pipeline)
+    worst, total, phases, result = event_loop(worker, worker.submit(source))
+    assert result.succeeded
+    print(f"background compile: done after {total * 1000:.0f} ms, worst event-loop delay {worst * 1000:.1f} ms")
+    print("  " + ", ".join(f"{phase} at {seconds * 1000:.0f} ms" for phase, seconds in phases))
+
+    # A newer request supersedes the one in flight
+    worker.submit(source)
+    time.sleep(0.1)
+    small = worker.submit("int main() { return 0; }")
+    worst, total, phases, result = event_loop(worker, small)
+    assert result.succeeded and len(result.tokens) < 20
+    print(f"superseded compile: newer result after {total * 1000:.0f} ms, worst delay {worst * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import argparse
+import random
+import sys
+
+UNITS = {'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+
+
+def parse_size(text):
+    # '1KB', '100MB', '4096' -> bytes
+    text = text.strip().upper()
+    for unit in sorted(UNITS, key=len, reverse=True):
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * UNITS[unit])
+    return int(text)
+
+
+def format_size(size):
+    for unit in ('GB', 'MB', 'KB'):
+        if size >= UNITS[unit] and size % UNITS[unit] == 0:
+            return f"{size // UNITS[unit]}{unit}"
+    return f"{size}B"
+
+
+class ProgramGenerator:
+    # Seeded generator for programs in the subset the compiler accepts:
+    # global and local int declarations, if/else, nested arithmetic and
+    # comparison expressions, output statements and many functions.
+
+    ARITHMETIC_OPS = ['+', '-', '*', '+', '-']
+    COMPARISON_OPS = ['<', '>', '==', '!=', '<=', '>=']
+
+    def __init__(self, seed=1):
+        self.rng = random.Random(seed)
+        self.globals = []
+        self.function_count = 0
+
+    def expression(self, names, depth):
+        # Integer-valued expression; comparisons are typed bool and only
+        # appear in conditions and output
+        rng = self.rng
+        if depth <= 0 or rng.random() < 0.3:
+            if names and rng.random() < 0.7:
+                return rng.choice(names)
+            return str(rng.randint(0, 99))
+        roll = rng.random()
+        if roll < 0.15:
+            # Division only by non-zero constants
+            op = rng.choice(['/', '%'])
+            return f"({self.expression(names, depth - 1)} {op} {rng.randint(1, 9)})"
+        if roll < 0.2:
+            # Parenthesised so nested negation never lexes as '--'
+            return f"(-{self.expression(names, depth - 1)})"
+        op = rng.choice(self.ARITHMETIC_OPS)
+        return f"({self.expression(names, depth - 1)} {op} {self.expression(names, depth - 1)})"
+
+    def condition(self, names):
+        if self.rng.random() < 0.2:
+            return self.expression(names, 2)
+        op = self.rng.choice(self.COMPARISON_OPS)
+        return f"{self.expression(names, 2)} {op} {self.expression(names, 2)}"
+
+    def block(self, names, indent, depth):
+        rng = self.rng
+        names = list(names)
+        lines = []
+        pad = "    " * indent
+        for _ in range(rng.randint(2, 5)):
+            roll = rng.random()
+            if roll < 0.35 or not names:
+                name = f"v{indent}_{len(names)}"
+                lines.append(f"{pad}int {name} = {self.expression(names, 3)};")
+                names.append(name)
+            elif roll < 0.6:
+                lines.append(f"{pad}{rng.choice(names)} = {self.expression(names, 3)};")
+            elif roll < 0.8 and depth > 0:
+                lines.append(f"{pad}if ({self.condition(names)}) {{")
+                lines += self.block(names, indent + 1, depth - 1)
+                if rng.random() < 0.5:
+                    lines.append(f"{pad}}} else {{")
+                    lines += self.block(names, indent + 1, depth - 1)
+                lines.append(f"{pad}}}")
+            else:
+                lines.append(f"{pad}cout << \"{rng.choice(names)} = \" << ({self.condition(names)}) << endl;")
+        return lines
+
+    def function(self):
+        rng = self.rng
+        name = f"f{self.function_count}"
+        self.function_count += 1
+        params = [f"p{i}" for i in range(rng.randint(0, 3))]
+        lines = [f"int {name}({', '.join('int ' + p for p in params)}) {{"]
+        lines += self.block(params + self.globals, 1, 2)
+        lines.append(f"    return {self.expression(params + self.globals, 2)};")
+        lines.append("}")
+        return "\n".join(lines) + "\n\n"
+
+    def global_declaration(self):
+        name = f"g{len(self.globals)}"
+        self.globals.append(name)
+        return f"int {name} = {self.rng.randint(0, 1000)};\n"
+
+    def chunks(self, target_size):
+        # Yields source text until roughly `target_size` characters
+        size = 0
+        main = "int main() {\n    return 0;\n}\n"
+        while size + len(main) < target_size:
+            chunk = self.global_declaration() if self.rng.random() < 0.1 else self.function()
+            size += len(chunk)
+            yield chunk
+        yield main
+
+    def generate(self, target_size):
+        return "".join(self.chunks(target_size))
+
+
+def generate_program(target_size, seed=1):
+    return ProgramGenerator(seed).generate(target_size)
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Generate a benchmark program")
+    arg_parser.add_argument('size', help="approximate size, e.g. 64KB or 100MB")
+    arg_parser.add_argument('--seed', type=int, default=1)
+    arg_parser.add_argument('-o', '--output', help="output file (default stdout)")
+    args = arg_parser.parse_args(argv)
+
+    out = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        # Written chunk by chunk so very large programs never sit in memory
+        for chunk in ProgramGenerator(args.seed).chunks(parse_size(args.size)):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
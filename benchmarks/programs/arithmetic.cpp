@@ -0,0 +1,16 @@
+int poly(int x) {
+    int a = 3;
+    int b = 7;
+    int c = a * x * x + b * x + 11;
+    int d = (c - a) * (b + 2) - (x + 1) * (x - 1);
+    int e = d / 4 + c / 2 - (a + b) * 3;
+    return e + d - c;
+}
+
+int main() {
+    int x = 12;
+    int y = x * 8 + 3;
+    y = y - x * 2;
+    y = (y + 1) * (y - 1) / 3;
+    return y;
+}
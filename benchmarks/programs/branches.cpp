@@ -0,0 +1,38 @@
+int clamp(int v) {
+    int lo = 0;
+    int hi = 100;
+    if (v < lo) {
+        v = lo;
+    }
+    if (v > hi) {
+        v = hi;
+    } else {
+        v = v + 1;
+    }
+    return v;
+}
+
+int sign(int v) {
+    int s = 0;
+    if (v > 0) {
+        s = 1;
+    } else {
+        if (v < 0) {
+            s = 0 - 1;
+        }
+    }
+    return s;
+}
+
+int main() {
+    int a = 42;
+    int b = 7;
+    if (a > b) {
+        a = a - b;
+        if (a > 10) {
+            a = a / 2;
+        }
+    }
+    if (b < a) b = b + 1;
+    return a + b;
+}
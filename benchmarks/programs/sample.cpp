@@ -0,0 +1,10 @@
+#include <iostream>
+
+int main() {
+    int x = 5;
+    float y = 3.14;
+    if (x > 0) {
+        x = x * 2;
+    }
+    return 0;
+}
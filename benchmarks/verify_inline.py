@@ -0,0 +1,78 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from native import NativeRunner, ToolchainError
+from pipeline import CompilerPipeline
+
+# Calls whose arguments have side effects. Inlined or not, the arguments
+# must be evaluated in the order generate_call uses (right to left), so
+# optimized and unoptimized builds print the same. Ints passed to and
+# returned from float functions must be converted as a call converts them.
+PRELUDE = """
+int g = 1;
+int inc() {
+    g = g + 1;
+    return g;
+}
+int h(int a, int b) {
+    return a * 10 + b;
+}
+int pick(int a, int b, int c) {
+    if (a > b) return a * 100 + c;
+    return b * 100 + c;
+}
+float half(float x) {
+    return x / 2;
+}
+float whole(int n) {
+    return n;
+}
+"""
+
+CASES = {
+    'global and side effect': "int x = h(g, inc());\n    cout << x << endl;",
+    'two side effects': "int x = h(inc(), inc());\n    cout << x << endl;",
+    'printed': "cout << h(g, inc()) << \" \" << h(inc(), g) << endl;",
+    'assigned': "int x = 0;\n    x = h(inc(), inc());\n    cout << x << endl;",
+    'branchy callee': "int x = pick(inc(), g, inc());\n    cout << x << endl;",
+    'nested': "int x = h(h(g, inc()), inc());\n    cout << x << endl;",
+    'int to float parameter': "cout << half(g) << \" \" << half(5) << \" \" << half(inc()) << endl;",
+    'int returned as float': "float x = whole(g) / 4;\n    cout << x << \" \" << whole(3) / 2 << endl;",
+    'in a loop': "int t = 0;\n    for (int i = 0; i < 3; i++) {\n"
+                 "        t = t + h(inc(), g);\n    }\n    cout << t << endl;",
+}
+
+
+def program(body):
+    return f"{PRELUDE}int main() {{\n    {body}\n    return 0;\n}}\n"
+
+
+def main():
+    runner = NativeRunner()
+    builds = {
+        'unoptimized': CompilerPipeline(optimize=False),
+        'no inlining': CompilerPipeline(inline_threshold=0),
+        'inlined': CompilerPipeline(),
+    }
+    failed = 0
+    for name, body in CASES.items():
+        outputs = {}
+        for build, pipeline in builds.items():
+            result = pipeline.compile_source(program(body))
+            assert result.succeeded, (name, build, result.errors)
+            try:
+                outputs[build] = runner.run(result.assembly).stdout
+            except ToolchainError as e:
+                print(f"native runs skipped: {e}")
+                return
+        if len(set(outputs.values())) != 1:
+            print(f"FAIL {name}: {outputs}")
+            failed += 1
+    print(f"{len(CASES) - failed}/{len(CASES)} inlined calls print as when not inlined")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
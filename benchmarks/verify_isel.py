@@ -0,0 +1,107 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from code_gen import CodeGenerator
+from symbol_table import SymbolTable
+
+# Constants chosen to hit every selection path: identity, shifts, lea,
+# lea + shift, imul immediate, power-of-two and magic-number division,
+# negative divisors and constants that need a 64-bit immediate.
+CONSTANTS = [0, 1, -1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 12, 16, 18, 24, 25, 40, 64, 72, 100,
+             1000, 641, 1 << 20, -2, -3, -8, -10, -1000, (1 << 31) - 1, 1 << 40, 10 ** 12 + 7]
+OPERATORS = ['+', '-', '*', '/', '%', '<', '>', '<=', '>=', '==', '!=']
+VALUES = [0, 1, -1, 2, -2, 7, -7, 8, -8, 9, 100, -100, 12345, -12345, 999999937,
+          -999999937, 1 << 32, -(1 << 32) - 5, (1 << 40) + 123, -(1 << 40) - 123,
+          (1 << 62) - 1, -(1 << 62)]
+
+
+def literal(value):
+    node = ('literal', 'int', str(abs(value)))
+    return ('unary_op', '-', node) if value < 0 else node
+
+
+def cases():
+    # (operator, left, right, C expression, constant, constant is the left operand)
+    for op in OPERATORS:
+        for constant in CONSTANTS:
+            if op in ('/', '%') and constant == 0:
+                continue
+            yield op, ('variable', 'x'), literal(constant), f"x {op} {constant}LL", constant, False
+            if op not in ('/', '%'):
+                yield op, literal(constant), ('variable', 'x'), f"{constant}LL {op} x", constant, True
+
+
+def overflows(op, constant, on_left, value):
+    # Skip inputs whose C result is undefined behaviour
+    left, right = (constant, value) if on_left else (value, constant)
+    if op == '+':
+        result = left + right
+    elif op == '-':
+        result = left - right
+    elif op == '*':
+        result = left * right
+    else:
+        return False
+    return not -(1 << 63) <= result < (1 << 63)
+
+
+def build_assembly(selected):
+    # Each case becomes `long f<i>(long x) { return <expr>; }`
+    ast = [('function', 'int', f"f{index}", [('int', 'x')], [('return', ('binary_op', op, left, right))])
+           for index, (op, left, right, _, _, _) in enumerate(selected)]
+    assembly = CodeGenerator(SymbolTable()).generate(ast)
+    exports = "".join(f".global f{index}\n" for index in range(len(selected)))
+    return exports + assembly + "\n"
+
+
+def build_driver(selected):
+    lines = ["#include <stdio.h>", ""]
+    for index, (_, _, _, c_expr, _, _) in enumerate(selected):
+        lines.append(f"long long f{index}(long long x);")
+        lines.append(f"static long long r{index}(long long x) {{ return {c_expr}; }}")
+    lines.append("int main(void) {")
+    lines.append("    int failures = 0;")
+    lines.append("    long long x;")
+    for index, (op, _, _, c_expr, constant, on_left) in enumerate(selected):
+        for value in VALUES:
+            if overflows(op, constant, on_left, value):
+                continue
+            lines.append(f"    x = {value}LL;")
+            lines.append(f"    if (f{index}(x) != r{index}(x)) {{ failures++; "
+                         f"printf(\"FAIL %s with x=%lld: got %lld, expected %lld\\n\", "
+                         f"\"{c_expr}\", x, f{index}(x), r{index}(x)); }}")
+    lines.append("    printf(\"%d failures\\n\", failures);")
+    lines.append("    return failures != 0;")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    gcc = shutil.which("gcc")
+    if gcc is None:
+        print("gcc not found; skipping instruction selection verification")
+        return 0
+
+    selected = list(cases())
+    with tempfile.TemporaryDirectory() as workdir:
+        asm_path = os.path.join(workdir, "isel.s")
+        c_path = os.path.join(workdir, "driver.c")
+        exe_path = os.path.join(workdir, "driver")
+        with open(asm_path, "w") as f:
+            f.write(build_assembly(selected))
+        with open(c_path, "w") as f:
+            f.write(build_driver(selected))
+        subprocess.run([gcc, "-O0", "-fwrapv", "-o", exe_path, c_path, asm_path], check=True)
+        result = subprocess.run([exe_path], capture_output=True, text=True)
+        print(result.stdout, end="")
+        print(f"{len(selected)} expressions checked against gcc")
+        return result.returncode
+
+
+if __name__ == "__main__":
+    sys.exit(main())
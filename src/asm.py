@@ -0,0 +1,104 @@
+class Instruction:
+    __slots__ = ('opcode', 'operands', 'comment')
+
+    def __init__(self, opcode, *operands, comment=None):
+        self.opcode = opcode
+        self.operands = operands
+        self.comment = comment
+
+    def __str__(self):
+        text = f"  {self.opcode}"
+        if self.operands:
+            text += " " + ", ".join(self.operands)
+        if self.comment:
+            text += f"  # {self.comment}"
+        return text
+
+    def __repr__(self):
+        return f"Instruction({self.opcode!r}, {', '.join(map(repr, self.operands))})"
+
+    def __eq__(self, other):
+        return (isinstance(other, Instruction) and
+                self.opcode == other.opcode and
+                self.operands == other.operands)
+
+    def __hash__(self):
+        return hash((self.opcode, self.operands))
+
+
+class Label:
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __str__(self):
+        return f"{self.name}:"
+
+    def __repr__(self):
+        return f"Label({self.name!r})"
+
+    def __eq__(self, other):
+        return isinstance(other, Label) and self.name == other.name
+
+    def __hash__(self):
+        return hash(self.name)
+
+
+class Directive:
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return f"Directive({self.text!r})"
+
+    def __eq__(self, other):
+        return isinstance(other, Directive) and self.text == other.text
+
+    def __hash__(self):
+        return hash(self.text)
+
+
+def count_instructions(code):
+    return sum(1 for line in code if isinstance(line, Instruction))
+
+
+class AsmWriter:
+    # Renders lines into a text stream, writing in chunks of roughly
+    # `chunk_size` characters so the full listing is never held in memory.
+
+    def __init__(self, stream, chunk_size=1 << 16):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.pending = []
+        self.pending_size = 0
+        self.characters_written = 0
+
+    def write_lines(self, lines):
+        # `lines` may be a generator; chunks are written as it goes
+        for line in lines:
+            text = str(line)
+            self.pending.append(text)
+            self.pending_size += len(text) + 1
+            if self.pending_size >= self.chunk_size:
+                self.write_chunk()
+
+    def write_chunk(self):
+        if not self.pending:
+            return
+        self.pending.append("")
+        chunk = "\n".join(self.pending)
+        self.stream.write(chunk)
+        self.characters_written += len(chunk)
+        self.pending = []
+        self.pending_size = 0
+
+    def flush(self):
+        self.write_chunk()
+        if hasattr(self.stream, 'flush'):
+            self.stream.flush()
@@ -0,0 +1,408 @@
+from array import array
+
+from value_types import expression_type, is_float
+
+# Register-based bytecode. Every instruction is four array slots wide:
+# opcode, a, b, c. Operands name registers in the current frame; negative
+# register numbers address the function's constant pool, which the VM
+# appends to each frame in reverse so that register -(k + 1) holds
+# constants[k].
+MOVE = 0            # a = b
+LOAD_GLOBAL = 1     # a = globals[b]
+STORE_GLOBAL = 2    # globals[a] = b
+ADD = 3             # a = b + c
+SUB = 4
+MUL = 5
+DIV = 6
+MOD = 7
+LT = 8
+GT = 9
+LE = 10
+GE = 11
+EQ = 12
+NE = 13
+NEG = 14            # a = -b
+NOT = 15            # a = !b
+JUMP = 16           # pc = a
+JUMP_IF_FALSE = 17  # pc = b if not a
+PRINT = 18          # output a
+RETURN = 19         # return a
+JUMP_IF_TRUE = 20   # pc = b if a
+CALL = 21           # a = functions[b](c, c + 1, ...), one register per parameter
+TO_FLOAT = 22       # a = float(b)
+
+INSTRUCTION_SIZE = 4
+
+OPERAND_COUNTS = {MOVE: 2, LOAD_GLOBAL: 2, STORE_GLOBAL: 2, NEG: 2, NOT: 2, TO_FLOAT: 2,
+                  JUMP: 1, JUMP_IF_FALSE: 2, JUMP_IF_TRUE: 2, PRINT: 1, RETURN: 1}
+
+OPCODE_NAMES = {value: name for name, value in globals().items()
+                if name.isupper() and isinstance(value, int) and name != 'INSTRUCTION_SIZE'}
+
+BINARY_OPCODES = {
+    '+': ADD, '-': SUB, '*': MUL, '/': DIV, '%': MOD,
+    '<': LT, '>': GT, '<=': LE, '>=': GE, '==': EQ, '!=': NE,
+}
+UNARY_OPCODES = {'-': NEG, '!': NOT}
+
+
+class CompileError(Exception):
+    pass
+
+
+def decode_string(literal):
+    # Source string literal (with quotes) to its runtime value
+    return literal[1:-1].encode('latin-1', 'backslashreplace').decode('unicode_escape')
+
+
+def constant_register(index):
+    return -(index + 1)
+
+
+class Function:
+    def __init__(self, name, entry, num_params=0, num_registers=0, index=0):
+        self.name = name
+        self.entry = entry
+        self.num_params = num_params
+        self.num_registers = num_registers
+        # Position in Program.function_table, the operand of CALL
+        self.index = index
+        self.constants = []
+
+
+class Program:
+    def __init__(self):
+        self.code = array('q')
+        self.functions = {}
+        self.function_table = []
+        self.num_globals = 0
+        self.init = None
+
+    def disassemble(self):
+        lines = []
+        entries = {func.entry: func for func in self.functions.values()}
+        entries.setdefault(self.init.entry, self.init)
+        function = self.init
+        for pc in range(0, len(self.code), INSTRUCTION_SIZE):
+            if pc in entries:
+                function = entries[pc]
+                lines.append(f"{function.name}:")
+            op, *operands = self.code[pc:pc + INSTRUCTION_SIZE]
+            operands = operands[:OPERAND_COUNTS.get(op, 3)]
+            operands = ", ".join(self.describe(function, op, index, value) for index, value in enumerate(operands))
+            lines.append(f"  {pc:5} {OPCODE_NAMES[op]:<14}{operands}")
+        return "\n".join(lines)
+
+    def describe(self, function, op, index, value):
+        if op == JUMP or (op in (JUMP_IF_FALSE, JUMP_IF_TRUE) and index == 1):
+            return f"@{value}"
+        if (op == LOAD_GLOBAL and index == 1) or (op == STORE_GLOBAL and index == 0):
+            return f"g{value}"
+        if op == CALL and index == 1:
+            return self.function_table[value].name
+        if value < 0:
+            return repr(function.constants[-value - 1])
+        return f"r{value}"
+
+
+class BytecodeCompiler:
+    def __init__(self):
+        self.program = None
+        self.function = None
+        self.constant_index = {}
+        self.scopes = []
+        # {'break': [...], 'continue': [...]} jumps to patch, per enclosing loop
+        self.loops = []
+        self.global_slots = {}
+        # Declared types, so an int stored where a float is expected is
+        # converted as the native code does
+        self.global_types = {}
+        self.slot_types = {}
+        # name -> (return type, parameter types)
+        self.signatures = {}
+        self.return_type = 'int'
+        self.num_locals = 0
+        self.num_temps = 0
+        self.max_registers = 0
+
+    def compile(self, ast):
+        self.program = Program()
+        self.global_slots = {}
+        self.global_types = {}
+        self.signatures = {node[2]: (node[1], [p_type for p_type, _ in node[3]])
+                           for node in ast if node[0] == 'function'}
+
+        # Every function has its CALL index before any body is compiled,
+        # so calls may come before the definition
+        for node in ast:
+            if node[0] == 'function' and node[2] not in self.program.functions:
+                function = Function(node[2], None, len(node[3]), index=len(self.program.function_table))
+                self.program.functions[node[2]] = function
+                self.program.function_table.append(function)
+
+        # Global initialisers form their own routine, run before main
+        self.program.init = Function('<init>', self.here())
+        self.begin_function(self.program.init)
+        for node in ast:
+            if node[0] == 'declaration':
+                self.compile_global(node)
+        self.emit(RETURN, self.constant(0))
+        self.program.init.num_registers = self.max_registers
+
+        for node in ast:
+            if node[0] == 'function':
+                self.compile_function(node)
+
+        self.program.num_globals = len(self.global_slots)
+        if 'main' not in self.program.functions:
+            raise CompileError("No 'main' function defined")
+        return self.program
+
+    def emit(self, opcode, a=0, b=0, c=0):
+        self.program.code.extend((opcode, a, b, c))
+        return len(self.program.code) - INSTRUCTION_SIZE
+
+    def patch(self, index, slot, target):
+        self.program.code[index + 1 + slot] = target
+
+    def here(self):
+        return len(self.program.code)
+
+    def constant(self, value):
+        key = (type(value), value)
+        if key not in self.constant_index:
+            self.constant_index[key] = len(self.function.constants)
+            self.function.constants.append(value)
+        return constant_register(self.constant_index[key])
+
+    def begin_function(self, function):
+        # Each function has its own constant pool, so a call only copies
+        # the constants it uses into the new frame
+        self.function = function
+        self.constant_index = {}
+        self.scopes = [{}]
+        self.slot_types = {}
+        self.loops = []
+        self.num_locals = 0
+        self.num_temps = 0
+        self.max_registers = 0
+
+    def declare(self, name, var_type='int'):
+        # Locals and temporaries share the register file; temporaries are
+        # only live within a statement, so no temporary is live here.
+        slot = self.num_locals
+        self.scopes[-1][name] = slot
+        self.slot_types[slot] = var_type
+        self.num_locals += 1
+        self.max_registers = max(self.max_registers, self.num_locals)
+        return slot
+
+    def temp(self):
+        register = self.num_locals + self.num_temps
+        self.num_temps += 1
+        self.max_registers = max(self.max_registers, register + 1)
+        return register
+
+    def end_statement(self):
+        self.num_temps = 0
+
+    def zero(self, var_type):
+        return self.constant(0.0 if var_type in ('float', 'double') else 0)
+
+    def compile_global(self, node):
+        _, var_type, var_name, expr = node
+        slot = self.global_slots.setdefault(var_name, len(self.global_slots))
+        self.global_types[var_name] = var_type
+        value = self.compile_value(expr, var_type) if expr else self.zero(var_type)
+        self.emit(STORE_GLOBAL, slot, value)
+        self.end_statement()
+
+    def compile_function(self, node):
+        _, return_type, func_name, params, body = node
+        # A later definition of the same name replaces an earlier one
+        function = self.program.functions[func_name]
+        function.entry = self.here()
+        function.constants = []
+        self.begin_function(function)
+        self.return_type = return_type
+        for p_type, p_name in params:
+            self.declare(p_name or "", p_type)
+
+        self.compile_block(body)
+
+        # Falling off the end returns 0, as main does in C++
+        self.emit(RETURN, self.constant(0))
+        function.num_registers = self.max_registers
+
+    def resolve(self, name):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name], None
+        if name in self.global_slots:
+            return None, self.global_slots[name]
+        raise CompileError(f"Undefined variable '{name}'")
+
+    def variable_type(self, name):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return self.slot_types[scope[name]]
+        return self.global_types.get(name)
+
+    def return_type_of(self, name):
+        return self.signatures[name][0] if name in self.signatures else None
+
+    def compile_block(self, body):
+        self.scopes.append({})
+        for stmt in body:
+            self.compile_statement(stmt)
+            self.end_statement()
+        self.scopes.pop()
+
+    def compile_statement(self, node):
+        kind = node[0]
+        if kind == 'declaration':
+            _, var_type, var_name, expr = node
+            slot = self.declare(var_name, var_type)
+            if expr:
+                self.compile_value(expr, var_type, slot)
+            else:
+                self.emit(MOVE, slot, self.zero(var_type))
+        elif kind == 'expression':
+            self.compile_expression(node[1])
+        elif kind == 'if':
+            _, condition, body, else_body = node
+            jump_else = self.emit(JUMP_IF_FALSE, self.compile_expression(condition))
+            self.end_statement()
+            self.compile_block(body)
+            if else_body:
+                jump_end = self.emit(JUMP)
+                self.patch(jump_else, 1, self.here())
+                self.compile_block(else_body)
+                self.patch(jump_end, 0, self.here())
+            else:
+                self.patch(jump_else, 1, self.here())
+        elif kind == 'while':
+            self.compile_loop([], node[1], [], node[2])
+        elif kind == 'for':
+            self.compile_loop(*node[1:])
+        elif kind in ('break', 'continue'):
+            self.loops[-1][kind].append(self.emit(JUMP))
+        elif kind == 'return':
+            value = self.compile_value(node[1], self.return_type) if node[1] else self.constant(0)
+            self.emit(RETURN, value)
+        elif kind == 'print':
+            for item in node[1]:
+                self.emit(PRINT, self.compile_expression(item))
+                self.end_statement()
+
+    def compile_loop(self, init, condition, updates, body):
+        # The test is at the bottom: one JUMP_IF_TRUE per iteration
+        self.scopes.append({})
+        for stmt in init:
+            self.compile_statement(stmt)
+            self.end_statement()
+        enter = self.emit(JUMP) if condition is not None else None
+        top = self.here()
+        jumps = {'break': [], 'continue': []}
+        self.loops.append(jumps)
+        self.compile_block(body)
+        self.loops.pop()
+        for index in jumps['continue']:
+            self.patch(index, 0, self.here())
+        for update in updates:
+            self.compile_expression(update)
+            self.end_statement()
+        if condition is None:
+            self.emit(JUMP, top)
+        else:
+            self.patch(enter, 0, self.here())
+            self.emit(JUMP_IF_TRUE, self.compile_expression(condition), top)
+            self.end_statement()
+        for index in jumps['break']:
+            self.patch(index, 0, self.here())
+        self.scopes.pop()
+
+    def compile_expression(self, node, dst=None):
+        # Returns the register holding the value. With `dst` the value is
+        # computed directly into that register.
+        kind = node[0]
+        if kind == 'literal':
+            if node[1] == 'int':
+                value = int(node[2])
+            elif node[1] == 'float':
+                value = float(node[2])
+            elif node[1] == 'string':
+                value = decode_string(node[2])
+            else:
+                raise CompileError(f"Unsupported literal type '{node[1]}'")
+            return self.move(dst, self.constant(value))
+        elif kind == 'variable':
+            local, global_slot = self.resolve(node[1])
+            if local is not None:
+                return self.move(dst, local)
+            register = self.temp() if dst is None else dst
+            self.emit(LOAD_GLOBAL, register, global_slot)
+            return register
+        elif kind == 'assignment':
+            target = node[1]
+            if not target or target[0] != 'variable':
+                raise CompileError("Invalid assignment target")
+            local, global_slot = self.resolve(target[1])
+            var_type = self.variable_type(target[1])
+            if local is not None:
+                self.compile_value(node[2], var_type, local)
+                return self.move(dst, local)
+            value = self.compile_value(node[2], var_type, dst)
+            self.emit(STORE_GLOBAL, global_slot, value)
+            return value
+        elif kind == 'binary_op':
+            _, op, left, right = node
+            if op not in BINARY_OPCODES:
+                raise CompileError(f"Unsupported operator '{op}'")
+            a = self.compile_expression(left)
+            b = self.compile_expression(right)
+            register = self.temp() if dst is None else dst
+            self.emit(BINARY_OPCODES[op], register, a, b)
+            return register
+        elif kind == 'unary_op':
+            _, op, operand = node
+            if op == '-' and operand[0] == 'literal' and operand[1] in ('int', 'float'):
+                return self.compile_expression(('literal', operand[1], '-' + operand[2]), dst)
+            if op not in UNARY_OPCODES:
+                raise CompileError(f"Unsupported operator '{op}'")
+            a = self.compile_expression(operand)
+            register = self.temp() if dst is None else dst
+            self.emit(UNARY_OPCODES[op], register, a)
+            return register
+        elif kind == 'call':
+            _, name, args = node
+            function = self.program.functions.get(name)
+            if function is None:
+                raise CompileError(f"Undefined function '{name}'")
+            if len(args) != function.num_params:
+                raise CompileError(f"Function '{name}' expects {function.num_params} argument(s), got {len(args)}")
+            # Arguments go in consecutive registers, allocated before any
+            # temporaries their expressions need
+            registers = [self.temp() for _ in args]
+            for arg, register, p_type in zip(args, registers, self.signatures[name][1]):
+                self.compile_value(arg, p_type, register)
+            register = self.temp() if dst is None else dst
+            self.emit(CALL, register, function.index, registers[0] if registers else 0)
+            return register
+        raise CompileError(f"Unsupported expression '{kind}'")
+
+    def compile_value(self, node, var_type, dst=None):
+        # `node` converted to `var_type`: an int becomes a float where one
+        # is expected
+        if not is_float(var_type) or expression_type(node, self.variable_type, self.return_type_of) == 'float':
+            return self.compile_expression(node, dst)
+        value = self.compile_expression(node)
+        register = self.temp() if dst is None else dst
+        self.emit(TO_FLOAT, register, value)
+        return register
+
+    def move(self, dst, src):
+        if dst is not None and dst != src:
+            self.emit(MOVE, dst, src)
+            return dst
+        return src
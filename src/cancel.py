@@ -0,0 +1,85 @@
+import time
+
+
+class CompileAborted(Exception):
+    def __init__(self, phase, elapsed, reason=None):
+        self.phase = phase
+        self.elapsed = elapsed
+        self.reason = reason
+        message = f"compilation aborted after {elapsed * 1000:.0f} ms in phase {phase}"
+        super().__init__(f"{message} ({reason})" if reason else message)
+
+
+class CancellationToken:
+    # Shared between a compile and whoever may stop it. The phases call
+    # check() from their loops; cancel() may be called from any thread and
+    # takes effect at the next poll. Budgets are in seconds.
+
+    # check() calls between polls; a phase loop iteration is a few
+    # microseconds, so a poll happens well under a millisecond apart
+    CHECK_INTERVAL = 128
+
+    def __init__(self, budget=None, phase_budgets=None):
+        self.budget = budget
+        self.phase_budgets = phase_budgets or {}
+        self.cancelled = False
+        self.reason = None
+        self.phase = None
+        self.started = self.phase_started = time.perf_counter()
+        self.deadline = None
+        self.countdown = self.CHECK_INTERVAL
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.enter('start')
+
+    def enter(self, phase):
+        # The earlier of the total and the phase deadline applies
+        self.phase = phase
+        self.phase_started = time.perf_counter()
+        deadlines = []
+        if self.budget is not None:
+            deadlines.append(self.started + self.budget)
+        if phase in self.phase_budgets:
+            deadlines.append(self.phase_started + self.phase_budgets[phase])
+        self.deadline = min(deadlines) if deadlines else None
+        self.poll()
+
+    def cancel(self, reason="cancelled"):
+        self.reason = reason
+        self.cancelled = True
+
+    def check(self):
+        self.countdown -= 1
+        if self.countdown <= 0:
+            self.countdown = self.CHECK_INTERVAL
+            self.poll()
+
+    def poll(self):
+        if self.cancelled:
+            raise CompileAborted(self.phase, time.perf_counter() - self.started, self.reason)
+        if self.deadline is not None:
+            now = time.perf_counter()
+            if now > self.deadline:
+                over = "total" if self.budget is not None and now > self.started + self.budget else self.phase
+                raise CompileAborted(self.phase, now - self.started, f"{over} time budget exceeded")
+
+
+class NeverCancelled:
+    # Shared token for compiles nobody can cancel
+    __slots__ = ()
+
+    def start(self):
+        pass
+
+    def enter(self, phase):
+        pass
+
+    def check(self):
+        pass
+
+    def poll(self):
+        pass
+
+
+NEVER_CANCELLED = NeverCancelled()
@@ -1,137 +1,951 @@
+import io
+import struct
+
+from asm import AsmWriter, Instruction, Label, Directive, count_instructions
+from cancel import NEVER_CANCELLED
+from isel import (LEA_FACTORS, constant_value, fits_imm32, float_value, fold_binary, fold_float,
+                  lea_decomposition, log2_exact, signed_magic)
+from inline import INLINE_THRESHOLD, Inliner
+from loops import LoopOptimizer, float_names, runs_once, walk
+from peephole import PeepholeOptimizer
+from value_numbering import ValueNumbering
+from value_types import expression_type, is_float
+
+COMMUTATIVE = {'+', '*'}
+SET_CONDITIONS = {'>': 'setg', '<': 'setl', '>=': 'setge', '<=': 'setle', '==': 'sete', '!=': 'setne'}
+JUMP_CONDITIONS = {'>': 'jg', '<': 'jl', '>=': 'jge', '<=': 'jle', '==': 'je', '!=': 'jne'}
+MIRRORED = {'>': '<', '<': '>', '>=': '<=', '<=': '>=', '==': '==', '!=': '!='}
+NEGATED = {'>': '<=', '<': '>=', '>=': '<', '<=': '>', '==': '!=', '!=': '=='}
+
+ARGUMENT_REGISTERS = ['%rdi', '%rsi', '%rdx', '%rcx', '%r8', '%r9']
+FLOAT_ARGUMENT_REGISTERS = [f'%xmm{n}' for n in range(8)]
+
+FLOAT_OPCODES = {'+': 'addsd', '-': 'subsd', '*': 'mulsd', '/': 'divsd'}
+# ucomisd sets the flags as an unsigned compare would, and CF, ZF and PF
+# when either operand is NaN. < and <= compare the operands the other way
+# round, as > and >=, so that unordered is false through `a` and `ae`.
+FLOAT_CONDITIONS = {'>': 'a', '>=': 'ae', '<': 'a', '<=': 'ae', '==': 'e', '!=': 'ne'}
+NEGATED_FLOAT_JUMPS = {'a': 'jbe', 'ae': 'jb'}
+
+def count_declarations(body):
+    count = 0
+    for stmt in body:
+        if stmt[0] == 'declaration':
+            count += 1
+        elif stmt[0] == 'if':
+            count += count_declarations(stmt[2]) + count_declarations(stmt[3] or [])
+        elif stmt[0] == 'while':
+            count += count_declarations(stmt[2])
+        elif stmt[0] == 'for':
+            count += count_declarations(stmt[1]) + count_declarations(stmt[4])
+    return count
+
+def argument_registers(types):
+    # System V: each int argument takes the next general register and each
+    # float the next XMM register; None for those passed on the stack
+    ints = iter(ARGUMENT_REGISTERS)
+    floats = iter(FLOAT_ARGUMENT_REGISTERS)
+    return [next(floats if is_float(var_type) else ints, None) for var_type in types]
+
+def double_bits(value):
+    return struct.unpack('<Q', struct.pack('<d', value))[0]
+
+def generate_function_buffer(task):
+    # Process pool entry point: generates one function with a fresh generator
+    node, global_inits, optimize, float_globals, float_signatures = task
+    codegen = CodeGenerator(None, optimize)
+    codegen.global_inits = global_inits
+    codegen.float_globals = float_globals
+    codegen.float_signatures = float_signatures
+    code, constants = codegen.generate_function_buffer(node)
+    return code, constants, codegen.peephole.stats
+
+
 class CodeGenerator:
-    def __init__(self, symbol_table):
+    def __init__(self, symbol_table, optimize=True, workers=1, executor=None, cancel=None,
+                 inline_threshold=INLINE_THRESHOLD, value_numbering=True):
         self.symbol_table = symbol_table
+        self.optimize = optimize
+        # Callee size limit for inlining when optimizing; 0 turns it off
+        self.inline_threshold = inline_threshold
+        # Common subexpression elimination when optimizing
+        self.value_numbering = value_numbering
+        self.inliner = None
+        # Checked between functions and statements; parallel workers finish
+        # the function they are on
+        self.cancel = cancel or NEVER_CANCELLED
+        # With more than one worker (or a caller-supplied executor) functions
+        # are generated in parallel; the output is identical either way.
+        self.workers = workers
+        self.executor = executor
+        self.peephole = PeepholeOptimizer()
         self.code = []
+        self.function_name = ""
         self.label_count = 0
-        
+        self.scopes = []
+        # (continue label, break label) of the loops being generated
+        self.loop_labels = []
+        # Quadwords pushed since the frame was set up, for call alignment
+        self.stack_depth = 0
+        self.globals = {}
+        self.global_inits = []
+        # Globals declared float, and name -> (return type, parameter types)
+        # of the functions taking or returning one; the rest are all int
+        self.float_globals = set()
+        self.float_signatures = {}
+        # Whether the function being generated involves floats at all, so
+        # integer-only code never pays for typing expressions
+        self.floating = False
+        self.return_type = 'int'
+        self.constants = {}
+        self.instruction_count = 0
+
     def generate(self, ast):
+        stream = io.StringIO()
+        self.write(ast, stream)
+        return stream.getvalue()
+
+    def write(self, ast, stream, chunk_size=1 << 16):
+        # Streams the assembly into `stream`. Each function is written out as
+        # soon as it is generated; string and float literals and globals are
+        # collected along the way and emitted in the data sections at the end.
+        writer = AsmWriter(stream, chunk_size)
+        self.globals = {}
+        self.global_inits = []
+        self.float_globals = set()
+        self.instruction_count = 0
+
+        for node in ast:
+            if node[0] == 'declaration':
+                self.declare_global(node)
+
+        writer.write_lines([Directive(".text"), Directive(".global main"), Directive("")])
+        functions = [node for node in ast if node[0] == 'function']
+        self.float_signatures = {}
+        for _, return_type, func_name, params, _ in functions:
+            types = [p_type for p_type, _ in params]
+            if is_float(return_type) or any(map(is_float, types)):
+                self.float_signatures[func_name] = (return_type, types)
+        # Buffers arrive in source order, so the result does not depend on
+        # which worker finished first.
+        # label -> directive; functions using the same literal have their own labels
+        all_constants = {}
+        for code, constants, stats in self.function_buffers(functions):
+            self.cancel.check()
+            writer.write_lines(code)
+            self.instruction_count += count_instructions(code)
+            all_constants.update((label, text) for text, label in constants.items())
+            if stats is not None:
+                self.peephole.stats.update(stats)
+        self.code = []
+        self.constants = all_constants
+
+        writer.write_lines(self.data_section())
+        writer.write_lines([Directive(".section .note.GNU-stack,\"\",@progbits")])
+        writer.flush()
+        return writer.characters_written
+
+    def function_buffers(self, functions):
+        optimized = self.optimize_functions(functions)
+        if len(functions) < 2 or (self.executor is None and self.workers <= 1):
+            for node in optimized:
+                yield self.generate_function_buffer(node) + (None,)
+            return
+        tasks = [(node, self.global_inits if node[2] == 'main' else [], self.optimize,
+                  self.float_globals, self.float_signatures)
+                 for node in optimized]
+        if self.executor is not None:
+            yield from self.executor.map(generate_function_buffer, tasks)
+            return
+        # Imported here: multiprocessing is only worth loading when used
+        from concurrent.futures import ProcessPoolExecutor
+        # Batch small functions so the pool is not dominated by IPC overhead
+        chunksize = max(1, len(tasks) // (self.workers * 4))
+        with ProcessPoolExecutor(self.workers) as executor:
+            yield from executor.map(generate_function_buffer, tasks, chunksize=chunksize)
+
+    def data_section(self):
+        # Yields the lines, so the writer can stream them out in chunks
+        yield Directive("")
+        yield Directive(".section .rodata")
+        # Doubles first, so they stay 8-byte aligned
+        yield Directive(".balign 8")
+        # String literals are kept as their quoted text, doubles as directives
+        for label, text in self.constants.items():
+            if text.startswith(".quad"):
+                yield Directive(f"{label}: {text}")
+        for label, text in self.constants.items():
+            if not text.startswith(".quad"):
+                yield Directive(f"{label}: .asciz {text}")
+        yield Directive("format_int: .asciz \"%ld\"")
+        yield Directive("format_float: .asciz \"%g\"")
+        yield Directive("format_string: .asciz \"%s\"")
+        yield Directive("")
+        yield Directive(".data")
+        for name, value in self.globals.items():
+            if name in self.float_globals:
+                yield Directive(f"{name}: .quad {double_bits(value):#x}  # {value!r}")
+            else:
+                yield Directive(f"{name}: .quad {value}")
+        yield Directive("")
+
+    def optimize_functions(self, functions):
+        # Yields each function ready to generate, optimized just before it
+        # is, so only one rewritten body is held at a time. Inlining needs
+        # every function, so it is set up here rather than in the workers.
+        global_types = {name: 'float' if name in self.float_globals else 'int' for name in self.globals}
+        self.inliner = Inliner({node[2]: node for node in functions}, self.inline_threshold, self.cancel,
+                               global_types)
+        for node in functions:
+            self.cancel.check()
+            yield self.optimize_function(node) if self.optimize else node
+
+    def optimize_function(self, node):
+        # The function with calls inlined, its loops rewritten and common
+        # subexpressions eliminated. Rewrites are counted with the peephole
+        # rules, so they are reported with them.
+        _, return_type, func_name, params, body = node
+        if self.inline_threshold > 0:
+            body = self.inliner.inline(func_name, params, body)
+        names = float_names(params, body, self.float_globals)
+        body = LoopOptimizer(self.peephole.stats, self.globals, names, self.cancel).optimize(body)
+        if self.value_numbering:
+            # The loop optimizer's temporaries may be floats too
+            names = float_names(params, body, self.float_globals)
+            body = ValueNumbering(self.peephole.stats, self.globals, names, self.cancel).optimize(body)
+        return ('function', return_type, func_name, params, body)
+
+    def generate_function_buffer(self, node):
+        # Code and literals of one function. Labels are namespaced by the
+        # function name, so buffers never depend on each other.
         self.code = []
+        self.constants = {}
+        self.function_name = node[2]
         self.label_count = 0
-        
-        self.code.append(".data")
-        self.code.append("format_int: .asciz \"%d\\n\"")
-        self.code.append("format_float: .asciz \"%f\\n\"")
-        self.code.append("")
-        self.code.append(".text")
-        self.code.append(".global main")
-        self.code.append("")
-        
-        for node in ast:
-            if node[0] == 'function':
-                self.generate_function(node)
-                
-        return "\n".join(self.code)
-        
+        self.generate_function(node)
+        if self.optimize:
+            self.code = self.peephole.optimize(self.code)
+        return self.code, self.constants
+
+    def emit(self, opcode, *operands, comment=None):
+        self.code.append(Instruction(opcode, *operands, comment=comment))
+
+    def label(self, name):
+        self.code.append(Label(name))
+
+    def directive(self, text):
+        self.code.append(Directive(text))
+
+    def declare_global(self, node):
+        _, var_type, var_name, expr = node
+        if is_float(var_type):
+            self.float_globals.add(var_name)
+            value = float_value(expr) if expr else 0.0
+        else:
+            value = constant_value(expr) if expr else 0
+        if value is None:
+            # Dynamic initialisers run at the start of main
+            self.global_inits.append((var_name, expr))
+            value = 0.0 if is_float(var_type) else 0
+        self.globals[var_name] = value
+
+    def declare_local(self, name, var_type='int'):
+        self.frame_slots += 1
+        operand = f"-{8 * self.frame_slots}(%rbp)"
+        self.scopes[-1][name] = (operand, var_type)
+        return operand
+
+    def variable_operand(self, name):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name][0]
+        return f"{name}(%rip)"
+
+    def variable_type(self, name):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name][1]
+        return 'float' if name in self.float_globals else 'int'
+
+    def function_return_type(self, name):
+        return self.float_signatures.get(name, ('int',))[0]
+
+    def expression_type(self, expr):
+        if not self.floating:
+            return 'int'
+        return expression_type(expr, self.variable_type, self.function_return_type)
+
+    def constant_label(self, text, kind):
+        if text not in self.constants:
+            self.constants[text] = f".L{self.function_name}_{kind}{len(self.constants)}"
+        return self.constants[text]
+
+    def string_label(self, text):
+        return self.constant_label(text, "str")
+
+    def float_label(self, value):
+        # Float literals live in .rodata, stored by their exact bits
+        return self.constant_label(f".quad {double_bits(value):#x}  # {value!r}", "dbl")
+
     def generate_function(self, node):
         _, return_type, func_name, params, body = node
-        
-        self.code.append(f"{func_name}:")
-        self.code.append("  push %rbp")
-        self.code.append("  mov %rsp, %rbp")
-        
+        self.exit_label = self.new_label()
+        self.scopes = [{}]
+        self.loop_labels = []
+        self.frame_slots = 0
+        self.stack_depth = 0
+        self.return_type = return_type
+        self.floating = bool(self.float_globals or self.float_signatures) or any(
+            (item[0] == 'literal' and item[1] == 'float') or (item[0] == 'declaration' and is_float(item[1]))
+            for item in walk(body))
+
+        self.label(func_name)
+        self.emit("push", "%rbp")
+        self.emit("mov", "%rsp", "%rbp")
+
+        # One 8-byte slot per register parameter and local, keeping %rsp
+        # 16-byte aligned
+        registers = argument_registers([p_type for p_type, _ in params])
+        register_params = len(params) - registers.count(None)
+        frame_size = 8 * (register_params + count_declarations(body))
+        frame_size = (frame_size + 15) // 16 * 16
+        if frame_size:
+            self.emit("sub", f"${frame_size}", "%rsp")
+        stack_index = 0
+        for (p_type, p_name), register in zip(params, registers):
+            if register is None:
+                # Pushed by the caller, above the return address
+                self.scopes[-1][p_name or ""] = (f"{16 + 8 * stack_index}(%rbp)", p_type)
+                stack_index += 1
+            else:
+                self.emit("movsd" if is_float(p_type) else "mov", register,
+                          self.declare_local(p_name or "", p_type), comment=f"Parameter {p_name}")
+
+        if func_name == 'main':
+            for var_name, expr in self.global_inits:
+                var_type = self.variable_type(var_name)
+                self.generate_value(expr, var_type)
+                self.store(var_type, self.variable_operand(var_name), comment=f"Initialise {var_name}")
+
         # Generate code for body
+        self.generate_block(body)
+
+        # Falling off the end returns 0
+        if is_float(return_type):
+            self.emit("xorpd", "%xmm0", "%xmm0")
+        else:
+            self.emit("mov", "$0", "%rax")
+        self.label(self.exit_label)
+        self.emit("mov", "%rbp", "%rsp")
+        self.emit("pop", "%rbp")
+        self.emit("ret")
+        self.directive("")
+
+    def generate_block(self, body):
+        self.scopes.append({})
         for stmt in body:
+            self.cancel.check()
             self.generate_statement(stmt)
-            
-        self.code.append("  mov %rbp, %rsp")
-        self.code.append("  pop %rbp")
-        self.code.append("  ret")
-        self.code.append("")
-        
+        self.scopes.pop()
+
     def generate_statement(self, node):
         if node[0] == 'declaration':
             self.generate_declaration(node)
         elif node[0] == 'if':
             self.generate_if(node)
+        elif node[0] == 'while':
+            self.generate_loop([], node[1], [], node[2])
+        elif node[0] == 'for':
+            self.generate_loop(*node[1:])
+        elif node[0] == 'break':
+            self.emit("jmp", self.loop_labels[-1][1])
+        elif node[0] == 'continue':
+            self.emit("jmp", self.loop_labels[-1][0])
         elif node[0] == 'return':
             self.generate_return(node)
-            
+        elif node[0] == 'expression':
+            self.generate_effect(node[1])
+        elif node[0] == 'print':
+            self.generate_print(node)
+
+    def generate_effect(self, expr):
+        # An expression evaluated only for its side effects. `x = x + e` and
+        # `x = x - e` then add to or subtract from x where it is stored, if
+        # both are ints.
+        if (expr[0] == 'assignment' and expr[1] and expr[1][0] == 'variable' and expr[2][0] == 'binary_op'
+                and self.expression_type(expr) == 'int' and self.expression_type(expr[2]) == 'int'):
+            target = expr[1]
+            _, op, left, right = expr[2]
+            if op == '+' and right == target:
+                left, right = right, left
+            if op in ('+', '-') and left == target and not any(
+                    node[0] == 'assignment' for node in walk(right)):
+                operand = self.variable_operand(target[1])
+                value = constant_value(right)
+                opcode = "add" if op == '+' else "sub"
+                if value is not None and fits_imm32(value):
+                    if value:
+                        self.emit(opcode + "q", f"${value}", operand, comment=f"Update {target[1]}")
+                else:
+                    self.generate_expression(right)
+                    self.emit(opcode, "%rax", operand, comment=f"Update {target[1]}")
+                return
+        self.generate_expression(expr)
+
     def generate_declaration(self, node):
         _, var_type, var_name, expr = node
-        
-        # Allocate space for variable
-        self.code.append(f"  sub $8, %rsp  # Allocate space for {var_name}")
-        
+        if var_type == 'auto':
+            # Optimizer temporaries take their initialiser's type
+            var_type = self.expression_type(expr)
+
+        # Generate the initialiser before the name is in scope
         if expr:
-            # Generate expression and store result
-            self.generate_expression(expr)
-            self.code.append(f"  mov %rax, -8(%rbp)  # Store {var_name}")
-            
+            self.generate_value(expr, var_type)
+            self.store(var_type, self.declare_local(var_name, var_type), comment=f"Store {var_name}")
+        else:
+            # All zero bits are 0.0 as well
+            self.emit("mov", "$0", "%rax")
+            self.emit("mov", "%rax", self.declare_local(var_name, var_type), comment=f"Store {var_name}")
+
+    def store(self, var_type, operand, comment=None):
+        # Stores the value generate_value left for `var_type`
+        if is_float(var_type):
+            self.emit("movsd", "%xmm0", operand, comment=comment)
+        else:
+            self.emit("mov", "%rax", operand, comment=comment)
+
+    def generate_print(self, node):
+        for item in node[1]:
+            # Variadic call: %al holds the number of vector registers used
+            if item[0] == 'literal' and item[1] == 'string':
+                self.emit("lea", f"{self.string_label(item[2])}(%rip)", "%rsi")
+                self.emit("lea", "format_string(%rip)", "%rdi")
+                self.emit("xor", "%eax", "%eax")
+            elif self.expression_type(item) == 'float':
+                self.generate_float(item)
+                self.emit("lea", "format_float(%rip)", "%rdi")
+                self.emit("mov", "$1", "%eax")
+            else:
+                self.generate_expression(item)
+                self.emit("mov", "%rax", "%rsi")
+                self.emit("lea", "format_int(%rip)", "%rdi")
+                self.emit("xor", "%eax", "%eax")
+            self.emit("call", "printf@PLT")
+
     def generate_if(self, node):
         _, condition, body, else_body = node
         label_else = self.new_label()
         label_end = self.new_label()
-        
+
         # Generate condition
-        self.generate_expression(condition)
-        self.code.append("  cmp $0, %rax")
-        self.code.append(f"  je {label_else}")
-        
+        self.generate_branch(condition, label_else, False)
+
         # Generate if body
-        for stmt in body:
-            self.generate_statement(stmt)
-        self.code.append(f"  jmp {label_end}")
-        
+        self.generate_block(body)
+        self.emit("jmp", label_end)
+
         # Generate else body if exists
-        self.code.append(f"{label_else}:")
+        self.label(label_else)
         if else_body:
-            for stmt in else_body:
-                self.generate_statement(stmt)
-                
-        self.code.append(f"{label_end}:")
-        
+            self.generate_block(else_body)
+
+        self.label(label_end)
+
+    def generate_loop(self, init, condition, updates, body):
+        # Laid out with the test at the bottom, so an iteration takes a
+        # single conditional branch back to the top:
+        #
+        #       init; jmp test
+        #   top:      body
+        #   continue: updates
+        #   test:     if condition goto top
+        #   break:
+        label_top = self.new_label()
+        label_continue = self.new_label()
+        label_test = self.new_label()
+        label_break = self.new_label()
+
+        # The init statements are scoped to the loop
+        self.scopes.append({})
+        for stmt in init:
+            self.generate_statement(stmt)
+        always = condition is None or (constant_value(condition) or 0) != 0
+        if not always:
+            self.emit("jmp", label_test)
+
+        self.label(label_top)
+        self.loop_labels.append((label_continue, label_break))
+        self.generate_block(body)
+        self.loop_labels.pop()
+
+        self.label(label_continue)
+        for update in updates:
+            self.generate_effect(update)
+        self.label(label_test)
+        if always:
+            # A block that always breaks out has no back edge
+            if not (condition is None and runs_once(body)):
+                self.emit("jmp", label_top)
+        else:
+            self.generate_branch(condition, label_top)
+        self.label(label_break)
+        self.scopes.pop()
+
+    def generate_branch(self, condition, label, when=True):
+        # Jumps to `label` if the condition's truth is `when`. Comparisons
+        # set the flags for a conditional jump instead of materialising 0/1.
+        if condition[0] == 'unary_op' and condition[1] == '!':
+            self.generate_branch(condition[2], label, not when)
+            return
+        if condition[0] == 'binary_op' and condition[1] in JUMP_CONDITIONS:
+            _, op, left, right = condition
+            if self.float_operands(left, right):
+                self.jump_float(self.generate_float_compare(op, left, right), label, when)
+                return
+            left_value = constant_value(left)
+            right_value = constant_value(right)
+            if left_value is not None and right_value is not None:
+                if bool(fold_binary(op, left_value, right_value)) == when:
+                    self.emit("jmp", label)
+                return
+            op = self.generate_compare(op, left, right)
+            self.emit(JUMP_CONDITIONS[op if when else NEGATED[op]], label)
+            return
+        value = constant_value(condition)
+        if value is not None:
+            if bool(value) == when:
+                self.emit("jmp", label)
+            return
+        if self.expression_type(condition) == 'float':
+            self.jump_float(self.generate_float_test(condition), label, when)
+            return
+        self.generate_expression(condition)
+        self.emit("cmp", "$0", "%rax")
+        self.emit("jne" if when else "je", label)
+
+    def float_operands(self, left, right):
+        return self.floating and 'float' in (self.expression_type(left), self.expression_type(right))
+
+    def generate_float_compare(self, op, left, right):
+        # Sets the flags for `left op right` on floats; returns the condition
+        # to test, one of FLOAT_CONDITIONS
+        source = self.generate_float_operands(left, right)
+        if op in ('<', '<='):
+            if source != "%xmm1":
+                self.emit("movsd", source, "%xmm1")
+            self.emit("ucomisd", "%xmm0", "%xmm1")
+        else:
+            self.emit("ucomisd", source, "%xmm0")
+        return FLOAT_CONDITIONS[op]
+
+    def generate_float_test(self, expr):
+        # Compares the float `expr` with zero; returns the condition for true
+        self.generate_float(expr)
+        self.emit("xorpd", "%xmm1", "%xmm1")
+        self.emit("ucomisd", "%xmm1", "%xmm0")
+        return 'ne'
+
+    def jump_float(self, condition, label, when=True):
+        # Jumps to `label` if the float condition's truth is `when`. NaN
+        # compares unordered, setting PF: it is unequal to everything.
+        if condition in ('e', 'ne'):
+            if (condition == 'e') == when:
+                label_skip = self.new_label()
+                self.emit("jp", label_skip)
+                self.emit("je", label)
+                self.label(label_skip)
+            else:
+                self.emit("jp", label)
+                self.emit("jne", label)
+        elif when:
+            self.emit("j" + condition, label)
+        else:
+            self.emit(NEGATED_FLOAT_JUMPS[condition], label)
+
+    def set_float(self, condition):
+        # Materialises a float condition as 0/1 in %rax
+        if condition == 'e':
+            self.emit("sete", "%al")
+            self.emit("setnp", "%cl")
+            self.emit("and", "%cl", "%al")
+        elif condition == 'ne':
+            self.emit("setne", "%al")
+            self.emit("setp", "%cl")
+            self.emit("or", "%cl", "%al")
+        else:
+            self.emit("set" + condition, "%al")
+        self.emit("movzb", "%al", "%rax")
+
+    def generate_compare(self, op, left, right):
+        # Sets the flags for `left op right`; returns the operator to test,
+        # mirrored when the operands were swapped
+        left_value = constant_value(left)
+        right_value = constant_value(right)
+        # The constant goes on the right, as an immediate
+        if left_value is not None:
+            left, right = right, left
+            right_value = left_value
+            op = MIRRORED[op]
+        if right_value is not None and fits_imm32(right_value):
+            self.generate_expression(left)
+            self.emit("cmp", f"${right_value}", "%rax")
+            return op
+        self.generate_expression(right)
+        self.push("%rax")
+        self.generate_expression(left)
+        self.pop("%rcx")
+        self.emit("cmp", "%rcx", "%rax")
+        return op
+
     def generate_return(self, node):
         _, expr = node
         if expr:
+            # Return value is left in %rax, or %xmm0 for a float
+            self.generate_value(expr, self.return_type)
+        self.emit("jmp", self.exit_label)
+
+    def generate_value(self, expr, var_type):
+        # Evaluates `expr` converted to `var_type`: a float into %xmm0,
+        # anything else into %rax
+        if is_float(var_type):
+            self.generate_float(expr)
+        elif self.expression_type(expr) == 'float':
+            self.generate_float(expr)
+            self.emit("cvttsd2si", "%xmm0", "%rax", comment="Truncate to int")
+        else:
             self.generate_expression(expr)
-            self.code.append("  mov %rax, %rbx  # Return value")
-        self.code.append("  jmp .function_exit")
-        
+
     def generate_expression(self, expr_node):
+        if self.floating and self.expression_type(expr_node) == 'float':
+            self.generate_float(expr_node)
+            return "%xmm0"
+
         if expr_node[0] == 'literal':
-            value = expr_node[2]
             if expr_node[1] == 'int':
-                self.code.append(f"  mov ${value}, %rax")
-            elif expr_node[1] == 'float':
-                self.code.append(f"  mov ${value}, %xmm0")
-                
+                self.load_constant(int(expr_node[2]))
+
         elif expr_node[0] == 'variable':
             var_name = expr_node[1]
-            self.code.append(f"  mov -8(%rbp), %rax  # Load {var_name}")
-            
+            self.emit("mov", self.variable_operand(var_name), "%rax", comment=f"Load {var_name}")
+
+        elif expr_node[0] == 'assignment':
+            target = expr_node[1]
+            if target and target[0] == 'variable':
+                self.generate_value(expr_node[2], self.variable_type(target[1]))
+                self.emit("mov", "%rax", self.variable_operand(target[1]), comment=f"Store {target[1]}")
+            else:
+                self.generate_expression(expr_node[2])
+
+        elif expr_node[0] == 'unary_op':
+            if expr_node[1] == '!' and self.expression_type(expr_node[2]) == 'float':
+                self.generate_float_test(expr_node[2])
+                self.set_float('e')
+                return "%rax"
+            self.generate_expression(expr_node[2])
+            if expr_node[1] == '-':
+                self.emit("neg", "%rax")
+            elif expr_node[1] == '!':
+                self.emit("cmp", "$0", "%rax")
+                self.emit("sete", "%al")
+                self.emit("movzb", "%al", "%rax")
+
         elif expr_node[0] == 'binary_op':
-            op = expr_node[1]
-            left = expr_node[2]
-            right = expr_node[3]
-            
-            self.generate_expression(right)
-            self.code.append("  push %rax")
+            self.generate_binary_op(*expr_node[1:])
+
+        elif expr_node[0] == 'call':
+            self.generate_call(expr_node[1], expr_node[2])
+
+        return "%rax"
+
+    def generate_call(self, name, args):
+        # System V: the first six int arguments in general registers and the
+        # first eight floats in XMM registers, the rest on the stack, last
+        # pushed first. %rsp must be 16-byte aligned at the call, so an odd
+        # number of quadwords on the stack gets one of padding. A float
+        # result comes back in %xmm0.
+        signature = self.float_signatures.get(name)
+        types = signature[1] if signature and len(signature[1]) == len(args) else ['int'] * len(args)
+        registers = argument_registers(types)
+        stack_args = registers.count(None)
+        padding = (self.stack_depth + stack_args) % 2
+        if padding:
+            self.emit("sub", "$8", "%rsp")
+            self.stack_depth += 1
+        # Arguments are evaluated right to left onto the stack, as the
+        # operands of a binary operator are, then the register ones are
+        # popped back off
+        for arg, arg_type in reversed(list(zip(args, types))):
+            self.generate_value(arg, arg_type)
+            if is_float(arg_type):
+                self.emit("movq", "%xmm0", "%rax")
+            self.push("%rax")
+        in_registers = len(args) - stack_args
+        if None not in registers[:in_registers]:
+            for register in registers[:in_registers]:
+                if register in FLOAT_ARGUMENT_REGISTERS:
+                    self.pop("%rax")
+                    self.emit("movq", "%rax", register)
+                else:
+                    self.pop(register)
+        else:
+            # Stack arguments come between register ones: load those, then
+            # move the stack ones down over them, last first
+            for index, register in enumerate(registers):
+                if register is not None:
+                    self.emit("movsd" if register in FLOAT_ARGUMENT_REGISTERS else "mov",
+                              f"{8 * index}(%rsp)", register)
+            positions = [index for index, register in enumerate(registers) if register is None]
+            for slot in reversed(range(stack_args)):
+                if positions[slot] != in_registers + slot:
+                    self.emit("mov", f"{8 * positions[slot]}(%rsp)", "%rax")
+                    self.emit("mov", "%rax", f"{8 * (in_registers + slot)}(%rsp)")
+            self.emit("add", f"${8 * in_registers}", "%rsp")
+            self.stack_depth -= in_registers
+        self.emit("call", name)
+        if stack_args + padding:
+            self.emit("add", f"${8 * (stack_args + padding)}", "%rsp")
+            self.stack_depth -= stack_args + padding
+
+    def push(self, register):
+        self.emit("push", register)
+        self.stack_depth += 1
+
+    def pop(self, register):
+        self.emit("pop", register)
+        self.stack_depth -= 1
+
+    def generate_binary_op(self, op, left, right):
+        if op in SET_CONDITIONS and self.float_operands(left, right):
+            self.set_float(self.generate_float_compare(op, left, right))
+            return
+
+        left_value = constant_value(left)
+        right_value = constant_value(right)
+
+        if left_value is not None and right_value is not None:
+            folded = fold_binary(op, left_value, right_value)
+            if folded is not None:
+                self.load_constant(folded)
+                return
+
+        # Commutative operators and comparisons keep the constant on the right
+        if left_value is not None and (op in COMMUTATIVE or op in MIRRORED):
+            left, right = right, left
+            right_value = left_value
+            op = MIRRORED.get(op, op)
+
+        if right_value is not None and self.generate_constant_op(op, left, right_value):
+            return
+
+        self.generate_expression(right)
+        self.push("%rax")
+        self.generate_expression(left)
+        self.pop("%rcx")
+
+        if op == '+':
+            self.emit("add", "%rcx", "%rax")
+        elif op == '-':
+            self.emit("sub", "%rcx", "%rax")
+        elif op == '*':
+            self.emit("imul", "%rcx", "%rax")
+        elif op == '/':
+            self.emit("cqo")
+            self.emit("idiv", "%rcx")
+        elif op == '%':
+            self.emit("cqo")
+            self.emit("idiv", "%rcx")
+            self.emit("mov", "%rdx", "%rax")
+        elif op in SET_CONDITIONS:
+            self.emit("cmp", "%rcx", "%rax")
+            self.emit(SET_CONDITIONS[op], "%al")
+            self.emit("movzb", "%al", "%rax")
+
+    def generate_constant_op(self, op, left, value):
+        # Instruction selection for `left op value`; returns False to fall back
+        # to the generic register form.
+        if op in ('+', '-', '*') or op in SET_CONDITIONS:
+            if not fits_imm32(value):
+                return False
             self.generate_expression(left)
-            self.code.append("  pop %rbx")
-            
             if op == '+':
-                self.code.append("  add %rbx, %rax")
+                if value:
+                    self.emit("add", f"${value}", "%rax")
             elif op == '-':
-                self.code.append("  sub %rbx, %rax")
+                if value:
+                    self.emit("sub", f"${value}", "%rax")
             elif op == '*':
-                self.code.append("  imul %rbx, %rax")
-            elif op == '/':
-                self.code.append("  idiv %rbx")
-            elif op == '>':
-                self.code.append("  cmp %rbx, %rax")
-                self.code.append("  setg %al")
-                self.code.append("  movzb %al, %rax")
-            elif op == '<':
-                self.code.append("  cmp %rbx, %rax")
-                self.code.append("  setl %al")
-                self.code.append("  movzb %al, %rax")
-            elif op == '==':
-                self.code.append("  cmp %rbx, %rax")
-                self.code.append("  sete %al")
-                self.code.append("  movzb %al, %rax")
-                
-        return "%rax"
-        
+                self.multiply_constant(value)
+            else:
+                self.emit("cmp", f"${value}", "%rax")
+                self.emit(SET_CONDITIONS[op], "%al")
+                self.emit("movzb", "%al", "%rax")
+            return True
+
+        if op in ('/', '%') and value != 0:
+            self.generate_expression(left)
+            if op == '%':
+                self.emit("mov", "%rax", "%rcx")
+            self.divide_constant(value)
+            if op == '%':
+                # x % c == x - (x / c) * c
+                if not fits_imm32(value):
+                    self.emit("movabs", f"${value}", "%rdx")
+                    self.emit("imul", "%rdx", "%rax")
+                else:
+                    self.multiply_constant(value)
+                self.emit("sub", "%rax", "%rcx")
+                self.emit("mov", "%rcx", "%rax")
+            return True
+
+        return False
+
+    def multiply_constant(self, value):
+        magnitude = abs(value)
+        shift = log2_exact(magnitude)
+        decomposition = lea_decomposition(magnitude)
+        if value == 0:
+            self.emit("mov", "$0", "%rax")
+            return
+        if shift is not None:
+            if shift:
+                self.emit("shl", f"${shift}", "%rax")
+        elif decomposition:
+            factor, shift = decomposition
+            self.emit("lea", f"(%rax,%rax,{LEA_FACTORS[factor]})", "%rax")
+            if shift:
+                self.emit("shl", f"${shift}", "%rax")
+        else:
+            self.emit("imul", f"${value}", "%rax")
+            return
+        if value < 0:
+            self.emit("neg", "%rax")
+
+    def divide_constant(self, value):
+        # Signed quotient of %rax by a constant, truncating toward zero.
+        # Clobbers %rdx; %rcx is either untouched or left holding the dividend.
+        magnitude = abs(value)
+        shift = log2_exact(magnitude)
+        if magnitude == 1:
+            pass
+        elif shift is not None:
+            # Bias negative dividends by 2**shift - 1 before the arithmetic shift
+            self.emit("mov", "%rax", "%rdx")
+            if shift > 1:
+                self.emit("sar", "$63", "%rdx")
+            self.emit("shr", f"${64 - shift}", "%rdx")
+            self.emit("add", "%rdx", "%rax")
+            self.emit("sar", f"${shift}", "%rax")
+        else:
+            magic, magic_shift = signed_magic(magnitude)
+            self.emit("mov", "%rax", "%rcx")
+            self.emit("movabs", f"${magic}", "%rax")
+            self.emit("imul", "%rcx")
+            if magic < 0:
+                self.emit("add", "%rcx", "%rdx")
+            if magic_shift:
+                self.emit("sar", f"${magic_shift}", "%rdx")
+            # Round toward zero: add one when the quotient is negative
+            self.emit("mov", "%rdx", "%rax")
+            self.emit("shr", "$63", "%rax")
+            self.emit("add", "%rdx", "%rax")
+        if value < 0:
+            self.emit("neg", "%rax")
+
+    def generate_float(self, expr):
+        # Evaluates `expr` as a float into %xmm0, converting an int one
+        value = float_value(expr)
+        if value is not None:
+            self.load_float(value)
+            return
+        kind = expr[0]
+        if self.expression_type(expr) != 'float':
+            # xor first: cvtsi2sd only writes the low half of %xmm0
+            self.emit("xorpd", "%xmm0", "%xmm0")
+            if kind == 'variable':
+                self.emit("cvtsi2sdq", self.variable_operand(expr[1]), "%xmm0", comment=f"Convert {expr[1]}")
+            else:
+                self.generate_expression(expr)
+                self.emit("cvtsi2sdq", "%rax", "%xmm0")
+            return
+
+        if kind == 'variable':
+            self.emit("movsd", self.variable_operand(expr[1]), "%xmm0", comment=f"Load {expr[1]}")
+
+        elif kind == 'assignment':
+            target = expr[1]
+            self.generate_float(expr[2])
+            if target and target[0] == 'variable':
+                self.emit("movsd", "%xmm0", self.variable_operand(target[1]), comment=f"Store {target[1]}")
+
+        elif kind == 'unary_op':
+            self.generate_float(expr[2])
+            if expr[1] == '-':
+                # Flip the sign bit
+                self.emit("movq", "%xmm0", "%rax")
+                self.emit("btc", "$63", "%rax")
+                self.emit("movq", "%rax", "%xmm0")
+
+        elif kind == 'binary_op':
+            self.generate_float_op(*expr[1:])
+
+        elif kind == 'call':
+            self.generate_call(expr[1], expr[2])
+
+    def generate_float_op(self, op, left, right):
+        left_value = float_value(left)
+        right_value = float_value(right)
+        if left_value is not None and right_value is not None:
+            folded = fold_float(op, left_value, right_value)
+            if folded is not None:
+                self.load_float(folded)
+                return
+        source = self.generate_float_operands(left, right, op in COMMUTATIVE)
+        self.emit(FLOAT_OPCODES[op], source, "%xmm0")
+
+    def generate_float_operands(self, left, right, commutative=False):
+        # Evaluates `left` into %xmm0 and returns where `right` is: %xmm1, or
+        # the memory of a float constant or variable. Commutative operators
+        # may swap them.
+        source = self.float_source(right, left)
+        if source is None and commutative:
+            source = self.float_source(left, None)
+            if source is not None:
+                left, right = right, left
+        if source is not None:
+            self.generate_float(left)
+            return source
+        self.generate_float(right)
+        self.emit("movq", "%xmm0", "%rax")
+        self.push("%rax")
+        self.generate_float(left)
+        self.pop("%rcx")
+        self.emit("movq", "%rcx", "%xmm1")
+        return "%xmm1"
+
+    def float_source(self, expr, before):
+        # Memory operand holding the float value of `expr`, or None. A
+        # variable is only read in place when evaluating `before` first
+        # cannot assign it.
+        value = float_value(expr)
+        if value is not None:
+            return f"{self.float_label(value)}(%rip)"
+        if expr[0] == 'variable' and is_float(self.variable_type(expr[1])):
+            if before is None or not any(node[0] in ('assignment', 'call') for node in walk(before)):
+                return self.variable_operand(expr[1])
+        return None
+
+    def load_float(self, value):
+        if double_bits(value) == 0:
+            self.emit("xorpd", "%xmm0", "%xmm0")
+        else:
+            self.emit("movsd", f"{self.float_label(value)}(%rip)", "%xmm0")
+
+    def load_constant(self, value):
+        if fits_imm32(value):
+            self.emit("mov", f"${value}", "%rax")
+        else:
+            self.emit("movabs", f"${value}", "%rax")
+
     def new_label(self):
         self.label_count += 1
-        return f".L{self.label_count}"
\ No newline at end of file
+        return f".L{self.function_name}_{self.label_count}"
@@ -0,0 +1,160 @@
+import argparse
+import json
+import os
+import socket
+import struct
+import sys
+import tempfile
+
+# Messages are a 4-byte big-endian length followed by that many bytes of
+# UTF-8 JSON. This module only uses the standard library so the client
+# starts without importing the compiler.
+HEADER = struct.Struct('>I')
+MAX_MESSAGE_SIZE = 64 * 1024 * 1024
+
+
+class ProtocolError(Exception):
+    pass
+
+
+class ServerError(Exception):
+    pass
+
+
+def default_socket_path():
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return os.path.join(runtime_dir, 'mini_cpp_compiler.sock')
+    return os.path.join(tempfile.gettempdir(), f'mini_cpp_compiler-{os.getuid()}.sock')
+
+
+def send_message(stream, message):
+    body = json.dumps(message).encode('utf-8')
+    if len(body) > MAX_MESSAGE_SIZE:
+        raise ProtocolError(f"Message of {len(body)} bytes exceeds the {MAX_MESSAGE_SIZE} byte limit")
+    stream.write(HEADER.pack(len(body)) + body)
+    stream.flush()
+
+
+def read_exact(stream, size):
+    data = b""
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+def receive_message(stream):
+    # Returns None when the peer closed the connection between messages
+    header = read_exact(stream, HEADER.size)
+    if not header:
+        return None
+    if len(header) < HEADER.size:
+        raise ProtocolError("Connection closed inside a message header")
+    (size,) = HEADER.unpack(header)
+    if size > MAX_MESSAGE_SIZE:
+        raise ProtocolError(f"Message of {size} bytes exceeds the {MAX_MESSAGE_SIZE} byte limit")
+    body = read_exact(stream, size)
+    if len(body) < size:
+        raise ProtocolError("Connection closed inside a message body")
+    try:
+        return json.loads(body.decode('utf-8'))
+    except ValueError as e:
+        raise ProtocolError(f"Malformed message: {e}")
+
+
+class CompileClient:
+    def __init__(self, socket_path=None, timeout=60.0):
+        self.socket_path = socket_path or default_socket_path()
+        self.timeout = timeout
+        self.sock = None
+        self.stream = None
+        self.next_id = 0
+
+    def connect(self):
+        if self.sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError:
+                sock.close()
+                raise
+            self.sock = sock
+            self.stream = sock.makefile('rwb')
+
+    def close(self):
+        if self.sock is not None:
+            self.stream.close()
+            self.sock.close()
+            self.sock = None
+            self.stream = None
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def request(self, message):
+        self.connect()
+        self.next_id += 1
+        message = dict(message, id=self.next_id)
+        send_message(self.stream, message)
+        response = receive_message(self.stream)
+        if response is None:
+            self.close()
+            raise ProtocolError("Server closed the connection")
+        if not response.get('ok'):
+            raise ServerError(response.get('error', "Unknown server error"))
+        return response
+
+    def compile(self, source, path=None, optimize=True):
+        return self.request({'op': 'compile', 'source': source, 'path': path, 'optimize': optimize})
+
+    def ping(self):
+        return self.request({'op': 'ping'})
+
+    def stats(self):
+        return self.request({'op': 'stats'})
+
+    def shutdown(self):
+        return self.request({'op': 'shutdown'})
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Compile a file on a running compile server")
+    arg_parser.add_argument('source', help="source file")
+    arg_parser.add_argument('-o', '--output', help="assembly output file ('-' for stdout)")
+    arg_parser.add_argument('--socket', help="server socket path")
+    arg_parser.add_argument('--no-optimize', action='store_true', help="disable the peephole optimizer")
+    args = arg_parser.parse_args(argv)
+
+    with open(args.source) as f:
+        source = f.read()
+    try:
+        with CompileClient(args.socket) as client:
+            response = client.compile(source, args.source, not args.no_optimize)
+    except (OSError, ProtocolError, ServerError) as e:
+        print(f"compile server: {e}", file=sys.stderr)
+        return 2
+
+    for entry in response['diagnostics']:
+        where = entry['file'] + (f":{entry['line']}" if entry['line'] else "")
+        print(f"{where}: {entry['severity']}: {entry['message']}", file=sys.stderr)
+    if not response['succeeded']:
+        return 1
+    output = args.output or os.path.splitext(args.source)[0] + '.s'
+    if output == '-':
+        sys.stdout.write(response['assembly'])
+    else:
+        with open(output, 'w') as f:
+            f.write(response['assembly'])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
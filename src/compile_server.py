@@ -0,0 +1,223 @@
+import argparse
+import hashlib
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from compile_client import ProtocolError, default_socket_path, receive_message, send_message
+from instrument import Profiler
+from pipeline import CompilerPipeline
+
+
+def compile_request(source, path, optimize, budget=None):
+    # Process pool entry point; returns the JSON-ready part of a response
+    result = CompilerPipeline(optimize, Profiler(), budget=budget).compile_source(source, path)
+    response = result.to_dict()
+    response['assembly'] = result.assembly
+    return response
+
+
+def warm_up(_=None):
+    # Runs every phase once so each worker starts with warm caches
+    compile_request("int main() { int x = 1; if (x > 0) { x = x * 3; } return x; }", None, True)
+    return os.getpid()
+
+
+class ResultCache:
+    # LRU cache of compile responses keyed by the request contents
+
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, source, path, optimize):
+        digest = hashlib.sha256()
+        digest.update(f"{path}\0{int(optimize)}\0".encode())
+        digest.update(source.encode('utf-8', 'surrogatepass'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            response = self.entries.get(key)
+            if response is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return response
+
+    def put(self, key, response):
+        if not self.capacity:
+            return
+        with self.lock:
+            self.entries[key] = response
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        # A connection may carry any number of requests
+        while True:
+            try:
+                request = receive_message(self.rfile)
+            except ProtocolError as e:
+                send_message(self.wfile, {'ok': False, 'error': str(e)})
+                return
+            if request is None:
+                return
+            send_message(self.wfile, self.server.compile_server.handle(request))
+
+
+class UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class CompileServer:
+    def __init__(self, socket_path=None, workers=None, cache_size=256, timeout=None):
+        self.socket_path = socket_path or default_socket_path()
+        # Seconds a single compile may take before it is aborted, so one
+        # pathological request cannot hold a worker indefinitely
+        self.timeout = timeout
+        # workers=0 compiles on the connection threads instead of a pool
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.cache = ResultCache(cache_size)
+        # Phase timings and counters summed over every request served
+        self.profiler = Profiler()
+        self.profiler_lock = threading.Lock()
+        self.executor = None
+        self.server = None
+        self.started = None
+
+    def serve_forever(self):
+        self.remove_stale_socket()
+        if self.workers:
+            self.executor = ProcessPoolExecutor(self.workers)
+            list(self.executor.map(warm_up, range(self.workers)))
+        else:
+            warm_up()
+        self.server = UnixServer(self.socket_path, RequestHandler)
+        self.server.compile_server = self
+        os.chmod(self.socket_path, 0o600)
+        self.started = time.time()
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            if self.executor is not None:
+                self.executor.shutdown(cancel_futures=True)
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    def shutdown(self):
+        # serve_forever() must be stopped from another thread
+        if self.server is not None:
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+    def remove_stale_socket(self):
+        if not os.path.exists(self.socket_path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+        except OSError:
+            os.unlink(self.socket_path)
+        else:
+            raise RuntimeError(f"A server is already listening on {self.socket_path}")
+        finally:
+            probe.close()
+
+    def handle(self, request):
+        response = self.dispatch(request) if isinstance(request, dict) else \
+            {'ok': False, 'error': "Request must be a JSON object"}
+        if isinstance(request, dict) and 'id' in request:
+            response['id'] = request['id']
+        return response
+
+    def dispatch(self, request):
+        op = request.get('op', 'compile')
+        if op == 'compile':
+            return self.compile(request)
+        if op == 'ping':
+            return {'ok': True, 'pid': os.getpid(), 'workers': self.workers}
+        if op == 'stats':
+            cache = self.cache
+            return {'ok': True, 'requests': cache.hits + cache.misses, 'cache_hits': cache.hits,
+                    'cache_misses': cache.misses, 'cache_entries': len(cache.entries),
+                    'uptime': time.time() - self.started, 'profile': self.profiler.to_dict()}
+        if op == 'shutdown':
+            self.shutdown()
+            return {'ok': True}
+        return {'ok': False, 'error': f"Unknown operation '{op}'"}
+
+    def compile(self, request):
+        source = request.get('source')
+        path = request.get('path')
+        optimize = bool(request.get('optimize', True))
+        if not isinstance(source, str):
+            return {'ok': False, 'error': "'source' must be a string"}
+
+        key = self.cache.key(source, path, optimize)
+        response = self.cache.get(key)
+        cached = response is not None
+        if not cached:
+            try:
+                if self.executor is not None:
+                    response = self.executor.submit(compile_request, source, path, optimize,
+                                                    self.timeout).result()
+                else:
+                    response = compile_request(source, path, optimize, self.timeout)
+            except Exception as e:
+                return {'ok': False, 'error': f"Internal compiler error: {e!r}"}
+            # An aborted compile may well finish next time
+            if not response['aborted']:
+                self.cache.put(key, response)
+        self.record(response, cached)
+        return dict(response, ok=True, cached=cached)
+
+    def record(self, response, cached):
+        with self.profiler_lock:
+            if cached:
+                self.profiler.count('cache_hits')
+                return
+            self.profiler.count('cache_misses')
+            for phase, seconds in response['timings'].items():
+                self.profiler.add_time(phase, seconds)
+            for name, value in response['counters'].items():
+                self.profiler.count(name, value)
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Serve compile requests over a Unix socket")
+    arg_parser.add_argument('--socket', help="socket path")
+    arg_parser.add_argument('-j', '--jobs', type=int, help="worker processes (0 compiles in-process)")
+    arg_parser.add_argument('--cache-size', type=int, default=256, help="cached results to keep")
+    arg_parser.add_argument('--timeout', type=float, default=30.0,
+                            help="abort compiles that take longer than this many seconds")
+    args = arg_parser.parse_args(argv)
+
+    server = CompileServer(args.socket, args.jobs, args.cache_size, args.timeout)
+    signal.signal(signal.SIGTERM, lambda signum, frame: server.shutdown())
+    print(f"Listening on {server.socket_path}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
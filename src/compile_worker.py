@@ -0,0 +1,128 @@
+import hashlib
+import queue
+import threading
+from collections import OrderedDict
+
+from cancel import CancellationToken
+
+
+class CompileWorker:
+    # Runs compiles on a background thread so the caller's thread (the Tk
+    # event loop) never blocks. Progress is posted to a queue as
+    # (kind, generation, phase, result) events: 'phase' after each phase
+    # that ran and 'done' at the end. The caller drains it with poll().
+    # execute() runs a compiled program on the VM on a thread of its own
+    # and posts a 'run' event when it ends.
+    #
+    # submit() supersedes the compile in flight: that one is cancelled and
+    # its remaining events are dropped. Compiles never overlap; a new one
+    # waits for the cancelled one to stop, which takes milliseconds.
+    #
+    # Finished results are kept by source hash, so resubmitting unchanged
+    # input (an undo, or an edit that was typed and deleted again) answers
+    # at once with a single 'done' event. The key does not cover included
+    # headers; the pipelines the GUI uses have no header cache.
+
+    # Results kept, least recently used dropped first
+    CACHE_SIZE = 16
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self.events = queue.Queue()
+        self.generation = 0
+        self.token = None
+        self.thread = None
+        self.lock = threading.Lock()
+        # (source hash, path, last phase) -> result; only worker threads
+        # touch it, and they never overlap
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def submit(self, source, path=None, last_phase=None):
+        # `last_phase` stops the compile early, e.g. after 'semantic' when
+        # only the diagnostics are wanted
+        with self.lock:
+            self.generation += 1
+            if self.token is not None:
+                self.token.cancel("superseded by a newer compile")
+            self.token = CancellationToken(self.pipeline.budget, self.pipeline.phase_budgets)
+            self.thread = threading.Thread(target=self.work, daemon=True,
+                                           args=(self.generation, source, path, last_phase, self.token, self.thread))
+            self.thread.start()
+            return self.generation
+
+    def cancel(self, reason="cancelled", discard=False):
+        with self.lock:
+            if self.token is not None:
+                self.token.cancel(reason)
+            if discard:
+                # Nothing more is reported about this compile
+                self.generation += 1
+
+    def work(self, generation, source, path, last_phase, token, previous):
+        if previous is not None:
+            previous.join()
+        key = (hashlib.sha256(source.encode()).digest(), path, last_phase)
+        result = self.cached(key)
+        if result is not None:
+            self.events.put(('done', generation, None, result))
+            return
+        # The pipeline's profiler describes the latest compile only
+        self.pipeline.profiler.reset()
+
+        def on_phase(name, result):
+            self.events.put(('phase', generation, name, result))
+
+        result = self.pipeline.compile_source(source, path, cancel=token, on_phase=on_phase,
+                                              last_phase=last_phase)
+        if not result.aborted:
+            self.cache[key] = result
+            if len(self.cache) > self.CACHE_SIZE:
+                self.cache.popitem(last=False)
+        self.events.put(('done', generation, None, result))
+
+    def execute(self, ast):
+        # A run is not superseded by later compiles, and does not hold
+        # them up while the VM works through its time limit
+        thread = threading.Thread(target=self.run_program, args=(self.generation, ast), daemon=True)
+        thread.start()
+        return thread
+
+    def run_program(self, generation, ast):
+        # Posts (vm, exit code, None) or (vm, None, error message). The
+        # bytecode compiler and VM are only loaded on first use.
+        from bytecode import BytecodeCompiler, CompileError
+        from vm import VirtualMachine, VMError
+
+        vm = VirtualMachine()
+        try:
+            exit_code = vm.run(BytecodeCompiler().compile(ast))
+        except (CompileError, VMError) as e:
+            self.events.put(('run', generation, None, (vm, None, str(e))))
+            return
+        self.events.put(('run', generation, None, (vm, exit_code, None)))
+
+    def cached(self, key):
+        # A complete compile also answers a request that stops earlier
+        digest, path, last_phase = key
+        for candidate in (key, (digest, path, None)):
+            result = self.cache.get(candidate)
+            if result is not None:
+                self.cache.move_to_end(candidate)
+                self.hits += 1
+                return result
+        self.misses += 1
+        return None
+
+    def poll(self):
+        # Events of the latest compile, and of any run, posted since the
+        # last call
+        events = []
+        while True:
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                return events
+            if event[1] == self.generation or event[0] == 'run':
+                events.append(event)
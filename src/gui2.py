@@ -1,31 +1,18 @@
 import tkinter as tk
-from tkinter import scrolledtext, messagebox, ttk
-from lexer import LexicalAnalyzer
-from parser import SyntaxParser
-from semantic import SemanticAnalyzer
-from code_gen import CodeGenerator
-from symbol_table import SymbolTable
+from tkinter import scrolledtext, ttk
+from gui_base import CompilerGUIBase, SAMPLE_PROGRAM
+
+class CompilerGUI(CompilerGUIBase):
+    OUTPUT_TEXT_OPTIONS = {'wrap': tk.WORD, 'font': ("Consolas", 10), 'bg': "#1e1e1e", 'fg': "#d4d4d4"}
 
-class CompilerGUI:
     def __init__(self, root):
-        self.root = root
+        super().__init__(root)
         self.root.title("C++ Compiler")
         self.root.geometry("1200x850")
         
-        # Initialize status variable early
-        self.status_var = tk.StringVar()
-        self.status_var.set("Ready")
-        
         # Configure styles
         self.configure_styles()
         
-        # Initialize compiler components
-        self.symbol_table = SymbolTable()
-        self.lexer = LexicalAnalyzer(self.symbol_table)
-        self.parser = SyntaxParser(self.symbol_table)
-        self.semantic = SemanticAnalyzer(self.symbol_table)
-        self.codegen = CodeGenerator(self.symbol_table)
-        
         self.create_widgets()
         self.setup_layout()
         
@@ -61,6 +48,14 @@ class CompilerGUI:
                        padding=8)  # Increased padding
         style.map('TButton',
                  background=[('active', '#4a4a4a'), ('pressed', '#3a3a3a')])
+        style.configure('Treeview',
+                       background=text_bg,
+                       fieldbackground=text_bg,
+                       foreground=text_fg,
+                       font=("Consolas", 10))
+        style.configure('Treeview.Heading', background="#3a3a3a", foreground=text_fg)
+        style.map('Treeview', background=[('selected', "#264f78")])
+        style.configure('TEntry', fieldbackground=text_bg, foreground=text_fg, insertcolor=text_fg)
         
     def create_widgets(self):
         # Create main panes
@@ -98,71 +93,11 @@ class CompilerGUI:
         self.editor.pack(side="left", fill="both", expand=True)
         
         # Add sample code
-        self.editor.insert(tk.END, 
-            "#include <iostream>\n\n"
-            "int main() {\n"
-            "    int x = 5;\n"
-            "    float y = 3.14;\n"
-            "    if (x > 0) {\n"
-            "        x = x * 2;\n"
-            "    }\n"
-            "    return 0;\n"
-            "}")
+        self.editor.insert(tk.END, SAMPLE_PROGRAM)
         
-        # Output notebook
+        # Output notebook; each tab is filled in when first shown
         self.notebook = ttk.Notebook(self.main_pane)
-        
-        # Tokens tab
-        self.tokens_frame = ttk.Frame(self.notebook)
-        self.tokens_text = scrolledtext.ScrolledText(self.tokens_frame, 
-                                                    wrap=tk.WORD, 
-                                                    font=("Consolas", 10),
-                                                    bg="#1e1e1e",
-                                                    fg="#d4d4d4")
-        self.tokens_text.pack(fill="both", expand=True, padx=5, pady=5)
-        
-        # AST tab
-        self.ast_frame = ttk.Frame(self.notebook)
-        self.ast_text = scrolledtext.ScrolledText(self.ast_frame, 
-                                                wrap=tk.WORD, 
-                                                font=("Consolas", 10),
-                                                bg="#1e1e1e",
-                                                fg="#d4d4d4")
-        self.ast_text.pack(fill="both", expand=True, padx=5, pady=5)
-        
-        # Symbol Table tab
-        self.symtab_frame = ttk.Frame(self.notebook)
-        self.symtab_text = scrolledtext.ScrolledText(self.symtab_frame, 
-                                                   wrap=tk.WORD, 
-                                                   font=("Consolas", 10),
-                                                   bg="#1e1e1e",
-                                                   fg="#d4d4d4")
-        self.symtab_text.pack(fill="both", expand=True, padx=5, pady=5)
-        
-        # Generated Code tab
-        self.code_frame = ttk.Frame(self.notebook)
-        self.code_text = scrolledtext.ScrolledText(self.code_frame, 
-                                                 wrap=tk.WORD, 
-                                                 font=("Consolas", 10),
-                                                 bg="#1e1e1e",
-                                                 fg="#d4d4d4")
-        self.code_text.pack(fill="both", expand=True, padx=5, pady=5)
-        
-        # Messages tab
-        self.msg_frame = ttk.Frame(self.notebook)
-        self.msg_text = scrolledtext.ScrolledText(self.msg_frame, 
-                                                wrap=tk.WORD, 
-                                                font=("Consolas", 10),
-                                                bg="#1e1e1e",
-                                                fg="#d4d4d4")
-        self.msg_text.pack(fill="both", expand=True, padx=5, pady=5)
-        
-        # Add tabs to notebook
-        self.notebook.add(self.tokens_frame, text="Tokens")
-        self.notebook.add(self.ast_frame, text="AST")
-        self.notebook.add(self.symtab_frame, text="Symbol Table")
-        self.notebook.add(self.code_frame, text="Generated Code")
-        self.notebook.add(self.msg_frame, text="Messages")
+        self.add_output_tabs()
         
         # Control buttons with larger font
         self.control_frame = ttk.Frame(self.root)
@@ -174,6 +109,9 @@ class CompilerGUI:
         self.compile_btn.pack(side="left", padx=10, pady=10)  # Increased padding
         self.run_btn.pack(side="left", padx=10, pady=10)
         self.clear_btn.pack(side="right", padx=10, pady=10)
+        progress, cancel_btn = self.add_progress_controls(self.control_frame)
+        cancel_btn.pack(side="left", padx=10, pady=10)
+        progress.pack(side="left", padx=10, pady=10)
         
         # Status bar
         self.status_bar = ttk.Label(self.root, 
@@ -185,9 +123,9 @@ class CompilerGUI:
                                   foreground="#b0b0b0",
                                   font=('Segoe UI', 10))  # Increased font size
         
-        # Update line numbers after all widgets are created
-        self.update_line_numbers()
-        self.editor.bind("<KeyRelease>", self.update_line_numbers)
+        # Number the lines once all widgets are created
+        self.attach_line_numbers()
+        self.watch_editor()
         
     def setup_layout(self):
         # Add frames to main pane
@@ -199,19 +137,6 @@ class CompilerGUI:
         self.control_frame.pack(fill="x", padx=10, pady=(0, 10))  # Increased padding
         self.status_bar.pack(fill="x", side="bottom")
         
-    def update_line_numbers(self, event=None):
-        lines = self.editor.get("1.0", "end-1c").split("\n")
-        line_count = len(lines)
-        
-        self.line_numbers.config(state="normal")
-        self.line_numbers.delete("1.0", "end")
-        self.line_numbers.insert("1.0", "\n".join(str(i) for i in range(1, line_count + 1)))
-        self.line_numbers.config(state="disabled")
-        
-        # Update cursor position in status bar
-        cursor_pos = self.editor.index(tk.INSERT)
-        self.status_var.set(f"Line: {cursor_pos.split('.')[0]}, Column: {cursor_pos.split('.')[1]} | Ready")
-        
     def change_background_color(self, success):
         """Change background color based on compilation status"""
         if success:
@@ -229,84 +154,11 @@ class CompilerGUI:
         self.root.configure(bg=self.bg_color)
         self.status_bar.configure(background="#3a3a3a", foreground="#b0b0b0")
         
-    def compile(self):
-        source = self.editor.get("1.0", tk.END)
-        
-        # Clear previous results
-        self.tokens_text.delete("1.0", tk.END)
-        self.ast_text.delete("1.0", tk.END)
-        self.symtab_text.delete("1.0", tk.END)
-        self.code_text.delete("1.0", tk.END)
-        self.msg_text.delete("1.0", tk.END)
-        
-        # Reset symbol table
-        self.symbol_table = SymbolTable()
-        self.lexer.symbol_table = self.symbol_table
-        self.parser.symbol_table = self.symbol_table
-        self.semantic.symbol_table = self.symbol_table
-        self.codegen.symbol_table = self.symbol_table
-        
-        # Lexical analysis
-        tokens = self.lexer.tokenize(source)
-        self.tokens_text.insert(tk.END, "\n".join(
-            f"{token['line']}:{token['col']} \t{token['type']} \t'{token['value']}'"
-            for token in tokens
-        ))
-        
-        # Syntax analysis
-        ast = self.parser.parse(tokens)
-        if ast:
-            self.ast_text.insert(tk.END, "\n".join(str(node) for node in ast))
-        else:
-            self.msg_text.insert(tk.END, "Syntax errors detected!\n")
-            
-        # Semantic analysis
-        if ast and self.semantic.analyze(ast):
-            self.msg_text.insert(tk.END, "Semantic analysis passed\n")
-        else:
-            self.msg_text.insert(tk.END, "Semantic errors detected!\n")
-            
-        # Show symbol table
-        self.symtab_text.insert(tk.END, str(self.symbol_table))
-        
-        # Code generation
-        if ast and not self.parser.errors and not self.semantic.errors:
-            code = self.codegen.generate(ast)
-            self.code_text.insert(tk.END, code)
-            self.msg_text.insert(tk.END, "Code generation successful!\n")
-            
-        # Display errors
-        for error in self.lexer.errors + self.parser.errors + self.semantic.errors:
-            self.msg_text.insert(tk.END, error + "\n")
-            
-        for warning in self.semantic.warnings:
-            self.msg_text.insert(tk.END, "WARNING: " + warning + "\n")
-            
-        # Update status and background color
-        has_errors = self.lexer.errors or self.parser.errors or self.semantic.errors
-        if not has_errors:
-            self.status_var.set("Compilation successful")
-            self.change_background_color(True)
-        else:
-            self.status_var.set("Compilation completed with errors")
-            self.change_background_color(False)
-            
-    def run(self):
-        self.status_var.set("Running program...")
-        self.root.update()
-        # Simulated execution delay
-        self.root.after(1500, lambda: self.status_var.set("Execution completed"))
-        messagebox.showinfo("Execution", "Code executed successfully (simulated)")
+    def compile_finished(self, succeeded):
+        self.change_background_color(succeeded)
         
     def clear(self):
-        self.editor.delete("1.0", tk.END)
-        self.tokens_text.delete("1.0", tk.END)
-        self.ast_text.delete("1.0", tk.END)
-        self.symtab_text.delete("1.0", tk.END)
-        self.code_text.delete("1.0", tk.END)
-        self.msg_text.delete("1.0", tk.END)
-        self.status_var.set("Cleared all content")
-        self.update_line_numbers()
+        super().clear()
         self.reset_background_color()
 
 if __name__ == "__main__":
@@ -0,0 +1,472 @@
+import tkinter as tk
+from tkinter import filedialog, scrolledtext, messagebox, ttk
+from compile_worker import CompileWorker
+from gui_views import AstView, VirtualTable
+from highlighter import DARK_COLORS, SyntaxHighlighter
+from instrument import Profiler
+from pipeline import PHASES, CompilerPipeline
+
+SAMPLE_PROGRAM = (
+    "#include <iostream>\n\n"
+    "int main() {\n"
+    "    int x = 5;\n"
+    "    float y = 3.14;\n"
+    "    if (x > 0) {\n"
+    "        x = x * 2;\n"
+    "    }\n"
+    "    return 0;\n"
+    "}")
+
+
+class LazyTab:
+    # Notebook tab whose text widget is created the first time it is shown.
+    # Content may be a string or a callable producing one, so listings that
+    # are never looked at are never formatted either.
+
+    def __init__(self, notebook, title, factory):
+        self.notebook = notebook
+        self.frame = ttk.Frame(notebook)
+        notebook.add(self.frame, text=title)
+        self.factory = factory
+        self.widget = None
+        self.content = ""
+
+    def build(self):
+        if self.widget is None:
+            self.widget = self.factory(self.frame)
+            self.render()
+
+    def render(self):
+        self.widget.delete("1.0", tk.END)
+        self.widget.insert(tk.END, self.text())
+
+    def visible(self):
+        return self.notebook.select() == str(self.frame)
+
+    def text(self):
+        if callable(self.content):
+            self.content = self.content()
+        return self.content
+
+    def set(self, content):
+        self.content = content
+        if self.widget is not None:
+            self.render()
+        elif self.visible():
+            self.build()
+
+    def append(self, text):
+        self.content = self.text() + text
+        if self.widget is not None:
+            self.widget.insert(tk.END, text)
+        elif self.visible():
+            self.build()
+
+
+class ViewTab(LazyTab):
+    # LazyTab holding one of the gui_views views. The content is the data
+    # the view shows (or a callable producing it) rather than text.
+
+    def render(self):
+        self.widget.set(self.text())
+
+
+class CompilerGUIBase:
+    # Compile/run wiring shared by the GUI front ends. Subclasses create the
+    # widgets: `self.editor`, `self.notebook` and the output tabs through
+    # add_output_tab().
+
+    OUTPUT_TEXT_OPTIONS = {'wrap': tk.WORD, 'font': ("Consolas", 10)}
+    OUTPUT_TEXT_PADDING = 5
+    SYNTAX_COLORS = DARK_COLORS
+    # Seconds before a compile is abandoned, so a pathological input cannot
+    # keep the worker busy
+    COMPILE_BUDGET = 10.0
+    # How often the worker's progress queue is drained while compiling
+    POLL_INTERVAL_MS = 20
+    # Idle time after the last edit before the editor is checked in the
+    # background; see watch_editor()
+    LIVE_DELAY_MS = 500
+    # Inline diagnostics drawn at most, so a file full of errors stays cheap
+    MAX_HIGHLIGHTS = 200
+
+    def __init__(self, root):
+        self.root = root
+        # Holds the timings and counters of the latest compile and run
+        self.profiler = Profiler()
+        self.pipeline = CompilerPipeline(profiler=self.profiler, budget=self.COMPILE_BUDGET)
+        # Compiles run on a background thread; see compile()
+        self.worker = CompileWorker(self.pipeline)
+        self.compiling = False
+        # Whether a program is running on the worker; see execute()
+        self.running = False
+        # Whether the compile in flight is a live check rather than an
+        # explicit compile or run
+        self.live = False
+        self.poll_id = None
+        self.live_id = None
+        # Called with the result once the compile in flight finishes
+        self.after_compile = None
+        self.progress = None
+        self.cancel_btn = None
+        # tab key -> the data its listing was last built from
+        self.listings = {}
+        self.status_var = tk.StringVar()
+        self.status_var.set("Ready")
+        self.tabs = {}
+        self.line_numbers = None
+        self.highlighter = None
+        # Lines numbered in the gutter and the cursor position last shown
+        self.gutter_lines = 0
+        self.cursor = None
+        self.result = None
+        self.ast = None
+        self.symbol_table = None
+        self.compile_succeeded = False
+
+    def add_output_tab(self, key, title):
+        tab = LazyTab(self.notebook, title, self.create_output_text)
+        self.tabs[key] = tab
+        return tab
+
+    def add_output_tabs(self):
+        # Large listings are shown through views that only render what is
+        # on screen
+        self.tabs['tokens'] = ViewTab(self.notebook, "Tokens", self.create_token_view)
+        self.tabs['ast'] = ViewTab(self.notebook, "AST", self.create_ast_view)
+        self.tabs['symbols'] = ViewTab(self.notebook, "Symbol Table", self.create_symbol_view)
+        self.add_output_tab('code', "Generated Code")
+        self.add_output_tab('messages', "Messages")
+        self.tabs['profile'] = LazyTab(self.notebook, "Profile", self.create_profile_view)
+        self.notebook.bind("<<NotebookTabChanged>>", self.build_selected_tab)
+        self.build_selected_tab()
+
+    def create_output_text(self, parent):
+        text = scrolledtext.ScrolledText(parent, **self.OUTPUT_TEXT_OPTIONS)
+        text.pack(fill="both", expand=True, padx=self.OUTPUT_TEXT_PADDING, pady=self.OUTPUT_TEXT_PADDING)
+        return text
+
+    def create_token_view(self, parent):
+        return VirtualTable(parent, ("Position", "Type", "Value"),
+                            lambda token: (f"{token['line']}:{token['col']}", token['type'], token['value']),
+                            self.OUTPUT_TEXT_PADDING)
+
+    def create_symbol_view(self, parent):
+        return VirtualTable(parent, ("Name", "Type", "Value", "Scope"),
+                            lambda entry: (entry['name'], entry['type'], str(entry['value']), entry['scope']),
+                            self.OUTPUT_TEXT_PADDING)
+
+    def create_ast_view(self, parent):
+        return AstView(parent, self.OUTPUT_TEXT_PADDING)
+
+    def create_profile_view(self, parent):
+        export_btn = ttk.Button(parent, text="Export JSON...", command=self.export_profile)
+        export_btn.pack(anchor="e", padx=self.OUTPUT_TEXT_PADDING, pady=(self.OUTPUT_TEXT_PADDING, 0))
+        return self.create_output_text(parent)
+
+    def export_profile(self):
+        path = filedialog.asksaveasfilename(defaultextension=".json",
+                                            filetypes=[("JSON files", "*.json"), ("All files", "*.*")])
+        if path:
+            self.profiler.to_json(path)
+            self.set_status(f"Profile exported to {path}")
+
+    def build_selected_tab(self, event=None):
+        for tab in self.tabs.values():
+            if tab.visible():
+                tab.build()
+        # A live check stops before code generation; finish the compile
+        # once the generated code is looked at
+        result = self.result
+        if (result is not None and result.succeeded and result.assembly is None
+                and self.tabs['code'].visible() and not self.compiling):
+            self.schedule_live_compile(0)
+
+    def show_tab(self, key):
+        self.notebook.select(self.tabs[key].frame)
+        self.tabs[key].build()
+
+    def add_progress_controls(self, parent):
+        # Progress bar and cancel button for background compiles; the caller
+        # lays them out
+        self.progress = ttk.Progressbar(parent, mode="determinate", maximum=len(PHASES), length=160)
+        self.cancel_btn = ttk.Button(parent, text="Cancel", command=self.cancel_compile, state="disabled")
+        self.root.bind("<Escape>", lambda event: self.cancel_compile())
+        return self.progress, self.cancel_btn
+
+    def set_status(self, text):
+        self.status_var.set(text)
+
+    def editor_scrolled(self, first, last):
+        # The editor's yscrollcommand
+        self.editor.vbar.set(first, last)
+        if self.line_numbers is not None:
+            self.line_numbers.yview_moveto(first)
+        if self.highlighter is not None:
+            self.highlighter.schedule()
+
+    def attach_line_numbers(self):
+        # Keeps `self.line_numbers` numbering the editor's lines and
+        # scrolled along with it
+        self.editor.config(yscrollcommand=self.editor_scrolled)
+        self.editor.bind("<KeyRelease>", self.update_line_numbers)
+        self.editor.bind("<ButtonRelease-1>", self.update_line_numbers)
+        self.update_line_numbers()
+
+    def update_line_numbers(self, event=None):
+        # The line count comes from the text index, without copying the
+        # buffer. The gutter only changes when the count does, and then
+        # only by the numbers added or removed at its end.
+        line_count = int(self.editor.index("end-1c").split(".")[0])
+        drawn = self.gutter_lines
+        if line_count != drawn:
+            self.line_numbers.config(state="normal")
+            if line_count > drawn:
+                numbers = "\n".join(str(i) for i in range(drawn + 1, line_count + 1))
+                self.line_numbers.insert("end-1c", "\n" + numbers if drawn else numbers)
+            else:
+                self.line_numbers.delete(f"{line_count}.end", "end-1c")
+            if len(str(line_count)) != len(str(drawn)):
+                self.line_numbers.config(width=max(4, len(str(line_count))))
+            self.line_numbers.config(state="disabled")
+            self.gutter_lines = line_count
+            self.line_numbers.yview_moveto(self.editor.yview()[0])
+
+        # Update cursor position in status bar
+        cursor = self.editor.index(tk.INSERT)
+        if cursor != self.cursor:
+            self.cursor = cursor
+            line, column = cursor.split(".")
+            self.set_status(f"Line: {line}, Column: {column} | Ready")
+
+    def watch_editor(self):
+        # Live diagnostics: an edit restarts the idle timer, and when it
+        # fires the editor is compiled on the worker thread like an
+        # explicit compile. A keystroke costs the UI thread a timer reset.
+        # Syntax highlighting follows the edits the same way.
+        self.highlighter = SyntaxHighlighter(self.editor, self.SYNTAX_COLORS)
+        self.highlighter.schedule()
+        self.editor.config(yscrollcommand=self.editor_scrolled)
+        self.editor.tag_configure('warning', underline=True)
+        self.editor.tag_configure('error', underline=True, foreground="#f14c4c")
+        self.editor.bind("<<Modified>>", self.editor_modified)
+        self.editor.edit_modified(False)
+
+    def editor_modified(self, event=None):
+        # Tk reports the modified flag changing, so it is cleared to hear
+        # about the next edit
+        if not self.editor.edit_modified():
+            return
+        self.editor.edit_modified(False)
+        self.highlighter.edited()
+        self.schedule_live_compile()
+
+    def schedule_live_compile(self, delay=None):
+        if self.live_id is not None:
+            self.root.after_cancel(self.live_id)
+        self.live_id = self.root.after(self.LIVE_DELAY_MS if delay is None else delay, self.live_compile)
+
+    def live_compile(self):
+        self.live_id = None
+        if self.compiling and not self.live:
+            # Do not supersede an explicit compile or run; check after it
+            self.schedule_live_compile()
+            return
+        # Code generation is skipped unless its listing is on screen
+        self.compile(last_phase=None if self.tabs['code'].visible() else 'semantic', live=True)
+
+    def compile(self, then=None, last_phase=None, live=False):
+        # Starts a background compile of the editor contents, superseding
+        # any compile in flight. Results are shown phase by phase as the
+        # worker reports them; `then(result)` runs once it finishes.
+        if not live and self.live_id is not None:
+            self.root.after_cancel(self.live_id)
+            self.live_id = None
+        source = self.editor.get("1.0", tk.END)
+        self.after_compile = then
+        self.live = live
+        self.worker.submit(source, last_phase=last_phase)
+        self.set_status("Checking..." if live else "Compiling...")
+        if self.progress is not None:
+            self.progress['value'] = 0
+        self.set_compiling(True)
+
+    def set_compiling(self, compiling):
+        self.compiling = compiling
+        if self.cancel_btn is not None:
+            self.cancel_btn.config(state="normal" if compiling else "disabled")
+        self.schedule_poll()
+
+    def schedule_poll(self):
+        if (self.compiling or self.running) and self.poll_id is None:
+            self.poll_id = self.root.after(self.POLL_INTERVAL_MS, self.poll_worker)
+
+    def cancel_compile(self, discard=False):
+        # The compile stops within milliseconds; unless discarded its
+        # abort is reported like any other result
+        if self.compiling:
+            self.after_compile = None
+            self.worker.cancel("cancelled by user", discard)
+            if discard:
+                self.set_compiling(False)
+
+    def poll_worker(self):
+        self.poll_id = None
+        for kind, _, phase, result in self.worker.poll():
+            if kind == 'phase':
+                self.show_phase(phase, result)
+            elif kind == 'run':
+                self.finish_run(*result)
+            else:
+                self.finish_compile(result)
+        self.schedule_poll()
+
+    def show_listing(self, key, data):
+        # Skipped when the tab already shows this data (set when the phase
+        # producing it finished)
+        if data is not None and self.listings.get(key) is data:
+            return
+        self.listings[key] = data
+        self.tabs[key].set(data)
+
+    def show_tokens(self, tokens):
+        self.show_listing('tokens', tokens)
+
+    def show_ast(self, ast):
+        self.show_listing('ast', ast)
+
+    def show_phase(self, phase, result):
+        # Each listing appears as soon as the phase producing it is done
+        if phase == 'lexer':
+            self.show_tokens(result.tokens)
+        elif phase == 'parser':
+            self.show_ast(result.ast)
+        if self.progress is not None:
+            self.progress['value'] = PHASES.index(phase) + 1
+        self.set_status(f"{'Checking' if self.live else 'Compiling'}... {phase} done")
+
+    def finish_compile(self, result):
+        self.set_compiling(False)
+        if self.progress is not None:
+            self.progress['value'] = len(PHASES)
+        self.result = result
+        self.ast = result.ast
+        self.symbol_table = result.symbol_table
+        self.compile_succeeded = result.succeeded
+        self.show_result(result)
+        self.highlight_diagnostics(result)
+
+        if result.aborted:
+            self.set_status(result.aborted.capitalize())
+        elif self.live:
+            counts = [f"{len(items)} {kind}{'s' if len(items) != 1 else ''}"
+                      for kind, items in (('error', result.errors), ('warning', result.warnings)) if items]
+            self.set_status(f"Checked: {', '.join(counts) or 'no errors'}")
+        elif not result.errors:
+            self.set_status(f"Compilation successful | {self.profiler.summary()}")
+        else:
+            self.set_status(f"Compilation completed with errors | {self.profiler.summary()}")
+        self.compile_finished(result.succeeded)
+        then, self.after_compile = self.after_compile, None
+        if then is not None:
+            then(result)
+
+    def highlight_diagnostics(self, result):
+        # Marks the diagnostics that carry a location in the editor: from
+        # the column to the end of the word, or the whole line without one
+        for tag in ('error', 'warning'):
+            self.editor.tag_remove(tag, "1.0", tk.END)
+        located = [d for d in result.diagnostics if d['line'] and d['file'] == result.path]
+        for entry in located[:self.MAX_HIGHLIGHTS]:
+            if entry['column'] is None:
+                start, end = f"{entry['line']}.0", f"{entry['line']}.end"
+            else:
+                start = f"{entry['line']}.{entry['column']}"
+                end = f"{start} wordend"
+            self.editor.tag_add(entry['severity'], start, end)
+
+    def show_result(self, result):
+        ast, symbol_table = result.ast, result.symbol_table
+        self.show_tokens(result.tokens)
+        self.show_ast(ast)
+        self.tabs['symbols'].set(lambda: symbol_table.table if symbol_table is not None else [])
+        self.tabs['code'].set(result.assembly or "")
+
+        messages = []
+        # An aborted compile only reports the abort, which is among the errors
+        if not result.aborted:
+            if ast is None:
+                messages.append("Syntax errors detected!")
+            semantic_errors = [d for d in result.errors if d['phase'] == 'semantic']
+            if 'semantic' in result.timings and not semantic_errors:
+                messages.append("Semantic analysis passed")
+            else:
+                messages.append("Semantic errors detected!")
+        if result.assembly is not None:
+            messages.append("Code generation successful!")
+        messages += [d['message'] for d in result.errors]
+        messages += ["WARNING: " + d['message'] for d in result.warnings]
+        self.tabs['messages'].set("".join(message + "\n" for message in messages))
+        self.tabs['profile'].set(self.profiler.format)
+
+    def compile_finished(self, succeeded):
+        # Hook for front ends that react to the outcome
+        pass
+
+    def run(self):
+        self.compile(then=self.execute)
+
+    def execute(self, result):
+        # The program runs on the worker, so the window stays responsive
+        # for as long as the VM takes; finish_run() reports it
+        if not result.succeeded:
+            messagebox.showerror("Execution", "Fix the compilation errors before running")
+            return
+        if self.running:
+            self.set_status("A program is already running")
+            return
+        self.set_status("Running program...")
+        self.running = True
+        self.worker.execute(self.ast)
+        self.schedule_poll()
+
+    def finish_run(self, vm, exit_code, error):
+        if not self.running:
+            return  # cleared while it ran
+        self.running = False
+        messages = self.tabs['messages']
+        self.profiler.add_time('execute', vm.elapsed)
+        if error is not None:
+            messages.append(f"Runtime error: {error}\n")
+            self.show_tab('messages')
+            self.set_status("Execution failed")
+            messagebox.showerror("Execution", error)
+            return
+
+        messages.append("\n--- Program output ---\n")
+        messages.append(vm.get_output())
+        messages.append(f"\n--- Exited with code {exit_code} "
+                        f"({vm.instructions_executed} instructions, {vm.elapsed * 1000:.1f} ms) ---\n")
+        self.profiler.count('vm_instructions', vm.instructions_executed)
+        self.tabs['profile'].set(self.profiler.format)
+        self.show_tab('messages')
+        self.set_status(f"Execution completed with exit code {exit_code}")
+        messagebox.showinfo("Execution", f"Program exited with code {exit_code}")
+
+    def clear(self):
+        self.cancel_compile(discard=True)
+        # A program still running finishes unreported
+        self.running = False
+        if self.live_id is not None:
+            self.root.after_cancel(self.live_id)
+            self.live_id = None
+        self.editor.delete("1.0", tk.END)
+        self.editor.edit_modified(False)
+        if self.highlighter is not None:
+            self.highlighter.edited()
+        self.listings = {}
+        for tab in self.tabs.values():
+            tab.set("")
+        self.set_status("Cleared all content")
+        if self.line_numbers is not None:
+            self.update_line_numbers()
@@ -0,0 +1,226 @@
+import tkinter as tk
+from tkinter import ttk
+
+
+class VirtualTable:
+    # Treeview over a sequence of rows that only ever holds the rows on
+    # screen. Scrolling rewrites those items from the sequence, and a row is
+    # formatted by `format_row` only when it comes into view, so a million
+    # tokens show as fast as ten.
+    #
+    # The filter box keeps the rows whose formatted text contains what was
+    # typed, ignoring case. Rows are scanned in chunks between events, and
+    # the scrollbar grows as matches are found.
+
+    # Rows checked against the filter per event loop turn
+    SCAN_CHUNK = 5000
+    FILTER_DELAY_MS = 200
+    WHEEL_ROWS = 3
+
+    def __init__(self, parent, columns, format_row, padding=5):
+        self.format_row = format_row
+        self.rows = []
+        # Indices of the rows passing the filter; None when there is none
+        self.found = None
+        self.needle = ""
+        self.scanned = 0
+        # First row on screen, and how many fit
+        self.offset = 0
+        self.page_rows = 1
+        self.items = []
+        self.filter_id = None
+        self.scan_id = None
+
+        self.frame = ttk.Frame(parent)
+        self.frame.pack(fill="both", expand=True, padx=padding, pady=padding)
+        bar = ttk.Frame(self.frame)
+        bar.pack(fill="x", pady=(0, padding))
+        ttk.Label(bar, text="Filter:").pack(side="left")
+        self.filter_var = tk.StringVar()
+        self.filter_var.trace_add("write", lambda *args: self.schedule_filter())
+        ttk.Entry(bar, textvariable=self.filter_var).pack(side="left", fill="x", expand=True, padx=padding)
+        self.count_label = ttk.Label(bar)
+        self.count_label.pack(side="right")
+
+        self.scrollbar = ttk.Scrollbar(self.frame, orient="vertical", command=self.scroll)
+        self.scrollbar.pack(side="right", fill="y")
+        self.tree = ttk.Treeview(self.frame, columns=columns, show="headings", selectmode="browse")
+        for column in columns:
+            self.tree.heading(column, text=column, anchor="w")
+        self.tree.pack(side="left", fill="both", expand=True)
+        self.tree.bind("<Configure>", self.resized)
+        self.tree.bind("<MouseWheel>", self.wheel)
+        self.tree.bind("<Button-4>", self.wheel)
+        self.tree.bind("<Button-5>", self.wheel)
+        self.tree.bind("<Prior>", lambda event: self.scroll('scroll', -1, 'pages'))
+        self.tree.bind("<Next>", lambda event: self.scroll('scroll', 1, 'pages'))
+        self.tree.bind("<Home>", lambda event: self.scroll('moveto', 0))
+        self.tree.bind("<End>", lambda event: self.scroll('moveto', 1))
+
+    def set(self, rows):
+        self.rows = rows or []
+        self.offset = 0
+        self.apply_filter()
+
+    def count(self):
+        return len(self.rows) if self.found is None else len(self.found)
+
+    def row(self, index):
+        return self.rows[index] if self.found is None else self.rows[self.found[index]]
+
+    def render(self):
+        count = self.count()
+        self.offset = max(0, min(self.offset, count - self.page_rows))
+        shown = range(self.offset, min(count, self.offset + self.page_rows))
+        # The items on screen are reused; only their values change
+        while len(self.items) > len(shown):
+            self.tree.delete(self.items.pop())
+        for position, index in enumerate(shown):
+            values = self.format_row(self.row(index))
+            if position < len(self.items):
+                self.tree.item(self.items[position], values=values)
+            else:
+                self.items.append(self.tree.insert("", "end", values=values))
+        if count:
+            self.scrollbar.set(self.offset / count, (self.offset + len(shown)) / count)
+        else:
+            self.scrollbar.set(0, 1)
+
+        label = f"{count:,} of {len(self.rows):,}" if self.needle else f"{count:,} rows"
+        if self.needle and self.scanned < len(self.rows):
+            label += f" (searching, {self.scanned * 100 // len(self.rows)}%)"
+        self.count_label.config(text=label)
+
+    def resized(self, event):
+        # One row's height goes to the headings
+        row_height = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        page_rows = max(1, event.height // row_height - 1)
+        if page_rows != self.page_rows:
+            self.page_rows = page_rows
+            self.render()
+
+    def scroll(self, action, amount, what=None):
+        # Scrollbar protocol: ('moveto', fraction) or ('scroll', n, 'units' | 'pages')
+        if action == 'moveto':
+            self.offset = int(float(amount) * self.count())
+        else:
+            self.offset += int(amount) * (self.page_rows if what == 'pages' else 1)
+        self.render()
+        return "break"
+
+    def wheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.scroll('scroll', -self.WHEEL_ROWS)
+        else:
+            self.scroll('scroll', self.WHEEL_ROWS)
+        return "break"
+
+    def schedule_filter(self):
+        if self.filter_id is not None:
+            self.tree.after_cancel(self.filter_id)
+        self.filter_id = self.tree.after(self.FILTER_DELAY_MS, self.apply_filter)
+
+    def apply_filter(self):
+        self.filter_id = None
+        if self.scan_id is not None:
+            self.tree.after_cancel(self.scan_id)
+            self.scan_id = None
+        self.needle = self.filter_var.get().strip().lower()
+        self.scanned = 0
+        if self.needle:
+            self.found = []
+            self.offset = 0
+            self.scan()
+        else:
+            self.found = None
+            self.render()
+
+    def scan(self):
+        self.scan_id = None
+        end = min(self.scanned + self.SCAN_CHUNK, len(self.rows))
+        rows, needle, format_row = self.rows, self.needle, self.format_row
+        self.found.extend(index for index in range(self.scanned, end)
+                          if needle in " ".join(map(str, format_row(rows[index]))).lower())
+        self.scanned = end
+        if end < len(rows):
+            self.scan_id = self.tree.after(1, self.scan)
+        self.render()
+
+
+class AstView:
+    # Treeview of the AST. A node's children are inserted when it is first
+    # opened, BATCH at a time; a "... N more" item inserts the next batch
+    # when selected.
+
+    BATCH = 500
+    # Names for the statement lists inside a node, by field position
+    LIST_NAMES = {
+        'function': {3: 'params', 4: 'body'},
+        'if': {2: 'then', 3: 'else'},
+        'while': {2: 'body'},
+        'for': {1: 'init', 3: 'update', 4: 'body'},
+        'print': {1: 'items'},
+        'call': {2: 'args'},
+    }
+
+    def __init__(self, parent, padding=5):
+        self.frame = ttk.Frame(parent)
+        self.frame.pack(fill="both", expand=True, padx=padding, pady=padding)
+        scrollbar = ttk.Scrollbar(self.frame, orient="vertical")
+        scrollbar.pack(side="right", fill="y")
+        self.tree = ttk.Treeview(self.frame, show="tree", selectmode="browse", yscrollcommand=scrollbar.set)
+        scrollbar.config(command=self.tree.yview)
+        self.tree.pack(side="left", fill="both", expand=True)
+        self.tree.bind("<<TreeviewOpen>>", self.opened)
+        self.tree.bind("<<TreeviewSelect>>", self.selected)
+        # item -> children not inserted yet, and "more" item -> (parent, children, start)
+        self.unopened = {}
+        self.more = {}
+
+    def set(self, ast):
+        self.tree.delete(*self.tree.get_children())
+        self.unopened = {}
+        self.more = {}
+        self.insert_children("", [(None, node) for node in ast or []])
+
+    def describe(self, name, value):
+        # (label, [(name, child)]) for a node or a statement list
+        if isinstance(value, list):
+            return f"{name or 'list'} ({len(value)})", [(None, item) for item in value]
+        names = self.LIST_NAMES.get(value[0], {}) if value and isinstance(value[0], str) else {}
+        words = []
+        children = []
+        for position, field in enumerate(value):
+            if isinstance(field, (list, tuple)):
+                children.append((names.get(position), field))
+            elif field is not None:
+                words.append(str(field))
+        label = " ".join(words)
+        return (f"{name}: {label}" if name else label), children
+
+    def insert_children(self, parent, children, start=0):
+        end = min(len(children), start + self.BATCH)
+        for name, value in children[start:end]:
+            label, grandchildren = self.describe(name, value)
+            item = self.tree.insert(parent, "end", text=label)
+            if grandchildren:
+                # A placeholder child, so the item can be opened
+                self.unopened[item] = grandchildren
+                self.tree.insert(item, "end")
+        if end < len(children):
+            more = self.tree.insert(parent, "end", text=f"... {len(children) - end} more")
+            self.more[more] = (parent, children, end)
+
+    def opened(self, event):
+        item = self.tree.focus()
+        children = self.unopened.pop(item, None)
+        if children is not None:
+            self.tree.delete(*self.tree.get_children(item))
+            self.insert_children(item, children)
+
+    def selected(self, event):
+        item = self.tree.focus()
+        if item in self.more:
+            parent, children, start = self.more.pop(item)
+            self.tree.delete(item)
+            self.insert_children(parent, children, start)
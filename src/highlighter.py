@@ -0,0 +1,174 @@
+import re
+
+from lexer import TOKEN_SPECS
+
+SPECS = dict(TOKEN_SPECS)
+
+# The lexer's patterns applied to one line at a time, plus a block comment
+# that does not close on its line (COMMENT is the first spec)
+LINE_REGEX = re.compile('|'.join(
+    f'(?P<{name}>{pattern})'
+    for name, pattern in TOKEN_SPECS[:1] + [('OPEN_COMMENT', r'/\*.*')] + TOKEN_SPECS[1:]
+))
+
+# Only what decides whether a block comment is open at the end of a line
+STATE_REGEX = re.compile('|'.join([SPECS['STRING'], SPECS['CHAR'], r'//', r'/\*']))
+
+# Text tag for each token type that is coloured
+TAGS = {
+    'TYPE': 'type',
+    'KEYWORD': 'keyword',
+    'STRING': 'string',
+    'CHAR': 'string',
+    'INTEGER': 'number',
+    'FLOAT': 'number',
+    'COMMENT': 'comment',
+    'OPEN_COMMENT': 'comment',
+    'PREPROCESSOR': 'preprocessor',
+}
+
+DARK_COLORS = {
+    'type': "#4ec9b0",
+    'keyword': "#569cd6",
+    'string': "#ce9178",
+    'number': "#b5cea8",
+    'comment': "#6a9955",
+    'preprocessor': "#c586c0",
+}
+
+LIGHT_COLORS = {
+    'type': "#267f99",
+    'keyword': "#0000ff",
+    'string': "#a31515",
+    'number': "#098658",
+    'comment': "#008000",
+    'preprocessor': "#af00db",
+}
+
+
+def line_state(line, in_comment):
+    # Whether a block comment is open at the end of `line`, given whether
+    # one was at its start
+    position = 0
+    if in_comment:
+        end = line.find("*/")
+        if end < 0:
+            return True
+        position = end + 2
+    while True:
+        mo = STATE_REGEX.search(line, position)
+        if mo is None or mo.group() == "//":
+            return False
+        if mo.group() == "/*":
+            end = line.find("*/", mo.end())
+            if end < 0:
+                return True
+            position = end + 2
+        else:
+            position = mo.end()
+
+
+class SyntaxHighlighter:
+    # Colours a Tk text widget by the lexer's token types. The key handler
+    # only records the edit; a pass a few milliseconds later re-tags the
+    # lines on screen and those just edited, never the whole buffer.
+    #
+    # Block comments are the only tokens spanning lines, so the lexer state
+    # at a line start is whether one is open there. These states are cached
+    # per line and dropped from the first edited line on; lines further
+    # down are rescanned only when they are shown.
+
+    DELAY_MS = 30
+
+    def __init__(self, text, colors=None):
+        self.text = text
+        colors = colors or DARK_COLORS
+        for tag in colors:
+            text.tag_configure(tag, foreground=colors[tag])
+            # Under the selection and the diagnostics
+            text.tag_lower(tag)
+        self.tags = list(colors)
+        # states[i]: whether line i + 1 starts inside a block comment, for
+        # the lines known so far
+        self.states = [False]
+        self.line_count = self.lines()
+        # (first, last) lines edited since the last pass
+        self.dirty = None
+        self.pending = None
+
+    def lines(self):
+        return int(self.text.index("end-1c").split(".")[0])
+
+    def edited(self):
+        # The text widget does not say where an edit was. It ends at the
+        # cursor, and an edit that added lines started that many lines up.
+        line = int(self.text.index("insert").split(".")[0])
+        count = self.lines()
+        first = max(1, line - max(0, count - self.line_count))
+        self.line_count = count
+        del self.states[first:]
+        if self.dirty is not None:
+            first, line = min(first, self.dirty[0]), max(line, self.dirty[1])
+        self.dirty = (first, min(line, count))
+        self.schedule()
+
+    def schedule(self):
+        # Typing keeps one pass pending rather than postponing it
+        if self.pending is None:
+            self.pending = self.text.after(self.DELAY_MS, self.highlight)
+
+    def highlight(self):
+        self.pending = None
+        top = int(self.text.index("@0,0").split(".")[0])
+        bottom = int(self.text.index(f"@0,{self.text.winfo_height()}").split(".")[0])
+        spans = [(top, bottom)]
+        if self.dirty is not None:
+            first, last = self.dirty
+            self.dirty = None
+            if last < top or first > bottom:
+                spans.append((first, last))
+            else:
+                spans[0] = (min(first, top), max(last, bottom))
+        for first, last in spans:
+            last = min(last, self.line_count)
+            if first <= last:
+                self.retag(first, last)
+
+    def state_at(self, line):
+        # Scans the lines between the last known state and `line`
+        known = len(self.states)
+        if line > known:
+            state = self.states[-1]
+            for text in self.text.get(f"{known}.0", f"{line - 1}.end").split("\n"):
+                state = line_state(text, state)
+                self.states.append(state)
+        return self.states[line - 1]
+
+    def retag(self, first, last):
+        state = self.state_at(first)
+        ranges = {tag: [] for tag in self.tags}
+        comment = ranges.get('comment', [])
+        for number, line in enumerate(self.text.get(f"{first}.0", f"{last}.end").split("\n"), first):
+            position = 0
+            if state:
+                end = line.find("*/")
+                if end < 0:
+                    end = len(line) - 2
+                else:
+                    state = False
+                comment += [f"{number}.0", f"{number}.{end + 2}"]
+                position = end + 2
+            if not state:
+                for mo in LINE_REGEX.finditer(line, position):
+                    kind = mo.lastgroup
+                    if kind == 'OPEN_COMMENT':
+                        state = True
+                    tag = TAGS.get(kind)
+                    if tag in ranges:
+                        ranges[tag] += [f"{number}.{mo.start()}", f"{number}.{mo.end()}"]
+            if len(self.states) == number:
+                self.states.append(state)
+        for tag, indices in ranges.items():
+            self.text.tag_remove(tag, f"{first}.0", f"{last}.end")
+            if indices:
+                self.text.tag_add(tag, *indices)
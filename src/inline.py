@@ -0,0 +1,399 @@
+from cancel import NEVER_CANCELLED
+from instrument import count_ast_nodes
+from isel import constant_value, fold_binary
+from loops import assignments, literal, rewrite_statement, walk
+from value_types import expression_type, is_float
+
+# Callee size limit in AST nodes; `return a * b + c;` is 6
+INLINE_THRESHOLD = 30
+# Calls inside inlined code are inlined again, up to this many levels
+MAX_DEPTH = 4
+
+
+def call_graph(functions, cancel=NEVER_CANCELLED):
+    # name -> names of the functions it calls, for those calling any; a
+    # function calling none is on no cycle
+    calls = {}
+    for name, node in functions.items():
+        cancel.check()
+        callees = {item[1] for item in walk(node[4]) if item[0] == 'call'}
+        if callees:
+            calls[name] = callees
+    return calls
+
+
+def recursive_functions(calls):
+    # Names on a call cycle: Tarjan's strongly connected components,
+    # iterative so long call chains do not hit the recursion limit
+    index = {}
+    low = {}
+    stack = []
+    on_stack = set()
+    recursive = set()
+    for root in calls:
+        if root in index:
+            continue
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(calls[root]))]
+        while work:
+            node, callees = work[-1]
+            for callee in callees:
+                if callee not in calls:
+                    continue
+                if callee not in index:
+                    index[callee] = low[callee] = len(index)
+                    stack.append(callee)
+                    on_stack.add(callee)
+                    work.append((callee, iter(calls[callee])))
+                    break
+                if callee in on_stack:
+                    low[node] = min(low[node], index[callee])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    if len(component) > 1 or node in calls[node]:
+                        recursive.update(component)
+    return recursive
+
+
+def declared_names(params, body):
+    return {name for _, name in params if name} | {item[2] for item in walk(body) if item[0] == 'declaration'}
+
+
+def float_variables(params, body, global_types):
+    # Names that are floats wherever a function uses them: every
+    # declaration of them in it is float, and they are no int global
+    types = {}
+    for var_type, name in params:
+        types.setdefault(name, set()).add(is_float(var_type))
+    for item in walk(body):
+        if item[0] == 'declaration':
+            types.setdefault(item[2], set()).add(is_float(item[1]))
+    names = {name for name, kinds in types.items() if kinds == {True} and is_float(global_types.get(name, 'float'))}
+    names.update(name for name, var_type in global_types.items() if is_float(var_type) and name not in types)
+    return names
+
+
+def as_float(expr):
+    # `expr` converted to a float, as passing it to a float parameter does;
+    # multiplying by 1.0 converts an int and leaves a float as it is
+    if expr[0] == 'literal' and expr[1] == 'int':
+        return ('literal', 'float', str(float(int(expr[2]))))
+    return ('binary_op', '*', expr, ('literal', 'float', '1.0'))
+
+
+def rename(node, names):
+    # `node` with the variables in `names` renamed
+    if isinstance(node, list):
+        return [rename(item, names) for item in node]
+    if not isinstance(node, tuple) or not node or not isinstance(node[0], str):
+        return node
+    if node[0] == 'variable':
+        return ('variable', names.get(node[1], node[1]))
+    if node[0] == 'declaration':
+        return ('declaration', node[1], names.get(node[2], node[2]), rename(node[3], names))
+    return (node[0],) + tuple(rename(field, names) for field in node[1:])
+
+
+def single_return(body):
+    # e when the body is just `return e;` with e pure, else None
+    if len(body) == 1 and body[0][0] == 'return' and body[0][1] is not None and pure(body[0][1]):
+        return body[0][1]
+    return None
+
+
+def substitute(expr, values):
+    # `expr` with the variables in `values` replaced by their expressions.
+    # Operations on constant arguments are folded, as the code generator
+    # only folds them when both operands are literals.
+    if expr[0] == 'variable':
+        return values.get(expr[1], expr)
+    if expr[0] == 'unary_op':
+        return expr[:2] + (substitute(expr[2], values),)
+    if expr[0] == 'binary_op':
+        _, op, left, right = expr
+        left, right = substitute(left, values), substitute(right, values)
+        left_value, right_value = constant_value(left), constant_value(right)
+        if left_value is not None and right_value is not None:
+            value = fold_binary(op, left_value, right_value)
+            if value is not None:
+                return literal(value)
+        return ('binary_op', op, left, right)
+    if expr[0] == 'assignment':
+        return (expr[0], expr[1], substitute(expr[2], values))
+    if expr[0] == 'call':
+        return (expr[0], expr[1], [substitute(arg, values) for arg in expr[2]])
+    return expr
+
+
+def substitute_all(body, values):
+    # `body` with the parameters in `values` replaced by their arguments
+    if not values:
+        return body
+    return [rewrite_statement(stmt, lambda expr: substitute(expr, values)) for stmt in body]
+
+
+def returns_to_breaks(body, result):
+    # `return e;` becomes `result = e; break;`. Returns are never inside the
+    # callee's own loops, so the break leaves the block around the body.
+    new_body = []
+    for stmt in body:
+        if stmt[0] == 'return':
+            if stmt[1] is not None:
+                if result is not None:
+                    new_body.append(('expression', ('assignment', ('variable', result), stmt[1])))
+                else:
+                    new_body.append(('expression', stmt[1]))
+            new_body.append(('break',))
+        elif stmt[0] == 'if':
+            _, condition, then_body, else_body = stmt
+            new_body.append(('if', condition, returns_to_breaks(then_body, result),
+                             returns_to_breaks(else_body, result) if else_body is not None else None))
+        else:
+            new_body.append(stmt)
+    return new_body
+
+
+def pure(expr):
+    # Whether evaluating `expr` has no effects
+    return not any(node[0] in ('call', 'assignment') for node in walk(expr))
+
+
+def call_site(stmt):
+    # (call, rebuild) when the statement's value is a call, where
+    # rebuild(value) is the statement using `value` in its place
+    kind = stmt[0]
+    if kind == 'expression' and stmt[1][0] == 'call':
+        return stmt[1], None
+    if kind == 'expression' and stmt[1][0] == 'assignment' and stmt[1][2][0] == 'call':
+        return stmt[1][2], lambda value: ('expression', ('assignment', stmt[1][1], value))
+    if kind == 'declaration' and stmt[3] is not None and stmt[3][0] == 'call':
+        return stmt[3], lambda value: stmt[:3] + (value,)
+    if kind == 'return' and stmt[1] is not None and stmt[1][0] == 'call':
+        return stmt[1], lambda value: ('return', value)
+    return None, None
+
+
+class Inliner:
+    # Replaces calls to small, non-recursive functions with the callee's
+    # body, in one of two ways:
+    #
+    # - a callee that is only `return e;`, with e pure, is substituted into
+    #   the expression making the call when its arguments are pure too and
+    #   either simple or used at most once: `square(i) + 1` becomes
+    #   `i * i + 1`;
+    # - a call that is the whole value of an expression statement,
+    #   assignment, declaration or return, or is printed by cout, becomes a
+    #   block that runs once, `for (params = args;;) { body; break; }`, in
+    #   which each return stores the result and breaks out. The parameters
+    #   are bound right to left, the order generate_call evaluates
+    #   arguments in. Other calls inside larger expressions stay calls, so
+    #   the order of evaluation around them is unchanged.
+    #
+    # The callee's variables are renamed apart from the caller's.
+    #
+    # The cost model is the callee's size in AST nodes against `threshold`.
+    # A callee whose globals the caller shadows with locals of the same
+    # name, or with a return inside a loop, is never inlined.
+    #
+    # An int passed to a float parameter, or returned by a float function,
+    # is converted where it is substituted, as the call would convert it;
+    # `global_types` gives the type of each global for this.
+
+    def __init__(self, functions, threshold=INLINE_THRESHOLD, cancel=None, global_types=None):
+        self.threshold = threshold
+        self.cancel = cancel or NEVER_CANCELLED
+        self.global_types = global_types or {}
+        self.return_types = {name: node[1] for name, node in functions.items()}
+        self.recursive = recursive_functions(call_graph(functions, self.cancel))
+        sizes = {}
+        for name, node in functions.items():
+            self.cancel.check()
+            sizes[name] = count_ast_nodes(node[4])
+        # Only the callees small enough to inline are kept
+        self.functions = {name: node for name, node in functions.items()
+                          if sizes[name] <= threshold and name not in self.recursive}
+        self.sizes = {name: sizes[name] for name in self.functions}
+        # (caller, callee, callee size) of every call inlined
+        self.sites = []
+        self.caller = None
+        self.caller_names = set()
+        self.caller_floats = set()
+
+    def inline(self, name, params, body):
+        # `body` of function `name` with its eligible calls inlined
+        self.caller = name
+        self.caller_names = declared_names(params, body)
+        self.caller_floats = float_variables(params, body, self.global_types)
+        self.site_count = 0
+        return self.block(body, 0)
+
+    def eligible(self, call):
+        _, name, args = call
+        callee = self.functions.get(name)
+        if callee is None:
+            return False
+        _, _, _, params, body = callee
+        if len(args) != len(params):
+            return False
+        if any(item[0] == 'return' for loop in walk(body) if loop[0] in ('while', 'for') for item in walk(loop)):
+            return False
+        free = {item[1] for item in walk(body) if item[0] == 'variable'} - declared_names(params, body)
+        return not free & self.caller_names
+
+    def block(self, body, depth):
+        new_body = []
+        for stmt in body:
+            new_body += self.statement(stmt, depth)
+        return new_body
+
+    def statement(self, stmt, depth):
+        self.cancel.check()
+        kind = stmt[0]
+        if kind == 'if':
+            _, condition, then_body, else_body = stmt
+            return [('if', self.expression(condition), self.block(then_body, depth),
+                     self.block(else_body, depth) if else_body is not None else None)]
+        if kind == 'while':
+            return [('while', self.expression(stmt[1]), self.block(stmt[2], depth))]
+        if kind == 'for':
+            _, init, condition, updates, body = stmt
+            return [('for', self.block(init, depth), self.expression(condition) if condition else None,
+                     [self.expression(update) for update in updates], self.block(body, depth))]
+        stmt = rewrite_statement(stmt, self.expression)
+        if depth >= MAX_DEPTH:
+            return [stmt]
+        if kind == 'print':
+            return self.print_statement(stmt, depth)
+        call, rebuild = call_site(stmt)
+        if call is None or not self.eligible(call):
+            return [stmt]
+        want_result = rebuild is not None
+        expansion, result = self.expand(call, want_result)
+        if want_result:
+            expansion.append(rebuild(('variable', result)))
+        return self.block(expansion, depth + 1)
+
+    def expression(self, expr):
+        # `expr` with the calls that can be substituted replaced, innermost first
+        kind = expr[0]
+        if kind == 'binary_op':
+            return (kind, expr[1], self.expression(expr[2]), self.expression(expr[3]))
+        if kind in ('unary_op', 'assignment'):
+            return (kind, expr[1], self.expression(expr[2]))
+        if kind != 'call':
+            return expr
+        call = (kind, expr[1], [self.expression(arg) for arg in expr[2]])
+        if not self.eligible(call):
+            return call
+        _, name, args = call
+        _, _, _, params, body = self.functions[name]
+        value = single_return(body)
+        if value is None:
+            return call
+        values = self.arguments(params, args, body)
+        if len(values) != len(params):
+            return call
+        self.sites.append((self.caller, name, self.sizes[name]))
+        return_type = self.functions[name][1]
+        if is_float(return_type) and not self.is_float(value, float_variables(params, [], self.global_types)):
+            return as_float(substitute(value, values))
+        return substitute(value, values)
+
+    def is_float(self, expr, names):
+        # Whether `expr` is a float whichever declaration its variables
+        # refer to, given `names` that certainly are
+        return expression_type(expr, lambda name: 'float' if name in names else 'int',
+                               lambda name: self.return_types.get(name, 'int')) == 'float'
+
+    def arguments(self, params, args, body):
+        # The parameters the arguments can be substituted for, mapped to
+        # their arguments. The rest are bound by declarations, which
+        # evaluate them first, right to left as a call does.
+        assigned = assignments(body)
+        all_pure = all(pure(arg) for arg in args)
+        calls = any(node[0] == 'call' for node in walk(body))
+        value = single_return(body)
+        uses = [node for node in walk(value) if node[0] == 'variable'] if value is not None else []
+        values = {}
+        for (p_type, p_name), arg in zip(params, args):
+            if assigned[p_name]:
+                continue
+            if is_float(p_type) and not self.is_float(arg, self.caller_floats):
+                # Converted once where it is bound, unless used at most once
+                arg = as_float(arg)
+                if arg[0] == 'literal':
+                    values[p_name] = arg
+                elif all_pure and value is not None and uses.count(('variable', p_name)) <= 1:
+                    values[p_name] = arg
+            elif arg[0] == 'literal':
+                values[p_name] = arg
+            elif not all_pure:
+                continue
+            elif arg[0] == 'variable':
+                # The callee could change a global before reading it
+                if arg[1] in self.caller_names or not (assigned[arg[1]] or calls):
+                    values[p_name] = arg
+            elif value is not None and uses.count(('variable', p_name)) <= 1:
+                values[p_name] = arg
+        return values
+
+    def print_statement(self, stmt, depth):
+        # cout << a << f(x) << b; prints a, inlines f, then prints the rest
+        items = stmt[1]
+        for position, item in enumerate(items):
+            if item[0] == 'call' and self.eligible(item):
+                expansion, result = self.expand(item, True)
+                before = [('print', items[:position])] if position else []
+                rest = ('print', [('variable', result)] + items[position + 1:])
+                return before + self.block(expansion, depth + 1) + self.statement(rest, depth)
+        return [stmt]
+
+    def expand(self, call, want_result):
+        # The statements replacing `call`, and the variable holding its result
+        _, name, args = call
+        return_type, _, params, body = self.functions[name][1:]
+        self.site_count += 1
+        prefix = f".{name}{self.site_count}."
+        values = self.arguments(params, args, body)
+        names = {local: prefix + local for local in declared_names(params, body) - set(values)}
+        result = prefix + "result" if want_result else None
+        init = [('declaration', p_type, names.get(p_name, prefix), arg)
+                for (p_type, p_name), arg in reversed(list(zip(params, args))) if p_name not in values]
+        self.sites.append((self.caller, name, self.sizes[name]))
+        value = single_return(body)
+        if value is not None:
+            # No block needed: bind the rest of the arguments, then compute
+            value = substitute(rename(value, names), values)
+            if result is None:
+                return init, None
+            return init + [('declaration', return_type, result, value)], result
+        body = returns_to_breaks(substitute_all(rename(body, names), values), result)
+        block = ('for', init, None, [], body + [('break',)])
+        if result is None:
+            return [block], None
+        # Falling off the end returns 0, as a call does
+        return [('declaration', return_type, result, None), block], result
+
+
+def report(sites):
+    # One line per callee of the (caller, callee, size) sites inlined
+    callees = {}
+    for caller, callee, size in sites:
+        entry = callees.setdefault(callee, [size, 0, set()])
+        entry[1] += 1
+        entry[2].add(caller)
+    return "\n".join(f"{callee}: {count} call site(s) inlined into {', '.join(sorted(callers))} ({size} nodes)"
+                     for callee, (size, count, callers) in sorted(callees.items()))
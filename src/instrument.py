@@ -0,0 +1,213 @@
+import functools
+import json
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+
+class Timer:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.add_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class NullTimer:
+    # Shared do-nothing timer handed out while profiling is disabled
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_TIMER = NullTimer()
+
+
+def count_ast_nodes(node):
+    # AST nodes are tuples tagged with a string; statement bodies are lists
+    if isinstance(node, list):
+        return sum(count_ast_nodes(item) for item in node)
+    if isinstance(node, tuple) and node and isinstance(node[0], str):
+        return 1 + sum(count_ast_nodes(item) for item in node[1:] if isinstance(item, (tuple, list)))
+    return 0
+
+
+class Profiler:
+    # Accumulates named timers and counters. While disabled every hook
+    # returns immediately, so instrumented code can leave the calls in place.
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.timings = {}  # name -> [calls, seconds]
+        self.counters = Counter()
+
+    def reset(self):
+        self.timings = {}
+        self.counters = Counter()
+
+    def timer(self, name):
+        return Timer(self, name) if self.enabled else NULL_TIMER
+
+    def timed(self, name=None):
+        # Decorator form of timer(); defaults to the function's qualified name
+        def decorator(func):
+            label = name or func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.add_time(label, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def add_time(self, name, seconds):
+        if not self.enabled:
+            return
+        entry = self.timings.get(name)
+        if entry is None:
+            self.timings[name] = [1, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            self.counters[name] += amount
+
+    def total_time(self):
+        return sum(seconds for _, seconds in self.timings.values())
+
+    def to_dict(self):
+        return {
+            'timers': {name: {'calls': calls, 'seconds': seconds}
+                       for name, (calls, seconds) in self.timings.items()},
+            'counters': dict(self.counters),
+        }
+
+    def to_json(self, path=None):
+        text = json.dumps(self.to_dict(), indent=2)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(text + "\n")
+        return text
+
+    def summary(self):
+        # One line for a status bar
+        phases = ", ".join(f"{name} {seconds * 1000:.1f}" for name, (_, seconds) in self.timings.items())
+        return f"{self.total_time() * 1000:.1f} ms ({phases})" if phases else "no timings"
+
+    def format(self):
+        lines = [f"{'timer':<20}{'calls':>8}{'total ms':>12}{'mean ms':>12}"]
+        for name, (calls, seconds) in self.timings.items():
+            lines.append(f"{name:<20}{calls:>8}{seconds * 1000:>12.3f}{seconds * 1000 / calls:>12.3f}")
+        lines.append("")
+        lines.append(f"{'counter':<20}{'value':>8}")
+        for name, value in self.counters.items():
+            lines.append(f"{name:<20}{value:>8}")
+        return "\n".join(lines)
+
+
+def peak_rss():
+    # Peak resident set size of this process in bytes, where available
+    try:
+        import resource
+    except ImportError:
+        return None
+    import sys
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class MemoryProfiler:
+    # Opt-in tracemalloc snapshots around each phase. Tracing slows the
+    # compiler down several times, so this is only used when asked for.
+
+    def __init__(self, top=10):
+        self.top = top
+        self.phases = {}
+        self.started_tracing = False
+
+    def reset(self):
+        self.phases = {}
+
+    @contextmanager
+    def phase(self, name):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+        before = self.snapshot()
+        current_before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            stats = self.snapshot().compare_to(before, 'lineno')
+            self.phases[name] = {
+                'retained': current - current_before,
+                'peak': peak - current_before,
+                'top': [{'site': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                         'bytes': stat.size_diff, 'blocks': stat.count_diff}
+                        for stat in stats[:self.top] if stat.size_diff > 0],
+            }
+
+    def snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ])
+
+    def stop(self):
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def to_dict(self, counters=None):
+        # `counters` (tokens, ast_nodes) turn phase growth into per-item sizes
+        counters = counters or {}
+        result = {'phases': self.phases, 'peak_rss': peak_rss()}
+        if counters.get('tokens') and 'lexer' in self.phases:
+            result['bytes_per_token'] = self.phases['lexer']['retained'] / counters['tokens']
+        if counters.get('ast_nodes') and 'parser' in self.phases:
+            result['bytes_per_ast_node'] = self.phases['parser']['retained'] / counters['ast_nodes']
+        return result
+
+
+def format_memory(report):
+    lines = [f"{'phase':<12}{'retained KB':>14}{'peak KB':>12}"]
+    for name, entry in report['phases'].items():
+        lines.append(f"{name:<12}{entry['retained'] / 1024:>14.1f}{entry['peak'] / 1024:>12.1f}")
+    lines.append("")
+    if 'bytes_per_token' in report:
+        lines.append(f"bytes per token:    {report['bytes_per_token']:.0f}")
+    if 'bytes_per_ast_node' in report:
+        lines.append(f"bytes per AST node: {report['bytes_per_ast_node']:.0f}")
+    if report['peak_rss']:
+        lines.append(f"peak RSS:           {report['peak_rss'] / 2 ** 20:.1f} MB")
+    for name, entry in report['phases'].items():
+        if entry['top']:
+            lines.append(f"\ntop allocation sites in {name}:")
+            for site in entry['top']:
+                lines.append(f"  {site['bytes'] / 1024:>10.1f} KB {site['blocks']:>8} blocks  {site['site']}")
+    return "\n".join(lines)
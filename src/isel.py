@@ -0,0 +1,130 @@
+WORD_BITS = 64
+WORD_MASK = (1 << WORD_BITS) - 1
+IMM32_MIN = -(1 << 31)
+IMM32_MAX = (1 << 31) - 1
+
+# lea can scale an index by these factors while adding the base once more
+LEA_FACTORS = {3: 2, 5: 4, 9: 8}
+
+
+def to_signed(value):
+    value &= WORD_MASK
+    return value - (1 << WORD_BITS) if value >> (WORD_BITS - 1) else value
+
+
+def fits_imm32(value):
+    return IMM32_MIN <= value <= IMM32_MAX
+
+
+def constant_value(expr_node):
+    # Integer value of a constant expression node, or None
+    if expr_node is None:
+        return None
+    if expr_node[0] == 'literal' and expr_node[1] == 'int':
+        return int(expr_node[2])
+    if expr_node[0] == 'unary_op' and expr_node[1] == '-':
+        value = constant_value(expr_node[2])
+        return None if value is None else to_signed(-value)
+    return None
+
+
+def float_value(expr_node):
+    # Float value of a constant expression node, int literals included, or None
+    if expr_node is None:
+        return None
+    if expr_node[0] == 'literal' and expr_node[1] == 'float':
+        return float(expr_node[2])
+    if expr_node[0] == 'literal' and expr_node[1] == 'int':
+        return float(to_signed(int(expr_node[2])))
+    if expr_node[0] == 'unary_op' and expr_node[1] == '-':
+        value = float_value(expr_node[2])
+        return None if value is None else -value
+    return None
+
+
+def log2_exact(value):
+    # k such that value == 2**k, or None
+    if value > 0 and value & (value - 1) == 0:
+        return value.bit_length() - 1
+    return None
+
+
+def lea_decomposition(value):
+    # (lea factor, shift) with value == factor * 2**shift, or None
+    for factor in LEA_FACTORS:
+        if value % factor == 0:
+            shift = log2_exact(value // factor)
+            if shift is not None:
+                return factor, shift
+    return None
+
+
+def signed_magic(divisor):
+    # Magic multiplier and shift for signed division by a constant
+    # (Hacker's Delight, figure 10-1), for |divisor| >= 2.
+    two_p = 1 << (WORD_BITS - 1)
+    ad = abs(divisor)
+    t = two_p + (1 if divisor < 0 else 0)
+    anc = t - 1 - t % ad
+    p = WORD_BITS - 1
+    q1, r1 = divmod(two_p, anc)
+    q2, r2 = divmod(two_p, ad)
+    while True:
+        p += 1
+        q1, r1 = (2 * q1) & WORD_MASK, 2 * r1
+        if r1 >= anc:
+            q1, r1 = (q1 + 1) & WORD_MASK, r1 - anc
+        q2, r2 = (2 * q2) & WORD_MASK, 2 * r2
+        if r2 >= ad:
+            q2, r2 = (q2 + 1) & WORD_MASK, r2 - ad
+        delta = ad - r2
+        if not (q1 < delta or (q1 == delta and r1 == 0)):
+            break
+    magic = to_signed(q2 + 1)
+    if divisor < 0:
+        magic = to_signed(-magic)
+    return magic, p - WORD_BITS
+
+
+def fold_binary(op, left, right):
+    # C semantics on 64-bit signed values; None when the result is undefined
+    if op == '+':
+        return to_signed(left + right)
+    if op == '-':
+        return to_signed(left - right)
+    if op == '*':
+        return to_signed(left * right)
+    if op in ('/', '%'):
+        if right == 0 or (left == -(1 << (WORD_BITS - 1)) and right == -1):
+            return None
+        quotient = abs(left) // abs(right)
+        if (left < 0) != (right < 0):
+            quotient = -quotient
+        return quotient if op == '/' else left - quotient * right
+    if op == '<':
+        return int(left < right)
+    if op == '>':
+        return int(left > right)
+    if op == '>=':
+        return int(left >= right)
+    if op == '<=':
+        return int(left <= right)
+    if op == '==':
+        return int(left == right)
+    if op == '!=':
+        return int(left != right)
+    return None
+
+
+def fold_float(op, left, right):
+    # Python floats are IEEE doubles, so this is what addsd and the rest
+    # compute; None for division by zero, which the VM reports
+    if op == '+':
+        return left + right
+    if op == '-':
+        return left - right
+    if op == '*':
+        return left * right
+    if op == '/' and right != 0:
+        return left / right
+    return None
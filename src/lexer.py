@@ -1,8 +1,33 @@
 import re
 
+from cancel import NEVER_CANCELLED
+
+TOKEN_SPECS = [
+    # Before OPERATOR, which would otherwise take the leading '/'
+    ('COMMENT', r'//.*|/\*[\s\S]*?\*/'),
+    ('TYPE', r'\b(int|float|char|bool|double|void)\b'),
+    ('KEYWORD', r'\b(if|else|while|for|return|break|continue|class|struct)\b'),
+    ('OPERATOR', r'\+\+|--|<<|>>|<=|>=|==|!=|&&|\|\||[+\-*/%=!<>&|^~]'),
+    ('DELIMITER', r'[();,{}\[\]\.]'),
+    ('IDENTIFIER', r'[a-zA-Z_]\w*'),
+    ('FLOAT', r'\d+\.\d+([eE][-+]?\d+)?'),
+    ('INTEGER', r'\d+'),
+    ('STRING', r'"[^"\\]*(?:\\.[^"\\]*)*"'),
+    ('CHAR', r"'(\\?.)'"),
+    ('PREPROCESSOR', r'#\s*\w+'),
+    # Backslash-newline joins two lines, so a directive can continue
+    ('SPLICE', r'\\[ \t]*\r?\n'),
+    ('WHITESPACE', r'\s+'),
+    ('MISMATCH', r'.')
+]
+
+# Compiled once at import, shared by every tokenize() call
+TOKEN_REGEX = re.compile('|'.join(f'(?P<{name}>{pattern})' for name, pattern in TOKEN_SPECS))
+
 class LexicalAnalyzer:
-    def __init__(self, symbol_table):
+    def __init__(self, symbol_table, cancel=None):
         self.symbol_table = symbol_table
+        self.cancel = cancel or NEVER_CANCELLED
         self.tokens = []
         self.errors = []
         
@@ -10,41 +35,30 @@ class LexicalAnalyzer:
         self.tokens = []
         self.errors = []
         
-        token_specs = [
-            ('TYPE', r'\b(int|float|char|bool|double|void)\b'),
-            ('KEYWORD', r'\b(if|else|while|for|return|break|continue|class|struct)\b'),
-            ('OPERATOR', r'[+\-*/%=!<>&|^~]|\+\+|--|<<|>>|<=|>=|==|!=|&&|\|\|'),
-            ('DELIMITER', r'[();,{}\[\]\.]'),
-            ('IDENTIFIER', r'[a-zA-Z_]\w*'),
-            ('FLOAT', r'\d+\.\d+([eE][-+]?\d+)?'),
-            ('INTEGER', r'\d+'),
-            ('STRING', r'"[^"\\]*(?:\\.[^"\\]*)*"'),
-            ('CHAR', r"'(\\?.)'"),
-            ('PREPROCESSOR', r'#\s*\w+'),
-            ('WHITESPACE', r'\s+'),
-            ('COMMENT', r'//.*|/\*[\s\S]*?\*/'),
-            ('MISMATCH', r'.')
-        ]
-        
-        tok_regex = '|'.join(f'(?P<{name}>{pattern})' for name, pattern in token_specs)
         line_num = 1
         line_start = 0
+        # The next token is on a line joined to the one before
+        spliced = False
         
-        for mo in re.finditer(tok_regex, source_code):
+        check = self.cancel.check
+        for mo in TOKEN_REGEX.finditer(source_code):
+            check()
             kind = mo.lastgroup
             value = mo.group()
             col = mo.start() - line_start
             line = line_num
             
-            if kind == 'WHITESPACE':
+            if kind == 'WHITESPACE' or kind == 'COMMENT':
                 if '\n' in value:
                     line_num += value.count('\n')
-                    line_start = mo.end()
+                    # Columns count from just after the last newline
+                    line_start = mo.start() + value.rindex('\n') + 1
+                    spliced = False
                 continue
-            elif kind == 'COMMENT':
-                if '\n' in value:
-                    line_num += value.count('\n')
-                    line_start = mo.end()
+            elif kind == 'SPLICE':
+                line_num += 1
+                line_start = mo.end()
+                spliced = True
                 continue
             elif kind == 'MISMATCH':
                 self.errors.append(f"Lexical error at line {line}: Unexpected character '{value}'")
@@ -54,11 +68,16 @@ class LexicalAnalyzer:
             if kind == 'IDENTIFIER':
                 self.symbol_table.add_symbol(value, "identifier")
                 
-            self.tokens.append({
+            token = {
                 'type': kind,
                 'value': value,
                 'line': line,
                 'col': col
-            })
+            }
+            if spliced:
+                # Only directives care; see preprocessor.directive_end
+                token['continues'] = True
+                spliced = False
+            self.tokens.append(token)
             
         return self.tokens
\ No newline at end of file
@@ -0,0 +1,313 @@
+from collections import Counter
+
+from cancel import NEVER_CANCELLED
+from isel import constant_value, lea_decomposition, log2_exact, to_signed
+from value_types import is_float, may_be_float
+
+# Operators that cannot trap, so they may run before a loop whose body
+# would not have run at all. Division is only hoisted by a non-zero constant.
+SAFE_OPERATORS = {'+', '-', '*', '<', '>', '<=', '>=', '==', '!='}
+
+
+def literal(value):
+    node = ('literal', 'int', str(abs(value)))
+    return ('unary_op', '-', node) if value < 0 else node
+
+
+def walk(node):
+    # Every AST node inside `node` (a node, a statement list or None), itself included
+    if isinstance(node, list):
+        for item in node:
+            yield from walk(item)
+    elif isinstance(node, tuple) and node and isinstance(node[0], str):
+        yield node
+        for field in node[1:]:
+            if isinstance(field, (tuple, list)):
+                yield from walk(field)
+
+
+def assignments(node):
+    # name -> how many times `node` assigns or declares it
+    counts = Counter()
+    for item in walk(node):
+        if item[0] == 'assignment' and item[1] and item[1][0] == 'variable':
+            counts[item[1][1]] += 1
+        elif item[0] == 'declaration':
+            counts[item[2]] += 1
+    return counts
+
+
+def float_names(params, body, float_globals=()):
+    # Names declared float anywhere in a function or as globals. The
+    # temporaries passes declare as 'auto' take their initialiser's type.
+    names = set(float_globals)
+    names.update(name for var_type, name in params if is_float(var_type))
+    declarations = [item for item in walk(body) if item[0] == 'declaration']
+    names.update(item[2] for item in declarations if is_float(item[1]))
+    while True:
+        more = {item[2] for item in declarations if item[1] == 'auto' and item[2] not in names
+                and item[3] is not None and may_be_float(item[3], names)}
+        if not more:
+            return names
+        names |= more
+
+
+def invariant(expr, variant):
+    # Whether `expr` has the same value, and no effects, on every iteration
+    kind = expr[0]
+    if kind == 'literal':
+        return True
+    if kind == 'variable':
+        return expr[1] not in variant
+    if kind == 'unary_op':
+        return invariant(expr[2], variant)
+    if kind == 'binary_op':
+        _, op, left, right = expr
+        if op in ('/', '%'):
+            if constant_value(right) in (None, 0):
+                return False
+        elif op not in SAFE_OPERATORS:
+            return False
+        return invariant(left, variant) and invariant(right, variant)
+    return False
+
+
+def induction_step(expr):
+    # (name, c) for `i = i + c` or `i = i - c` with a constant c, else (None, None)
+    if expr and expr[0] == 'assignment' and expr[1] and expr[1][0] == 'variable':
+        name, value = expr[1][1], expr[2]
+        if value[0] == 'binary_op' and value[1] in ('+', '-'):
+            _, op, left, right = value
+            if left == ('variable', name) and constant_value(right) is not None:
+                step = constant_value(right)
+                return name, step if op == '+' else to_signed(-step)
+            if op == '+' and right == ('variable', name) and constant_value(left) is not None:
+                return name, constant_value(left)
+    return None, None
+
+
+def own_continue(body):
+    # Whether `body` has a continue for its own loop, not a nested one
+    for stmt in body:
+        if stmt[0] == 'continue':
+            return True
+        if stmt[0] == 'if' and (own_continue(stmt[2]) or own_continue(stmt[3] or [])):
+            return True
+    return False
+
+
+def runs_once(body):
+    # Whether a loop with this body never gets back to its test: the body
+    # ends in a break and nothing continues. Inlined calls are such blocks.
+    return bool(body) and body[-1] == ('break',) and not own_continue(body)
+
+
+def cheap_multiplier(expr):
+    # Constants the code generator multiplies by without an imul
+    value = constant_value(expr)
+    if value is None:
+        return False
+    value = abs(value)
+    return value == 0 or log2_exact(value) is not None or lea_decomposition(value) is not None
+
+
+def rewrite(body, func):
+    # `body` with `func` applied to every expression in it, nested statements included
+    return [rewrite_statement(stmt, func) for stmt in body]
+
+
+def rewrite_statement(stmt, func):
+    kind = stmt[0]
+    if kind == 'declaration':
+        return stmt[:3] + (func(stmt[3]) if stmt[3] else None,)
+    if kind in ('expression', 'return'):
+        return (kind, func(stmt[1]) if stmt[1] else None)
+    if kind == 'print':
+        return (kind, [func(item) for item in stmt[1]])
+    if kind == 'if':
+        _, condition, body, else_body = stmt
+        return (kind, func(condition), rewrite(body, func),
+                rewrite(else_body, func) if else_body is not None else None)
+    if kind == 'while':
+        return (kind, func(stmt[1]), rewrite(stmt[2], func))
+    if kind == 'for':
+        _, init, condition, updates, body = stmt
+        return (kind, rewrite(init, func), func(condition) if condition else None,
+                [func(update) for update in updates], rewrite(body, func))
+    return stmt
+
+
+class LoopOptimizer:
+    # Rewrites the loops in a function body before code generation, inner
+    # loops first:
+    #
+    # - invariant subexpressions are computed once into temporaries before
+    #   the loop (for loops: after their init statements);
+    # - a basic induction variable is one assigned only by `i = i + c` at
+    #   the top level of the loop. A product `i * x` with x invariant becomes
+    #   a temporary stepped by c * x right after i is, so the multiply
+    #   leaves the loop. Products by constants lea or a shift handle are
+    #   left alone. Floats are never strength-reduced: repeated addition
+    #   rounds differently from multiplication.
+    #
+    # Temporaries are declared as locals with names no source variable can
+    # have; hoisted ones are 'auto', typed by the code generator from their
+    # initialiser. Any name in `float_names` may be a float.
+    #
+    # A call may assign any global, so in a loop that makes one the
+    # globals in `global_names` are never invariant. Blocks that run once,
+    # like inlined calls, are not loops; only the loops inside them are
+    # rewritten.
+
+    def __init__(self, stats=None, global_names=(), float_names=(), cancel=None):
+        self.stats = Counter() if stats is None else stats
+        self.cancel = cancel or NEVER_CANCELLED
+        self.global_names = set(global_names)
+        self.float_names = set(float_names)
+        self.temp_count = 0
+
+    def temp(self, prefix):
+        self.temp_count += 1
+        return f".{prefix}{self.temp_count}"
+
+    def optimize(self, body):
+        new_body = []
+        for stmt in body:
+            self.cancel.check()
+            if stmt[0] in ('while', 'for'):
+                new_body += self.loop(stmt)
+            elif stmt[0] == 'if':
+                _, condition, then_body, else_body = stmt
+                new_body.append(('if', condition, self.optimize(then_body),
+                                 self.optimize(else_body) if else_body is not None else None))
+            else:
+                new_body.append(stmt)
+        return new_body
+
+    def loop(self, stmt):
+        # The statements replacing one loop
+        if stmt[0] == 'while':
+            _, condition, body = stmt
+            init, updates = [], []
+        else:
+            _, init, condition, updates, body = stmt
+        body = self.optimize(body)
+        if condition is None and runs_once(body):
+            return [('for', init, condition, updates, body)]
+        # The init statements run once, before the loop
+        counts = assignments([condition, updates, body])
+        if any(item[0] == 'call' for item in walk([condition, updates, body])):
+            counts.update(self.global_names)
+        prelude = []
+
+        # An inner loop's invariants that are invariant here too move out whole
+        kept = []
+        for inner in body:
+            if (inner[0] == 'declaration' and inner[2].startswith(('.inv', '.step'))
+                    and invariant(inner[3], counts)):
+                prelude.append(inner)
+                del counts[inner[2]]
+            else:
+                kept.append(inner)
+        body = kept
+
+        hoisted = {}
+        def hoist(expr):
+            return self.hoist(expr, counts, hoisted)
+        condition = hoist(condition) if condition else None
+        updates = [hoist(update) for update in updates]
+        body = rewrite(body, hoist)
+        prelude += [('declaration', 'auto', name, expr) for expr, name in hoisted.items()]
+        self.stats['loop-invariant'] += len(hoisted)
+
+        condition, updates, body = self.reduce(counts, condition, updates, body, prelude)
+        if stmt[0] == 'while':
+            return prelude + [('while', condition, body)]
+        return [('for', init + prelude, condition, updates, body)]
+
+    def hoist(self, expr, variant, hoisted):
+        # `expr` with its largest invariant subexpressions replaced by
+        # temporaries; `hoisted` maps each to its temporary
+        kind = expr[0]
+        if kind in ('binary_op', 'unary_op') and invariant(expr, variant):
+            if not any(node[0] == 'variable' for node in walk(expr)):
+                # Constant; the code generator folds what it can
+                return expr
+            if expr not in hoisted:
+                hoisted[expr] = self.temp('inv')
+            return ('variable', hoisted[expr])
+        if kind == 'binary_op':
+            return (kind, expr[1], self.hoist(expr[2], variant, hoisted), self.hoist(expr[3], variant, hoisted))
+        if kind == 'unary_op':
+            return (kind, expr[1], self.hoist(expr[2], variant, hoisted))
+        if kind == 'assignment':
+            return (kind, expr[1], self.hoist(expr[2], variant, hoisted))
+        if kind == 'call':
+            return (kind, expr[1], [self.hoist(arg, variant, hoisted) for arg in expr[2]])
+        return expr
+
+    def reduce(self, counts, condition, updates, body, prelude):
+        # Strength reduction of products of basic induction variables
+        steps = {}
+        for expr in updates + [stmt[1] for stmt in body if stmt[0] == 'expression']:
+            name, step = induction_step(expr)
+            if name is not None and counts[name] == 1 and name not in self.float_names:
+                steps[name] = step
+        if not steps:
+            return condition, updates, body
+
+        derived = {}
+        def replace(expr):
+            kind = expr[0]
+            if kind == 'binary_op' and expr[1] == '*':
+                for variable, factor in ((expr[2], expr[3]), (expr[3], expr[2])):
+                    if (variable[0] == 'variable' and variable[1] in steps
+                            and invariant(factor, counts) and not cheap_multiplier(factor)
+                            and not may_be_float(factor, self.float_names)):
+                        key = (variable[1], factor)
+                        if key not in derived:
+                            derived[key] = self.temp('iv')
+                        return ('variable', derived[key])
+            if kind == 'binary_op':
+                return (kind, expr[1], replace(expr[2]), replace(expr[3]))
+            if kind in ('unary_op', 'assignment'):
+                return (kind, expr[1], replace(expr[2]))
+            if kind == 'call':
+                return (kind, expr[1], [replace(arg) for arg in expr[2]])
+            return expr
+        condition = replace(condition) if condition else None
+        updates = [replace(update) for update in updates]
+        body = rewrite(body, replace)
+        if not derived:
+            return condition, updates, body
+        self.stats['strength-reduced'] += len(derived)
+
+        # Each derived variable starts at i * x and steps when i does
+        followers = {}
+        for (name, factor), temp in derived.items():
+            prelude.append(('declaration', 'int', temp, ('binary_op', '*', ('variable', name), factor)))
+            step = self.step(steps[name], factor, prelude)
+            target = ('variable', temp)
+            followers.setdefault(name, []).append(('assignment', target, ('binary_op', '+', target, step)))
+
+        new_updates = []
+        for update in updates:
+            new_updates.append(update)
+            new_updates += followers.get(induction_step(update)[0], [])
+        new_body = []
+        for stmt in body:
+            new_body.append(stmt)
+            if stmt[0] == 'expression':
+                new_body += [('expression', expr) for expr in followers.get(induction_step(stmt[1])[0], [])]
+        return condition, new_updates, new_body
+
+    def step(self, c, factor, prelude):
+        # c * factor, as a constant or an invariant variable
+        value = constant_value(factor)
+        if value is not None:
+            return literal(to_signed(c * value))
+        if c == 1:
+            return factor
+        temp = self.temp('step')
+        prelude.append(('declaration', 'int', temp, ('binary_op', '*', literal(c), factor)))
+        return ('variable', temp)
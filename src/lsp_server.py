@@ -0,0 +1,558 @@
+import argparse
+import asyncio
+import bisect
+import hashlib
+import json
+import os
+import re
+import sys
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, urlparse
+
+from cancel import CancellationToken
+from compile_client import ProtocolError, read_exact
+from pipeline import CompilerPipeline
+from project import HeaderCache, file_hash
+
+# JSON-RPC and LSP error codes
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+SERVER_NOT_INITIALIZED = -32002
+REQUEST_CANCELLED = -32800
+
+SEVERITIES = {'error': 1, 'warning': 2}
+QUOTED_NAME = re.compile(r"'([A-Za-z_]\w*)'")
+
+
+def content_length(line, length):
+    # Content-Length from one header line, else `length` unchanged
+    name, _, value = line.decode('ascii', 'replace').partition(':')
+    return int(value) if name.strip().lower() == 'content-length' else length
+
+
+def read_message(stream):
+    # Content-Length framed JSON from a blocking stream, for clients;
+    # returns None at the end of input
+    length = None
+    while True:
+        line = stream.readline()
+        if not line:
+            return None
+        if not line.strip():
+            break
+        length = content_length(line, length)
+    if length is None:
+        raise ProtocolError("Message without a Content-Length header")
+    body = read_exact(stream, length)
+    if len(body) < length:
+        return None
+    return json.loads(body)
+
+
+async def receive_message(reader):
+    # read_message() for an asyncio StreamReader
+    length = None
+    while True:
+        line = await reader.readline()
+        if not line:
+            return None
+        if not line.strip():
+            break
+        length = content_length(line, length)
+    if length is None:
+        raise ProtocolError("Message without a Content-Length header")
+    try:
+        return json.loads(await reader.readexactly(length))
+    except asyncio.IncompleteReadError:
+        return None
+
+
+def write_message(stream, message):
+    body = json.dumps(message, separators=(',', ':')).encode('utf-8')
+    stream.write(f"Content-Length: {len(body)}\r\n\r\n".encode('ascii') + body)
+    stream.flush()
+
+
+def utf16_to_index(text, units):
+    # LSP counts characters in UTF-16 code units
+    if text.isascii():
+        return min(units, len(text))
+    count = 0
+    for index, char in enumerate(text):
+        if count >= units:
+            return index
+        count += 2 if ord(char) > 0xFFFF else 1
+    return len(text)
+
+
+def index_to_utf16(text, index):
+    prefix = text[:index]
+    return len(prefix) if prefix.isascii() else len(prefix.encode('utf-16-le')) // 2
+
+
+def uri_to_path(uri):
+    parsed = urlparse(uri)
+    return unquote(parsed.path) if parsed.scheme == 'file' else None
+
+
+class Document:
+    # The text of an open file as a list of lines, so a range edit only
+    # rebuilds the lines it touches
+
+    def __init__(self, uri, text, version):
+        self.uri = uri
+        self.path = uri_to_path(uri)
+        self.version = version
+        self.lines = text.split("\n")
+        self.analysis = None
+
+    def text(self):
+        return "\n".join(self.lines)
+
+    def offset(self, position):
+        # (line, index in that line) of an LSP position, clamped to the text
+        line = position['line']
+        if line >= len(self.lines):
+            return len(self.lines) - 1, len(self.lines[-1])
+        return line, utf16_to_index(self.lines[line], position['character'])
+
+    def apply_change(self, change):
+        if 'range' not in change:
+            self.lines = change['text'].split("\n")
+            return
+        start_line, start = self.offset(change['range']['start'])
+        end_line, end = self.offset(change['range']['end'])
+        text = self.lines[start_line][:start] + change['text'] + self.lines[end_line][end:]
+        self.lines[start_line:end_line + 1] = text.split("\n")
+
+
+class SymbolIndex:
+    # Where names are declared: a type followed by an identifier. The symbol
+    # table records no positions and drops local scopes once analysis is
+    # done, so positions come from the tokens; hover adds what the table
+    # says about the name.
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.positions = [(token['line'], token['col']) for token in tokens]
+        # name -> token indices of its declarations
+        self.declarations = {}
+        # (first, last token index, name) of each function, parameters included
+        self.functions = []
+        function = None
+        depth = 0
+        for i, token in enumerate(tokens):
+            kind, value = token['type'], token['value']
+            if kind == 'DELIMITER':
+                if value == '{':
+                    depth += 1
+                elif value == '}':
+                    depth -= 1
+                    if depth == 0 and function is not None:
+                        self.functions.append((function, i, tokens[function]['value']))
+                        function = None
+                elif value == ';' and depth == 0:
+                    # A prototype
+                    function = None
+            elif kind == 'TYPE' and i + 1 < len(tokens) and tokens[i + 1]['type'] == 'IDENTIFIER':
+                if depth == 0 and i + 2 < len(tokens) and tokens[i + 2]['value'] == '(':
+                    function = i + 1
+                self.declarations.setdefault(tokens[i + 1]['value'], []).append(i + 1)
+        self.starts = [first for first, _, _ in self.functions]
+
+    def token_at(self, line, col):
+        # Index of the token covering the 1-based line and column, or None
+        i = bisect.bisect_right(self.positions, (line, col)) - 1
+        if i >= 0:
+            token = self.tokens[i]
+            if token['line'] == line and col <= token['col'] + len(token['value']):
+                return i
+        return None
+
+    def function_of(self, i):
+        # Name of the function token `i` is in, None at file scope
+        f = bisect.bisect_right(self.starts, i) - 1
+        if f >= 0:
+            first, last, name = self.functions[f]
+            if first < i <= last:
+                return name
+        return None
+
+    def definition(self, i):
+        # The declaration a use refers to: the latest one before it in the
+        # same function, else the first at file scope
+        name = self.tokens[i]['value']
+        candidates = self.declarations.get(name, [])
+        function = self.function_of(i)
+        if function is not None:
+            local = [d for d in candidates if d <= i and self.function_of(d) == function]
+            if local:
+                return local[-1]
+        for d in candidates:
+            if self.function_of(d) is None:
+                return d
+        return None
+
+    def signature(self, d):
+        # Declaration text: "int x", or "int f(int a, int b)" for a function
+        tokens = self.tokens
+        text = f"{tokens[d - 1]['value']} {tokens[d]['value']}"
+        if d + 1 < len(tokens) and tokens[d + 1]['value'] == '(':
+            params = []
+            j = d + 2
+            while j < len(tokens) and tokens[j]['value'] != ')':
+                params.append(tokens[j]['value'])
+                j += 1
+            text += "(" + " ".join(params).replace(" ,", ",") + ")"
+        return text
+
+
+class Analysis:
+    # One compile of one document version
+
+    def __init__(self, version, lines, result):
+        self.version = version
+        self.lines = lines
+        self.result = result
+        self.index = SymbolIndex(result.tokens)
+
+    def range(self, line, start, end):
+        # LSP range on one 1-based line, from Python string indices
+        text = self.lines[line - 1] if 0 < line <= len(self.lines) else ""
+        return {'start': {'line': line - 1, 'character': index_to_utf16(text, start)},
+                'end': {'line': line - 1, 'character': index_to_utf16(text, end)}}
+
+    def token_range(self, i):
+        token = self.index.tokens[i]
+        return self.range(token['line'], token['col'], token['col'] + len(token['value']))
+
+    def diagnostics(self, path):
+        found = []
+        for entry in self.result.diagnostics:
+            if entry['file'] not in (None, path):
+                continue
+            line, column = entry['line'], entry['column']
+            if line is None:
+                # Semantic errors carry no location; point at the
+                # declaration of the name they quote, if any
+                name = QUOTED_NAME.search(entry['message'])
+                declarations = self.index.declarations.get(name.group(1), []) if name else []
+                where = self.token_range(declarations[0]) if declarations else self.range(1, 0, 0)
+            elif column is None:
+                text = self.lines[line - 1] if 0 < line <= len(self.lines) else ""
+                where = self.range(line, 0, len(text))
+            else:
+                i = self.index.token_at(line, column)
+                where = self.token_range(i) if i is not None else self.range(line, column, column + 1)
+            found.append({'range': where, 'severity': SEVERITIES.get(entry['severity'], 1),
+                          'source': 'mini-cpp', 'message': entry['message']})
+        return found
+
+    def name_at(self, position):
+        # Index of the identifier at an LSP position
+        line = position['line']
+        text = self.lines[line] if line < len(self.lines) else ""
+        i = self.index.token_at(line + 1, utf16_to_index(text, position['character']))
+        if i is not None and self.index.tokens[i]['type'] == 'IDENTIFIER':
+            return i
+        return None
+
+
+class LanguageServer:
+    # Language Server Protocol over stdio. Each open document is kept in
+    # memory and edited in place by didChange; a change cancels the
+    # analysis in flight for that document (the asyncio task and, through
+    # its CancellationToken, the compile on the worker thread) and starts
+    # a new one after a short debounce. Diagnostics come from the lexer,
+    # preprocessor, parser and semantic analysis; code is not generated.
+    # Requests run as tasks and can be cancelled with $/cancelRequest.
+    # Saving or changing a quoted header analyses the open documents that
+    # include it again.
+
+    # Seconds of quiet after a change before it is analysed
+    DELAY = 0.05
+    # Analyses kept by source hash and path, e.g. for an undo; each is
+    # only reused while the headers it included are unchanged
+    CACHE_SIZE = 16
+
+    def __init__(self, reader, writer, delay=None, budget=None):
+        self.reader = reader
+        self.writer = writer
+        self.delay = self.DELAY if delay is None else delay
+        self.budget = budget
+        self.pipeline = CompilerPipeline(optimize=False, headers=HeaderCache())
+        # Compiles run one at a time, off the event loop
+        self.executor = ThreadPoolExecutor(1)
+        self.documents = {}
+        # uri -> (task, token) of its analysis in flight
+        self.analyses = {}
+        # request id -> task
+        self.requests = {}
+        self.cache = OrderedDict()
+        self.initialized = False
+        self.shutting_down = False
+        self.loop = None
+
+    def run(self):
+        return asyncio.run(self.serve())
+
+    async def serve(self):
+        # Returns the process exit code
+        self.loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+        await self.loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), self.reader)
+        while True:
+            try:
+                message = await receive_message(reader)
+            except (ProtocolError, ValueError) as e:
+                print(f"lsp: {e}", file=sys.stderr)
+                message = None
+            if message is None or message.get('method') == 'exit':
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                return 0 if self.shutting_down else 1
+            self.dispatch(message)
+
+    def send(self, message):
+        message['jsonrpc'] = "2.0"
+        write_message(self.writer, message)
+
+    def notify(self, method, params):
+        self.send({'method': method, 'params': params})
+
+    def dispatch(self, message):
+        method = message.get('method')
+        params = message.get('params') or {}
+        if 'id' not in message:
+            # Notifications are handled in order, before anything after them
+            handler = self.NOTIFICATIONS.get(method)
+            if handler is not None and (self.initialized or method == 'initialized'):
+                handler(self, params)
+            return
+        request_id = message['id']
+        handler = self.REQUESTS.get(method)
+        if handler is None:
+            self.send({'id': request_id, 'error': {'code': METHOD_NOT_FOUND, 'message': f"Unknown method {method}"}})
+        elif not self.initialized and method != 'initialize':
+            self.send({'id': request_id, 'error': {'code': SERVER_NOT_INITIALIZED,
+                                                   'message': "Server not initialized"}})
+        else:
+            task = asyncio.ensure_future(self.respond(request_id, handler, params))
+            task.add_done_callback(lambda task: self.request_done(request_id, task))
+            self.requests[request_id] = task
+
+    async def respond(self, request_id, handler, params):
+        try:
+            response = {'id': request_id, 'result': await handler(self, params)}
+        except (KeyError, TypeError) as e:
+            response = {'id': request_id, 'error': {'code': INVALID_PARAMS, 'message': f"Invalid params: {e!r}"}}
+        except Exception as e:
+            response = {'id': request_id, 'error': {'code': INTERNAL_ERROR, 'message': repr(e)}}
+        self.send(response)
+
+    def request_done(self, request_id, task):
+        # A request may be cancelled before it ever ran, so this, not
+        # respond(), answers cancelled requests
+        self.requests.pop(request_id, None)
+        if task.cancelled():
+            self.send({'id': request_id, 'error': {'code': REQUEST_CANCELLED, 'message': "Request cancelled"}})
+
+    # Requests
+
+    async def initialize(self, params):
+        self.initialized = True
+        return {
+            'capabilities': {
+                'positionEncoding': 'utf-16',
+                # Incremental: didChange carries range edits
+                'textDocumentSync': {'openClose': True, 'change': 2, 'save': True},
+                'hoverProvider': True,
+                'definitionProvider': True,
+            },
+            'serverInfo': {'name': "mini-cpp-lsp"},
+        }
+
+    async def shutdown(self, params):
+        self.shutting_down = True
+        for uri in list(self.analyses):
+            self.cancel_analysis(uri)
+        return None
+
+    async def hover(self, params):
+        document = self.documents[params['textDocument']['uri']]
+        analysis = await self.current_analysis(document)
+        i = analysis.name_at(params['position'])
+        if i is None:
+            return None
+        index = analysis.index
+        d = index.definition(i)
+        if d is None:
+            return None
+        name = index.tokens[d]['value']
+        function = index.function_of(d)
+        details = [f"```cpp\n{index.signature(d)}\n```"]
+        entry = analysis.result.symbol_table.lookup(name)
+        if entry is not None and entry['type'] == 'function':
+            details.append(f"function returning `{entry['value']}`")
+        elif function is not None:
+            details.append(f"local to `{function}`")
+        else:
+            details.append("global")
+        return {'contents': {'kind': 'markdown', 'value': "\n\n".join(details)},
+                'range': analysis.token_range(i)}
+
+    async def definition(self, params):
+        document = self.documents[params['textDocument']['uri']]
+        analysis = await self.current_analysis(document)
+        i = analysis.name_at(params['position'])
+        d = analysis.index.definition(i) if i is not None else None
+        if d is None:
+            return None
+        return {'uri': document.uri, 'range': analysis.token_range(d)}
+
+    REQUESTS = {
+        'initialize': initialize,
+        'shutdown': shutdown,
+        'textDocument/hover': hover,
+        'textDocument/definition': definition,
+    }
+
+    # Notifications
+
+    def initialized_notification(self, params):
+        pass
+
+    def did_open(self, params):
+        item = params['textDocument']
+        document = Document(item['uri'], item['text'], item.get('version', 0))
+        self.documents[document.uri] = document
+        self.schedule_analysis(document, 0)
+
+    def did_change(self, params):
+        document = self.documents.get(params['textDocument']['uri'])
+        if document is None:
+            return
+        for change in params['contentChanges']:
+            document.apply_change(change)
+        document.version = params['textDocument'].get('version', document.version + 1)
+        self.schedule_analysis(document, self.delay)
+
+    def did_close(self, params):
+        uri = params['textDocument']['uri']
+        self.cancel_analysis(uri)
+        if self.documents.pop(uri, None) is not None:
+            self.notify('textDocument/publishDiagnostics', {'uri': uri, 'diagnostics': []})
+
+    def did_save(self, params):
+        self.file_changed(uri_to_path(params['textDocument']['uri']))
+
+    def did_change_watched_files(self, params):
+        for change in params.get('changes', []):
+            self.file_changed(uri_to_path(change['uri']))
+
+    def file_changed(self, path):
+        # Open documents that included the file are analysed again
+        path = os.path.normpath(path)
+        for document in self.documents.values():
+            analysis = document.analysis
+            if analysis is not None and any(os.path.normpath(header) == path
+                                            for _, header in analysis.result.includes):
+                self.schedule_analysis(document, self.delay)
+
+    def cancel_request(self, params):
+        task = self.requests.get(params.get('id'))
+        if task is not None:
+            task.cancel()
+
+    NOTIFICATIONS = {
+        'initialized': initialized_notification,
+        'textDocument/didOpen': did_open,
+        'textDocument/didChange': did_change,
+        'textDocument/didClose': did_close,
+        'textDocument/didSave': did_save,
+        'workspace/didChangeWatchedFiles': did_change_watched_files,
+        '$/cancelRequest': cancel_request,
+    }
+
+    # Analysis
+
+    def cancel_analysis(self, uri):
+        task, token = self.analyses.pop(uri, (None, None))
+        if task is not None:
+            task.cancel()
+            token.cancel("superseded by a newer edit")
+
+    def schedule_analysis(self, document, delay):
+        self.cancel_analysis(document.uri)
+        token = CancellationToken(self.budget)
+        task = asyncio.ensure_future(self.analyze(document, delay, token))
+        self.analyses[document.uri] = (task, token)
+        return task
+
+    async def analyze(self, document, delay, token):
+        if delay:
+            await asyncio.sleep(delay)
+        version, lines = document.version, list(document.lines)
+        source = "\n".join(lines)
+        # The path is part of the key: diagnostics are filed under it, and
+        # quoted #includes resolve relative to it
+        key = (hashlib.sha256(source.encode('utf-8', 'surrogatepass')).digest(), document.path)
+        result, headers = self.cache.get(key, (None, ()))
+        if result is None or any(file_hash(header) != digest for header, digest in headers):
+            try:
+                result, headers = await self.loop.run_in_executor(self.executor, self.compile, source,
+                                                                  document.path, token)
+            except asyncio.CancelledError:
+                token.cancel("superseded by a newer edit")
+                raise
+            # An analysis that ran out of time is reported but not kept
+            if not result.aborted:
+                self.cache[key] = (result, headers)
+                if len(self.cache) > self.CACHE_SIZE:
+                    self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(key)
+        analysis = Analysis(version, lines, result)
+        document.analysis = analysis
+        if self.analyses.get(document.uri, (None,))[0] is asyncio.current_task():
+            del self.analyses[document.uri]
+        self.notify('textDocument/publishDiagnostics', {'uri': document.uri, 'version': version,
+                                                        'diagnostics': analysis.diagnostics(document.path)})
+
+    def compile(self, source, path, token):
+        # On the worker thread; stops after semantic analysis. Returns the
+        # result and the (path, content hash) of each header it included.
+        result = self.pipeline.compile_source(source, path, cancel=token, last_phase='semantic')
+        headers = {header for _, header in result.includes}
+        return result, tuple((header, file_hash(header)) for header in sorted(headers))
+
+    async def current_analysis(self, document):
+        # Waits for the analysis of the document as it is now, starting it
+        # at once if only the debounce is holding it back
+        while document.analysis is None or document.analysis.version != document.version:
+            task, _ = self.analyses.get(document.uri, (None, None))
+            if task is None or task.done():
+                task = self.schedule_analysis(document, 0)
+            try:
+                await asyncio.shield(task)
+            except asyncio.CancelledError:
+                # Superseded by a newer change: wait for that one instead
+                if not task.cancelled():
+                    raise
+        return document.analysis
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Mini C++ language server (LSP over stdio)")
+    arg_parser.add_argument('--delay', type=float, default=LanguageServer.DELAY,
+                            help="seconds to wait after an edit before analysing it")
+    arg_parser.add_argument('--timeout', type=float, default=30.0,
+                            help="abort analyses that take longer than this many seconds")
+    args = arg_parser.parse_args(argv)
+    server = LanguageServer(sys.stdin.buffer, sys.stdout.buffer, args.delay, args.timeout)
+    return server.run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+
+class ToolchainError(Exception):
+    pass
+
+
+def default_cache_dir():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'mini_cpp_compiler', 'native')
+
+
+class NativeResult:
+    def __init__(self):
+        self.stdout = ""
+        self.stderr = ""
+        self.exit_code = None
+        self.timed_out = False
+        self.cached = False
+        # Seconds spent per stage; zero for stages served from the cache
+        self.timings = {'assemble': 0.0, 'link': 0.0, 'execute': 0.0}
+
+    def format_timings(self):
+        parts = [f"{stage} {seconds * 1000:.1f} ms" for stage, seconds in self.timings.items()]
+        if self.cached:
+            parts.append("(cached build)")
+        return ", ".join(parts)
+
+
+class NativeRunner:
+    def __init__(self, cache_dir=None, assembler='as', linker='gcc', timeout=10.0,
+                 build_timeout=60.0):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.assembler = assembler
+        self.linker = linker
+        self.timeout = timeout
+        self.build_timeout = build_timeout
+
+    def cache_key(self, assembly):
+        # The toolchain is part of the key so switching tools rebuilds
+        digest = hashlib.sha256()
+        digest.update(f"{self.assembler}\0{self.linker}\0".encode())
+        digest.update(assembly.encode())
+        return digest.hexdigest()
+
+    def build(self, assembly, result=None):
+        # Returns the path of an executable for the assembly, reusing cached
+        # object files and executables where possible.
+        result = result or NativeResult()
+        for tool in (self.assembler, self.linker):
+            if shutil.which(tool) is None:
+                raise ToolchainError(f"'{tool}' not found on PATH")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        key = self.cache_key(assembly)
+        object_path = os.path.join(self.cache_dir, key + '.o')
+        exe_path = os.path.join(self.cache_dir, key)
+
+        if os.path.exists(exe_path):
+            result.cached = True
+            return exe_path
+
+        if not os.path.exists(object_path):
+            with tempfile.TemporaryDirectory(dir=self.cache_dir) as workdir:
+                source_path = os.path.join(workdir, 'program.s')
+                with open(source_path, 'w') as f:
+                    f.write(assembly)
+                    f.write("\n")
+                temp_object = os.path.join(workdir, 'program.o')
+                result.timings['assemble'] = self.invoke(
+                    [self.assembler, '-o', temp_object, source_path], 'Assembler')
+                # Rename into place so concurrent builds never see a partial file
+                os.replace(temp_object, object_path)
+
+        with tempfile.TemporaryDirectory(dir=self.cache_dir) as workdir:
+            temp_exe = os.path.join(workdir, 'program')
+            result.timings['link'] = self.invoke(
+                [self.linker, '-o', temp_exe, object_path], 'Linker')
+            os.replace(temp_exe, exe_path)
+        return exe_path
+
+    def invoke(self, command, stage):
+        start = time.perf_counter()
+        try:
+            completed = subprocess.run(command, capture_output=True, text=True,
+                                       timeout=self.build_timeout)
+        except subprocess.TimeoutExpired:
+            raise ToolchainError(f"{stage} timed out after {self.build_timeout:g}s")
+        elapsed = time.perf_counter() - start
+        if completed.returncode != 0:
+            raise ToolchainError(f"{stage} failed:\n{completed.stderr.strip()}")
+        return elapsed
+
+    def run(self, assembly, stdin=None, timeout=None):
+        result = NativeResult()
+        exe_path = self.build(assembly, result)
+        timeout = self.timeout if timeout is None else timeout
+
+        start = time.perf_counter()
+        try:
+            completed = subprocess.run([exe_path], input=stdin, capture_output=True,
+                                       text=True, timeout=timeout)
+        except subprocess.TimeoutExpired as e:
+            result.timed_out = True
+            result.stdout = e.stdout.decode(errors='replace') if isinstance(e.stdout, bytes) else (e.stdout or "")
+        else:
+            result.stdout = completed.stdout
+            result.stderr = completed.stderr
+            result.exit_code = completed.returncode
+        result.timings['execute'] = time.perf_counter() - start
+        return result
+
+    def clear_cache(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    from lexer import LexicalAnalyzer
+    from parser import SyntaxParser
+    from semantic import SemanticAnalyzer
+    from code_gen import CodeGenerator
+    from symbol_table import SymbolTable
+
+    if len(sys.argv) != 2:
+        print("usage: python native.py <source.cpp>", file=sys.stderr)
+        sys.exit(2)
+
+    with open(sys.argv[1]) as f:
+        source = f.read()
+    symbol_table = SymbolTable()
+    lexer = LexicalAnalyzer(symbol_table)
+    parser = SyntaxParser(symbol_table)
+    semantic = SemanticAnalyzer(symbol_table)
+    tokens = lexer.tokenize(source)
+    ast = parser.parse(tokens)
+    if ast is not None:
+        semantic.analyze(ast)
+    errors = lexer.errors + parser.errors + semantic.errors
+    if errors or ast is None:
+        print("\n".join(errors) or "Syntax errors detected!", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        result = NativeRunner().run(CodeGenerator(symbol_table).generate(ast))
+    except ToolchainError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    sys.stdout.write(result.stdout)
+    sys.stderr.write(result.stderr)
+    if result.timed_out:
+        print("Program timed out", file=sys.stderr)
+    print(f"[exit code {result.exit_code}; {result.format_timings()}]", file=sys.stderr)
+    sys.exit(result.exit_code if result.exit_code is not None else 124)
@@ -1,25 +1,49 @@
+from cancel import NEVER_CANCELLED
+
+ONE = ('literal', 'int', '1')
+
+
+def increment(target, op):
+    # ++x and --x: x = x + 1, x = x - 1
+    return ('assignment', target, ('binary_op', op, target, ONE))
+
+
+def discard_value(expr):
+    # An expression whose value is unused. x++ is parsed as (x = x + 1) - 1
+    # for its old value, which a statement does not need.
+    if (expr and expr[0] == 'binary_op' and expr[1] in ('+', '-') and expr[2][0] == 'assignment'
+            and expr[3] == ONE):
+        return expr[2]
+    return expr
+
+
 class SyntaxParser:
-    def __init__(self, symbol_table):
+    def __init__(self, symbol_table, cancel=None):
         self.symbol_table = symbol_table
+        self.cancel = cancel or NEVER_CANCELLED
         self.errors = []
         self.ast = []
         self.current_token_index = 0
+        # Loops around the statement being parsed, for break and continue
+        self.loop_depth = 0
         
     def parse(self, tokens):
         self.tokens = tokens
         self.current_token_index = 0
         self.errors = []
         self.ast = []
+        self.loop_depth = 0
         
         try:
             while not self.is_at_end():
+                self.cancel.check()
                 if self.match('TYPE'):
                     if self.check('IDENTIFIER') and self.lookahead(1, 'DELIMITER', '('):
-                        self.parse_function()
+                        self.ast.append(self.parse_function())
                     else:
-                        self.parse_declaration()
+                        self.add_statement(self.ast, self.parse_declaration())
                 elif self.match('KEYWORD'):
-                    self.parse_statement()
+                    self.add_statement(self.ast, self.parse_statement())
                 elif self.match('PREPROCESSOR'):
                     self.advance()  # Skip preprocessor directives
                 elif self.match('DELIMITER', '{') or self.match('DELIMITER', '}'):
@@ -31,6 +55,10 @@ class SyntaxParser:
         except ParseError as e:
             self.errors.append(str(e))
             return None
+        except RecursionError:
+            token = self.tokens[min(self.current_token_index, len(self.tokens) - 1)]
+            self.errors.append(f"Syntax error at line {token['line']}, column {token['col']}: nesting too deep")
+            return None
             
     def parse_function(self):
         return_type = self.previous()['value']
@@ -43,28 +71,63 @@ class SyntaxParser:
         self.consume('DELIMITER', '(')
         params = []
         while not self.check('DELIMITER', ')'):
-            if self.match('TYPE'):
-                param_type = self.previous()['value']
-                param_name = self.advance()['value'] if self.match('IDENTIFIER') else None
-                params.append((param_type, param_name))
-                if self.match('DELIMITER', ','):
-                    continue
+            # Anything but a type here used to spin forever without advancing
+            if not self.match('TYPE'):
+                self.error("Expected parameter type")
+            param_type = self.previous()['value']
+            param_name = self.previous()['value'] if self.match('IDENTIFIER') else None
+            params.append((param_type, param_name))
+            if not self.match('DELIMITER', ','):
+                break
         self.consume('DELIMITER', ')')
         
         # Parse function body
         self.consume('DELIMITER', '{')
+        body = self.parse_block()
+        
+        return ('function', return_type, func_name, params, body)
+        
+    def parse_block(self):
+        # Statements up to the closing brace; the opening brace is already consumed
         body = []
         while not self.check('DELIMITER', '}'):
-            if self.match('TYPE'):
-                self.parse_declaration()
-            elif self.match('KEYWORD'):
-                self.parse_statement()
-            else:
-                self.advance()
+            self.cancel.check()
+            if self.is_at_end():
+                self.error("Expected '}'")
+            self.add_statement(body, self.parse_block_statement())
         self.consume('DELIMITER', '}')
+        return body
+        
+    def parse_block_statement(self):
+        if self.match('TYPE'):
+            return self.parse_declaration()
+        elif self.match('KEYWORD'):
+            return self.parse_statement()
+        elif self.check('IDENTIFIER', 'cout') and self.lookahead(1, 'OPERATOR', '<<'):
+            return self.parse_output_statement()
+        elif self.check('IDENTIFIER') or self.check('OPERATOR', '++') or self.check('OPERATOR', '--'):
+            return self.parse_expression_statement()
+        else:
+            self.advance()
+            return None
+            
+    def parse_body(self):
+        # A braced block or a single statement
+        if self.match('DELIMITER', '{'):
+            return self.parse_block()
+        body = []
+        self.add_statement(body, self.parse_block_statement())
+        return body
+        
+    def parse_loop_body(self):
+        self.loop_depth += 1
+        body = self.parse_body()
+        self.loop_depth -= 1
+        return body
         
-        self.ast.append(('function', return_type, func_name, params, body))
-        return True
+    def add_statement(self, body, stmt):
+        if stmt:
+            body.append(stmt)
         
     def parse_declaration(self):
         token = self.previous()
@@ -85,20 +148,49 @@ class SyntaxParser:
         if not self.match('DELIMITER', ';'):
             self.error("Expected ';' after declaration")
         
-        self.ast.append(('declaration', var_type, var_name, expr))
-        return True
+        return ('declaration', var_type, var_name, expr)
         
     def parse_statement(self):
         token = self.previous()
         if token['value'] == 'if':
-            self.parse_if_statement()
+            return self.parse_if_statement()
         elif token['value'] == 'return':
-            self.parse_return_statement()
+            return self.parse_return_statement()
+        elif token['value'] == 'while':
+            return self.parse_while_statement()
+        elif token['value'] == 'for':
+            return self.parse_for_statement()
+        elif token['value'] in ('break', 'continue'):
+            return self.parse_jump_statement(token)
         else:
             # Skip until semicolon for now
             while not self.is_at_end() and not self.match('DELIMITER', ';'):
+                self.cancel.check()
                 self.advance()
+            return None
+            
+    def parse_expression_statement(self):
+        expr = discard_value(self.parse_expression())
+        if not self.match('DELIMITER', ';'):
+            self.error("Expected ';' after expression")
+        return ('expression', expr)
                 
+    def parse_output_statement(self):
+        self.advance()  # cout
+        items = []
+        while self.match('OPERATOR', '<<'):
+            if self.match('STRING'):
+                items.append(('literal', 'string', self.previous()['value']))
+            elif self.match('IDENTIFIER', 'endl'):
+                items.append(('literal', 'string', '"\\n"'))
+            else:
+                items.append(self.parse_expression())
+                
+        if not self.match('DELIMITER', ';'):
+            self.error("Expected ';' after output statement")
+            
+        return ('print', items)
+        
     def parse_return_statement(self):
         expr = None
         if not self.check('DELIMITER', ';'):
@@ -107,7 +199,7 @@ class SyntaxParser:
         if not self.match('DELIMITER', ';'):
             self.error("Expected ';' after return statement")
             
-        self.ast.append(('return', expr))
+        return ('return', expr)
                 
     def parse_if_statement(self):
         self.consume('DELIMITER', '(')
@@ -115,39 +207,59 @@ class SyntaxParser:
         self.consume('DELIMITER', ')')
         
         # Parse if body
-        if self.match('DELIMITER', '{'):
-            body = []
-            while not self.check('DELIMITER', '}'):
-                if self.match('TYPE'):
-                    self.parse_declaration()
-                elif self.match('KEYWORD'):
-                    self.parse_statement()
-                else:
-                    self.advance()
-            self.consume('DELIMITER', '}')
-        else:
-            self.parse_statement()
+        body = self.parse_body()
             
         # Parse else if present
         else_body = None
         if self.match('KEYWORD', 'else'):
-            if self.match('DELIMITER', '{'):
-                else_body = []
-                while not self.check('DELIMITER', '}'):
-                    if self.match('TYPE'):
-                        self.parse_declaration()
-                    elif self.match('KEYWORD'):
-                        self.parse_statement()
-                    else:
-                        self.advance()
-                self.consume('DELIMITER', '}')
-            else:
-                else_body = [self.parse_statement()]
+            else_body = self.parse_body()
                 
-        self.ast.append(('if', condition, body, else_body))
+        return ('if', condition, body, else_body)
+        
+    def parse_while_statement(self):
+        self.consume('DELIMITER', '(')
+        condition = self.parse_expression()
+        self.consume('DELIMITER', ')')
+        return ('while', condition, self.parse_loop_body())
+        
+    def parse_for_statement(self):
+        # ('for', init statements, condition or None, update expressions, body)
+        self.consume('DELIMITER', '(')
+        init = []
+        if self.match('TYPE'):
+            self.add_statement(init, self.parse_declaration())
+        elif not self.match('DELIMITER', ';'):
+            init = [('expression', expr) for expr in self.parse_expression_list()]
+            self.consume('DELIMITER', ';')
+            
+        condition = None
+        if not self.check('DELIMITER', ';'):
+            condition = self.parse_expression()
+        self.consume('DELIMITER', ';')
+        
+        updates = [] if self.check('DELIMITER', ')') else self.parse_expression_list()
+        self.consume('DELIMITER', ')')
+        
+        return ('for', init, condition, updates, self.parse_loop_body())
+        
+    def parse_expression_list(self):
+        # Comma-separated expressions whose values are unused, as in a for header
+        exprs = [discard_value(self.parse_expression())]
+        while self.match('DELIMITER', ','):
+            exprs.append(discard_value(self.parse_expression()))
+        return exprs
+        
+    def parse_jump_statement(self, token):
+        keyword = token['value']
+        if not self.loop_depth:
+            self.error(f"'{keyword}' outside a loop", token)
+        if not self.match('DELIMITER', ';'):
+            self.error(f"Expected ';' after {keyword}")
+        return (keyword,)
         
     def parse_expression(self):
         # Implement proper expression parsing with operator precedence
+        self.cancel.check()
         return self.parse_assignment()
         
     def parse_assignment(self):
@@ -195,7 +307,7 @@ class SyntaxParser:
     def parse_factor(self):
         expr = self.parse_unary()
         
-        while self.match('OPERATOR', '*') or self.match('OPERATOR', '/'):
+        while self.match('OPERATOR', '*') or self.match('OPERATOR', '/') or self.match('OPERATOR', '%'):
             op = self.previous()['value']
             right = self.parse_unary()
             expr = ('binary_op', op, expr, right)
@@ -203,6 +315,13 @@ class SyntaxParser:
         return expr
         
     def parse_unary(self):
+        if self.match('OPERATOR', '++') or self.match('OPERATOR', '--'):
+            op = self.previous()['value']
+            target = self.parse_unary()
+            if not target or target[0] != 'variable':
+                self.error(f"Expected a variable after '{op}'")
+            return increment(target, op[0])
+            
         if self.match('OPERATOR', '!') or self.match('OPERATOR', '-'):
             op = self.previous()['value']
             right = self.parse_unary()
@@ -216,7 +335,14 @@ class SyntaxParser:
         elif self.match('FLOAT'):
             return ('literal', 'float', self.previous()['value'])
         elif self.match('IDENTIFIER'):
-            return ('variable', self.previous()['value'])
+            if self.check('DELIMITER', '('):
+                return self.parse_call(self.previous()['value'])
+            variable = ('variable', self.previous()['value'])
+            if self.match('OPERATOR', '++') or self.match('OPERATOR', '--'):
+                # The old value: (x = x + 1) - 1
+                op = self.previous()['value'][0]
+                return ('binary_op', '-' if op == '+' else '+', increment(variable, op), ONE)
+            return variable
         elif self.match('DELIMITER', '('):
             expr = self.parse_expression()
             self.consume('DELIMITER', ')')
@@ -225,6 +351,16 @@ class SyntaxParser:
             self.error("Expected expression")
             return None
         
+    def parse_call(self, name):
+        self.consume('DELIMITER', '(')
+        args = []
+        if not self.check('DELIMITER', ')'):
+            args.append(self.parse_expression())
+            while self.match('DELIMITER', ','):
+                args.append(self.parse_expression())
+        self.consume('DELIMITER', ')')
+        return ('call', name, args)
+        
     def lookahead(self, offset, token_type, value=None):
         index = self.current_token_index + offset
         if index >= len(self.tokens):
@@ -265,8 +401,10 @@ class SyntaxParser:
     def is_at_end(self):
         return self.current_token_index >= len(self.tokens)
         
-    def error(self, message):
-        token = self.tokens[self.current_token_index] if self.current_token_index < len(self.tokens) else None
+    def error(self, message, token=None):
+        # Reported at `token`, by default the current one
+        if token is None and self.current_token_index < len(self.tokens):
+            token = self.tokens[self.current_token_index]
         line = token['line'] if token else "EOF"
         col = token['col'] if token else 0
         raise ParseError(f"Syntax error at line {line}, column {col}: {message}")
@@ -0,0 +1,348 @@
+import re
+from collections import Counter
+from asm import Instruction, Label
+
+# Sub-registers map onto the 64-bit register they alias
+REGISTER_ALIASES = {}
+for _full, _names in {
+    'rax': ('eax', 'ax', 'al', 'ah'),
+    'rbx': ('ebx', 'bx', 'bl', 'bh'),
+    'rcx': ('ecx', 'cx', 'cl', 'ch'),
+    'rdx': ('edx', 'dx', 'dl', 'dh'),
+    'rsi': ('esi', 'si', 'sil'),
+    'rdi': ('edi', 'di', 'dil'),
+    'rbp': ('ebp', 'bp', 'bpl'),
+    'rsp': ('esp', 'sp', 'spl'),
+}.items():
+    REGISTER_ALIASES[_full] = _full
+    for _name in _names:
+        REGISTER_ALIASES[_name] = _full
+for _n in range(8, 16):
+    for _suffix in ('', 'd', 'w', 'b'):
+        REGISTER_ALIASES[f'r{_n}{_suffix}'] = f'r{_n}'
+for _n in range(16):
+    REGISTER_ALIASES[f'xmm{_n}'] = f'xmm{_n}'
+
+PARTIAL_REGISTERS = {'al', 'ah', 'bl', 'bh', 'cl', 'ch', 'dl', 'dh', 'ax', 'bx', 'cx', 'dx',
+                     'sil', 'dil', 'si', 'di'}
+
+REGISTER_RE = re.compile(r'%(\w+)')
+
+# Operand access modes per opcode: 'r' read, 'w' write, 'rw' read-modify-write,
+# 'a' address computation (registers inside the operand are read).
+# The optional third element lists implicit (reads, writes).
+OPCODE_EFFECTS = {
+    'mov': ('r', 'w'),
+    'movq': ('r', 'w'),
+    'movabs': ('r', 'w'),
+    'movzb': ('r', 'w'),
+    'movzbq': ('r', 'w'),
+    'movsx': ('r', 'w'),
+    'lea': ('a', 'w'),
+    'add': ('r', 'rw'),
+    'sub': ('r', 'rw'),
+    'imul': ('r', 'rw'),
+    'and': ('r', 'rw'),
+    'or': ('r', 'rw'),
+    'xor': ('r', 'rw'),
+    'shl': ('r', 'rw'),
+    'sal': ('r', 'rw'),
+    'sar': ('r', 'rw'),
+    'shr': ('r', 'rw'),
+    'cmp': ('r', 'r'),
+    'test': ('r', 'r'),
+    'neg': ('rw',),
+    'not': ('rw',),
+    'sete': ('w',),
+    'setne': ('w',),
+    'setg': ('w',),
+    'setge': ('w',),
+    'setl': ('w',),
+    'setle': ('w',),
+    'seta': ('w',),
+    'setae': ('w',),
+    'setp': ('w',),
+    'setnp': ('w',),
+    'btc': ('r', 'rw'),
+    # SSE2 scalar doubles; register-to-register moves and conversions keep
+    # the destination's upper half, so they read it too
+    'movsd': ('r', 'rw'),
+    'addsd': ('r', 'rw'),
+    'subsd': ('r', 'rw'),
+    'mulsd': ('r', 'rw'),
+    'divsd': ('r', 'rw'),
+    'xorpd': ('r', 'rw'),
+    'ucomisd': ('r', 'r'),
+    'cvtsi2sdq': ('r', 'rw'),
+    'cvttsd2si': ('r', 'w'),
+    'push': ('r', (('rsp',), ('rsp',))),
+    'pop': ('w', (('rsp',), ('rsp',))),
+    'cqo': ((('rax',), ('rdx',)),),
+    'idiv': ('r', (('rax', 'rdx'), ('rax', 'rdx'))),
+}
+
+JUMPS = {'jmp', 'je', 'jne', 'jg', 'jge', 'jl', 'jle', 'jz', 'jnz', 'ja', 'jae', 'jb', 'jbe', 'jp', 'jnp'}
+INVERTED_JUMPS = {'je': 'jne', 'jne': 'je', 'jg': 'jle', 'jle': 'jg', 'jl': 'jge', 'jge': 'jl',
+                  'jz': 'jnz', 'jnz': 'jz', 'ja': 'jbe', 'jbe': 'ja', 'jae': 'jb', 'jb': 'jae',
+                  'jp': 'jnp', 'jnp': 'jp'}
+
+
+def operand_registers(operand):
+    return {REGISTER_ALIASES.get(name, name) for name in REGISTER_RE.findall(operand)}
+
+
+def is_register(operand):
+    return operand.startswith('%') and operand[1:] in REGISTER_ALIASES
+
+
+def register_name(operand):
+    return REGISTER_ALIASES[operand[1:]]
+
+
+def effects(instr):
+    # Returns (reads, writes) register sets, or None when the instruction is a
+    # barrier the rules must not look across (jumps, calls, unknown opcodes).
+    spec = OPCODE_EFFECTS.get(instr.opcode)
+    if spec is None:
+        return None
+    reads, writes = set(), set()
+    modes = spec
+    if spec and isinstance(spec[-1], tuple):
+        implicit_reads, implicit_writes = spec[-1]
+        reads.update(implicit_reads)
+        writes.update(implicit_writes)
+        modes = spec[:-1]
+    if len(modes) != len(instr.operands):
+        return None
+    for mode, operand in zip(modes, instr.operands):
+        regs = operand_registers(operand)
+        if not is_register(operand):
+            # Memory operands only read their address registers
+            reads.update(regs)
+            continue
+        if 'r' in mode or 'a' in mode:
+            reads.update(regs)
+        if 'w' in mode:
+            writes.update(regs)
+            if operand[1:] in PARTIAL_REGISTERS:
+                reads.update(regs)
+    return reads, writes
+
+
+def touches_stack(instr):
+    return any('rsp' in operand_registers(op) for op in instr.operands) or instr.opcode in ('push', 'pop')
+
+
+# Rules take a window of consecutive lines and return a replacement list,
+# or None when they do not apply.
+
+def rule_push_pop(window):
+    first, second = window
+    if not (isinstance(first, Instruction) and isinstance(second, Instruction)):
+        return None
+    if first.opcode != 'push' or second.opcode != 'pop':
+        return None
+    src, dst = first.operands[0], second.operands[0]
+    if src == dst:
+        return []
+    return [Instruction('mov', src, dst)]
+
+
+def rule_push_x_pop(window):
+    first, middle, last = window
+    if not all(isinstance(line, Instruction) for line in window):
+        return None
+    if first.opcode != 'push' or last.opcode != 'pop':
+        return None
+    src, dst = first.operands[0], last.operands[0]
+    if not (is_register(src) and is_register(dst)):
+        return None
+    middle_effects = effects(middle)
+    if middle_effects is None or touches_stack(middle):
+        return None
+    reads, writes = middle_effects
+    dst_reg = register_name(dst)
+    if dst_reg in reads or dst_reg in writes:
+        return None
+    return [Instruction('mov', src, dst), middle]
+
+
+def rule_self_move(window):
+    instr, = window
+    if isinstance(instr, Instruction) and instr.opcode == 'mov' and len(instr.operands) == 2:
+        if is_register(instr.operands[0]) and instr.operands[0] == instr.operands[1]:
+            return []
+    return None
+
+
+def rule_dead_move(window):
+    first, second = window
+    if not (isinstance(first, Instruction) and isinstance(second, Instruction)):
+        return None
+    if first.opcode != 'mov' or not is_register(first.operands[1]):
+        return None
+    if first.operands[1][1:] in PARTIAL_REGISTERS:
+        return None
+    second_effects = effects(second)
+    if second_effects is None:
+        return None
+    reads, writes = second_effects
+    reg = register_name(first.operands[1])
+    if reg in writes and reg not in reads:
+        return [second]
+    return None
+
+
+def rule_forward_move(window):
+    # mov A, R1; mov R1, R2; <overwrite R1>  ->  mov A, R2; <overwrite R1>
+    first, second, third = window
+    if not all(isinstance(line, Instruction) for line in window):
+        return None
+    if first.opcode != 'mov' or second.opcode != 'mov':
+        return None
+    temp, dst = second.operands
+    if first.operands[1] != temp or not (is_register(temp) and is_register(dst)):
+        return None
+    if temp[1:] in PARTIAL_REGISTERS or dst[1:] in PARTIAL_REGISTERS:
+        return None
+    if register_name(dst) in operand_registers(first.operands[0]):
+        return None
+    third_effects = effects(third)
+    if third_effects is None:
+        return None
+    reads, writes = third_effects
+    temp_reg = register_name(temp)
+    if temp_reg in writes and temp_reg not in reads:
+        return [Instruction('mov', first.operands[0], dst), third]
+    return None
+
+
+def rule_store_load(window):
+    first, second = window
+    if not (isinstance(first, Instruction) and isinstance(second, Instruction)):
+        return None
+    # movsd too: the upper half of an XMM register is never used
+    if first.opcode not in ('mov', 'movsd') or second.opcode != first.opcode:
+        return None
+    if first.operands[0] == second.operands[1] and first.operands[1] == second.operands[0]:
+        if is_register(first.operands[0]) and not is_register(first.operands[1]):
+            return [first]
+    return None
+
+
+def rule_reload(window):
+    # mov M, R1 (or mov R1, M); mov M, R2  ->  the second copies R1 instead
+    # of going back to memory
+    first, second = window
+    if not (isinstance(first, Instruction) and isinstance(second, Instruction)):
+        return None
+    if first.opcode != 'mov' or second.opcode != 'mov':
+        return None
+    memory, dst = second.operands
+    if is_register(memory) or memory.startswith('$') or not is_register(dst):
+        return None
+    if first.operands[0] == memory:
+        src = first.operands[1]
+        # The load must not have overwritten the address
+        if not is_register(src) or register_name(src) in operand_registers(memory):
+            return None
+    elif first.operands[1] == memory:
+        src = first.operands[0]
+        if not is_register(src):
+            return None
+    else:
+        return None
+    if src == dst or src[1:] in PARTIAL_REGISTERS or dst[1:] in PARTIAL_REGISTERS:
+        return None
+    return [first, Instruction('mov', src, dst, comment=second.comment)]
+
+
+def rule_jump_to_next(code, index):
+    # A jump whose target is among the labels immediately following it
+    instr = code[index]
+    if not (isinstance(instr, Instruction) and instr.opcode in JUMPS):
+        return False
+    target = instr.operands[0]
+    end = index + 1
+    while end < len(code) and isinstance(code[end], Label):
+        if code[end].name == target:
+            return True
+        end += 1
+    return False
+
+
+def rule_branch_over_jump(window):
+    # jcc L; jmp M; L:  ->  j!cc M; L:
+    first, second, third = window
+    if not (isinstance(first, Instruction) and isinstance(second, Instruction) and isinstance(third, Label)):
+        return None
+    if first.opcode in INVERTED_JUMPS and second.opcode == 'jmp' and first.operands[0] == third.name:
+        return [Instruction(INVERTED_JUMPS[first.opcode], second.operands[0]), third]
+    return None
+
+
+def rule_unreachable(window):
+    first, second = window
+    if isinstance(first, Instruction) and first.opcode in ('jmp', 'ret'):
+        if isinstance(second, Instruction):
+            return [first]
+    return None
+
+
+class PeepholeOptimizer:
+    # (name, window size, rule); rules are tried in order at every position
+    RULES = [
+        ('self-move', 1, rule_self_move),
+        ('push-pop', 2, rule_push_pop),
+        ('push-x-pop', 3, rule_push_x_pop),
+        ('store-load', 2, rule_store_load),
+        ('reload', 2, rule_reload),
+        ('forward-move', 3, rule_forward_move),
+        ('dead-move', 2, rule_dead_move),
+        ('unreachable', 2, rule_unreachable),
+        ('branch-over-jump', 3, rule_branch_over_jump),
+    ]
+
+    def __init__(self, max_passes=20):
+        self.max_passes = max_passes
+        self.stats = Counter()
+        self.passes = 0
+
+    def optimize(self, code):
+        code = list(code)
+        self.passes = 0
+        changed = True
+        while changed and self.passes < self.max_passes:
+            code, changed = self.run_pass(code)
+            self.passes += 1
+        return code
+
+    def run_pass(self, code):
+        changed = False
+        i = 0
+        while i < len(code):
+            if rule_jump_to_next(code, i):
+                self.stats['jump-to-next'] += 1
+                del code[i]
+                i = max(i - 2, 0)
+                changed = True
+                continue
+            for name, size, rule in self.RULES:
+                window = code[i:i + size]
+                if len(window) < size:
+                    continue
+                replacement = rule(window)
+                if replacement is not None:
+                    self.stats[name] += 1
+                    code[i:i + size] = replacement
+                    # Step back so the rewritten lines are matched against their predecessors
+                    i = max(i - 2, 0)
+                    changed = True
+                    break
+            else:
+                i += 1
+        return code, changed
+
+    def report(self):
+        lines = [f"{name}: {count}" for name, count in self.stats.most_common()]
+        return "\n".join(lines)
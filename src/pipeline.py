@@ -0,0 +1,435 @@
+import glob
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+
+from cancel import NEVER_CANCELLED, CancellationToken, CompileAborted
+from code_gen import CodeGenerator
+from inline import INLINE_THRESHOLD, report as inline_report
+from instrument import NULL_TIMER, MemoryProfiler, Profiler, count_ast_nodes, format_memory
+from lexer import LexicalAnalyzer
+from parser import SyntaxParser
+from preprocessor import Preprocessor
+from semantic import SemanticAnalyzer
+from symbol_table import SymbolTable
+
+LOCATION = re.compile(r"line (\d+)(?:, column (\d+))?")
+
+# In the order they run
+PHASES = ('lexer', 'preprocessor', 'parser', 'semantic', 'codegen')
+
+
+def diagnostic(path, phase, severity, message):
+    # Machine-readable form of an error or warning message
+    entry = {'file': path, 'phase': phase, 'severity': severity, 'message': message,
+             'line': None, 'column': None}
+    location = LOCATION.search(message)
+    if location:
+        entry['line'] = int(location.group(1))
+        if location.group(2):
+            entry['column'] = int(location.group(2))
+    return entry
+
+
+class CompileResult:
+    def __init__(self, path=None):
+        self.path = path
+        self.output_path = None
+        self.tokens = []
+        self.ast = None
+        self.parsed = False
+        self.symbol_table = None
+        self.assembly = None
+        self.instruction_count = 0
+        self.diagnostics = []
+        # Seconds spent in each phase that ran
+        self.timings = {}
+        # Filled in when the pipeline has profiling enabled
+        self.counters = {}
+        # Per-phase allocations when the pipeline has a memory profiler
+        self.memory = None
+        # (including file, header) for every quoted #include that was resolved
+        self.includes = []
+        # The "compilation aborted ..." message when a budget ran out or the
+        # compile was cancelled
+        self.aborted = None
+        # (caller, callee, callee size) of each call inlined, when optimizing
+        self.inlined = None
+        # Instructions generated with inlining off, when the pipeline measures it
+        self.instructions_without_inlining = None
+
+    @property
+    def succeeded(self):
+        return self.parsed and not self.errors
+
+    @property
+    def errors(self):
+        return [d for d in self.diagnostics if d['severity'] == 'error']
+
+    @property
+    def warnings(self):
+        return [d for d in self.diagnostics if d['severity'] == 'warning']
+
+    def add_messages(self, phase, severity, messages):
+        for message in messages:
+            self.diagnostics.append(diagnostic(self.path, phase, severity, message))
+
+    def discard_artifacts(self):
+        # Drop the large intermediate results, e.g. before returning from a worker
+        self.tokens = []
+        self.ast = None
+        self.symbol_table = None
+        self.assembly = None
+
+    def to_dict(self):
+        return {
+            'file': self.path,
+            'output': self.output_path,
+            'succeeded': self.succeeded,
+            'aborted': self.aborted,
+            'diagnostics': self.diagnostics,
+            'timings': {phase: round(seconds, 6) for phase, seconds in self.timings.items()},
+            'counters': self.counters,
+            'includes': sorted({header for _, header in self.includes}),
+            **({'memory': self.memory} if self.memory is not None else {}),
+            **({'inlined': [{'caller': caller, 'callee': callee, 'nodes': size}
+                            for caller, callee, size in self.inlined]} if self.inlined is not None else {}),
+            **({'instructions_without_inlining': self.instructions_without_inlining}
+               if self.instructions_without_inlining is not None else {}),
+        }
+
+
+class CompilerPipeline:
+    # Runs lexer -> parser -> semantic analysis -> code generation without a GUI
+
+    def __init__(self, optimize=True, profiler=None, memory=None, headers=None, defines=None,
+                 budget=None, phase_budgets=None, inline_threshold=INLINE_THRESHOLD, measure_inlining=False):
+        self.optimize = optimize
+        # Callee size limit for the inliner; 0 turns inlining off
+        self.inline_threshold = inline_threshold
+        # Also generate without inlining to report what it changed
+        self.measure_inlining = measure_inlining
+        self.profiler = profiler or Profiler(enabled=False)
+        # Optional MemoryProfiler; tracing is slow, so it is off by default
+        self.memory = memory
+        # Optional project.HeaderCache; without one quoted #include is ignored
+        self.headers = headers
+        # Predefined macros, name -> replacement text
+        self.defines = defines
+        # Time limits in seconds for the whole compile and per phase name
+        self.budget = budget
+        self.phase_budgets = phase_budgets
+
+    def cancellation_token(self):
+        if self.budget is None and not self.phase_budgets:
+            return NEVER_CANCELLED
+        return CancellationToken(self.budget, self.phase_budgets)
+
+    @contextmanager
+    def phase(self, result, name, cancel=NEVER_CANCELLED):
+        cancel.enter(name)
+        # Snapshots are taken outside the timed region
+        with self.memory.phase(name) if self.memory else NULL_TIMER:
+            start = time.perf_counter()
+            try:
+                yield
+            finally:
+                elapsed = time.perf_counter() - start
+                result.timings[name] = elapsed
+                self.profiler.add_time(name, elapsed)
+
+    def compile_source(self, source, path=None, output=None, cancel=None, on_phase=None, last_phase=None):
+        # With `output` (a text stream) the assembly is streamed there
+        # instead of being kept on the result. `cancel` is a
+        # CancellationToken another thread may use to stop the compile; by
+        # default one is made from the pipeline's budgets. `on_phase(name,
+        # result)` is called as each phase's results are filled in. The
+        # phases after `last_phase`, if given, are skipped.
+        result = CompileResult(path)
+        if cancel is None:
+            cancel = self.cancellation_token()
+        if self.memory:
+            self.memory.reset()
+        try:
+            cancel.start()
+            self.run_phases(result, source, output, cancel, on_phase or (lambda name, result: None), last_phase)
+        except CompileAborted as e:
+            result.aborted = str(e)
+            result.add_messages(e.phase, 'error', [result.aborted])
+        finally:
+            if self.profiler.enabled:
+                self.count(result)
+            if self.memory:
+                self.memory.stop()
+                result.memory = self.memory.to_dict({
+                    'tokens': len(result.tokens),
+                    'ast_nodes': count_ast_nodes(result.ast or []),
+                })
+        return result
+
+    def run_phases(self, result, source, output, cancel, on_phase, last_phase=None):
+        def done(name):
+            on_phase(name, result)
+            return name == last_phase
+
+        symbol_table = SymbolTable()
+        result.symbol_table = symbol_table
+        lexer = LexicalAnalyzer(symbol_table, cancel)
+        parser = SyntaxParser(symbol_table, cancel)
+        semantic = SemanticAnalyzer(symbol_table, cancel)
+
+        with self.phase(result, 'lexer', cancel):
+            result.tokens = lexer.tokenize(source)
+        result.add_messages('lexer', 'error', lexer.errors)
+        if done('lexer'):
+            return
+
+        preprocessor = Preprocessor(self.headers, self.defines, cancel=cancel)
+        with self.phase(result, 'preprocessor', cancel):
+            tokens = preprocessor.process(result.tokens, result.path, symbol_table)
+        result.includes = preprocessor.includes
+        # Lexical errors in code left out by #if do not count, as in C
+        result.diagnostics = [entry for entry in result.diagnostics
+                              if entry['phase'] != 'lexer' or not preprocessor.skips(entry['line'])]
+        for file, phase, severity, message in preprocessor.messages:
+            result.diagnostics.append(diagnostic(file, phase, severity, message))
+        if done('preprocessor'):
+            return
+
+        with self.phase(result, 'parser', cancel):
+            result.ast = parser.parse(tokens)
+        result.add_messages('parser', 'error', parser.errors)
+        result.parsed = result.ast is not None
+        if not result.parsed:
+            if not parser.errors:
+                result.add_messages('parser', 'error', ["Syntax errors detected!"])
+            done('parser')
+            return
+        # Header declarations come first, as if pasted in at the top
+        result.ast = preprocessor.declarations + result.ast
+        if done('parser'):
+            return
+
+        with self.phase(result, 'semantic', cancel):
+            semantic.analyze(result.ast)
+        result.add_messages('semantic', 'error', semantic.errors)
+        result.add_messages('semantic', 'warning', semantic.warnings)
+        if done('semantic') or result.errors:
+            return
+
+        codegen = CodeGenerator(symbol_table, self.optimize, cancel=cancel,
+                                inline_threshold=self.inline_threshold)
+        with self.phase(result, 'codegen', cancel):
+            if output is None:
+                result.assembly = codegen.generate(result.ast)
+            else:
+                codegen.write(result.ast, output)
+        result.instruction_count = codegen.instruction_count
+        if self.optimize:
+            result.inlined = codegen.inliner.sites
+        if self.measure_inlining and self.optimize:
+            # Outside the timed phase, so the codegen timing is unaffected
+            baseline = CodeGenerator(symbol_table, self.optimize, cancel=cancel, inline_threshold=0)
+            baseline.generate(result.ast)
+            result.instructions_without_inlining = baseline.instruction_count
+        done('codegen')
+
+    def count(self, result):
+        result.counters = {
+            'tokens': len(result.tokens),
+            'ast_nodes': count_ast_nodes(result.ast or []),
+            'symbols': len(result.symbol_table),
+            'symbol_lookups': result.symbol_table.lookups,
+            'instructions': result.instruction_count,
+            'errors': len(result.errors),
+        }
+        for name, value in result.counters.items():
+            self.profiler.count(name, value)
+
+    def compile_file(self, path, output_path=None, cancel=None):
+        with open(path) as f:
+            source = f.read()
+        if output_path is None:
+            return self.compile_source(source, path, cancel=cancel)
+        # Write to a temporary name so a failed compile leaves no partial output
+        temp_path = output_path + '.tmp'
+        with open(temp_path, 'w') as output:
+            result = self.compile_source(source, path, output, cancel)
+        if result.succeeded:
+            os.replace(temp_path, output_path)
+            result.output_path = output_path
+        else:
+            os.remove(temp_path)
+        return result
+
+    def compile_files(self, paths, output_dir=None, jobs=1):
+        # Yields results in the order of `paths`. Assembly goes next to each
+        # source file unless `output_dir` is given.
+        # Each file gets its own pipeline, possibly in another process; the
+        # timings and counters it reports are merged into self.profiler.
+        tasks = [(path, output_path(path, output_dir), self.optimize, self.profiler.enabled,
+                  self.memory is not None, self.budget, self.phase_budgets, self.inline_threshold,
+                  self.measure_inlining) for path in paths]
+        if jobs <= 1 or len(tasks) < 2:
+            for result in map(compile_file_task, tasks):
+                self.merge_profile(result)
+                yield result
+            return
+        from concurrent.futures import ProcessPoolExecutor
+        chunksize = max(1, len(tasks) // (jobs * 4))
+        with ProcessPoolExecutor(jobs) as executor:
+            try:
+                for result in executor.map(compile_file_task, tasks, chunksize=chunksize):
+                    self.merge_profile(result)
+                    yield result
+            except (KeyboardInterrupt, GeneratorExit):
+                # Do not wait for files nobody will look at
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+
+    def merge_profile(self, result):
+        for phase, seconds in result.timings.items():
+            self.profiler.add_time(phase, seconds)
+        for name, value in result.counters.items():
+            self.profiler.count(name, value)
+
+
+def output_path(path, output_dir=None):
+    base = os.path.splitext(path)[0] + '.s'
+    if output_dir is None:
+        return base
+    return os.path.join(output_dir, os.path.basename(base))
+
+
+def compile_file_task(task):
+    # Process pool entry point
+    path, output, optimize, profile, memory, budget, phase_budgets, inline_threshold, measure_inlining = task
+    try:
+        pipeline = CompilerPipeline(optimize, Profiler() if profile else None,
+                                    MemoryProfiler() if memory else None,
+                                    budget=budget, phase_budgets=phase_budgets,
+                                    inline_threshold=inline_threshold, measure_inlining=measure_inlining)
+        result = pipeline.compile_file(path, output)
+    except OSError as e:
+        result = CompileResult(path)
+        result.add_messages('io', 'error', [f"{e.strerror}: {e.filename}"])
+    result.discard_artifacts()
+    return result
+
+
+def expand_patterns(patterns):
+    # Patterns that match nothing are kept, so a missing file is reported
+    paths = []
+    seen = set()
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern, recursive=True)) or [pattern]:
+            if path not in seen:
+                seen.add(path)
+                paths.append(path)
+    return paths
+
+
+def main(argv=None):
+    import argparse
+    import json
+
+    arg_parser = argparse.ArgumentParser(description="Compile mini C++ files to x86-64 assembly")
+    arg_parser.add_argument('sources', nargs='+', help="source files or glob patterns")
+    arg_parser.add_argument('-j', '--jobs', type=int, default=1, help="number of worker processes")
+    arg_parser.add_argument('-o', '--output-dir', help="directory for the .s files")
+    arg_parser.add_argument('--report', help="write a JSON diagnostics report ('-' for stdout)")
+    arg_parser.add_argument('--no-optimize', action='store_true', help="disable the peephole optimizer")
+    arg_parser.add_argument('--profile', action='store_true', help="report per-phase timings and counters")
+    arg_parser.add_argument('--timeout', type=float, metavar='SECONDS',
+                            help="abort any file whose compile takes longer than this")
+    arg_parser.add_argument('--phase-timeout', action='append', default=[], metavar='PHASE=SECONDS',
+                            help="time limit for one phase (lexer, preprocessor, parser, semantic, codegen)")
+    arg_parser.add_argument('--memory', action='store_true',
+                            help="trace allocations per phase (slow); reports top sites and peak RSS")
+    arg_parser.add_argument('--inline-threshold', type=int, default=INLINE_THRESHOLD, metavar='NODES',
+                            help=f"inline calls to functions of at most this many AST nodes "
+                                 f"(default {INLINE_THRESHOLD}; 0 disables inlining)")
+    arg_parser.add_argument('--inline-report', action='store_true',
+                            help="list the calls inlined and the instruction counts with and without inlining")
+    args = arg_parser.parse_args(argv)
+
+    paths = expand_patterns(args.sources)
+    if not paths:
+        arg_parser.error("no source files matched")
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        names = [os.path.basename(output_path(path)) for path in paths]
+        if len(set(names)) != len(names):
+            arg_parser.error("source files share a name; their outputs would collide in --output-dir")
+
+    phase_budgets = {}
+    for item in args.phase_timeout:
+        phase, _, seconds = item.partition('=')
+        try:
+            phase_budgets[phase] = float(seconds)
+        except ValueError:
+            arg_parser.error(f"--phase-timeout expects PHASE=SECONDS, not '{item}'")
+
+    profiler = Profiler(enabled=args.profile)
+    pipeline = CompilerPipeline(not args.no_optimize, profiler, MemoryProfiler() if args.memory else None,
+                                budget=args.timeout, phase_budgets=phase_budgets,
+                                inline_threshold=args.inline_threshold, measure_inlining=args.inline_report)
+    start = time.perf_counter()
+    results = []
+    interrupted = False
+    try:
+        for result in pipeline.compile_files(paths, args.output_dir, max(1, args.jobs)):
+            results.append(result)
+            for entry in result.diagnostics:
+                where = entry['file'] + (f":{entry['line']}" if entry['line'] else "")
+                print(f"{where}: {entry['severity']}: {entry['message']}", file=sys.stderr)
+    except KeyboardInterrupt:
+        interrupted = True
+        print(f"interrupted after {len(results)} of {len(paths)} files", file=sys.stderr)
+    elapsed = time.perf_counter() - start
+
+    failed = sum(1 for result in results if not result.succeeded)
+    summary = {
+        'files': len(results),
+        'succeeded': len(results) - failed,
+        'failed': failed,
+        'jobs': args.jobs,
+        'seconds': round(elapsed, 6),
+        'files_per_second': round(len(results) / elapsed, 2) if elapsed else None,
+        'interrupted': interrupted,
+    }
+    if args.report:
+        report = {'summary': summary, 'files': [r.to_dict() for r in results]}
+        if args.profile:
+            report['profile'] = profiler.to_dict()
+        report = json.dumps(report, indent=2)
+        if args.report == '-':
+            print(report)
+        else:
+            with open(args.report, 'w') as f:
+                f.write(report + "\n")
+    print(f"{summary['succeeded']}/{summary['files']} files compiled in {elapsed:.2f}s "
+          f"({summary['files_per_second']} files/sec, -j{args.jobs})", file=sys.stderr)
+    if args.profile:
+        print(profiler.format(), file=sys.stderr)
+    if args.inline_report:
+        for result in results:
+            if result.instructions_without_inlining is not None:
+                print(f"\n{result.path}: {len(result.inlined)} call(s) inlined, "
+                      f"{result.instruction_count} instructions "
+                      f"({result.instructions_without_inlining} without inlining)", file=sys.stderr)
+                if result.inlined:
+                    print(inline_report(result.inlined), file=sys.stderr)
+    if args.memory:
+        for result in results:
+            if result.memory is not None:
+                print(f"\n{result.path}:\n{format_memory(result.memory)}", file=sys.stderr)
+    if interrupted:
+        return 130
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,612 @@
+import os
+import re
+
+from cancel import NEVER_CANCELLED
+from lexer import LexicalAnalyzer
+from parser import SyntaxParser
+from symbol_table import SymbolTable
+
+# Deeper nesting almost always means a header that includes itself
+# without a guard
+MAX_INCLUDE_DEPTH = 200
+
+# Binary operators allowed in #if, by precedence
+IF_PRECEDENCE = {
+    '||': 1, '&&': 2, '|': 3, '^': 4, '&': 5,
+    '==': 6, '!=': 6, '<': 7, '>': 7, '<=': 7, '>=': 7,
+    '<<': 8, '>>': 8, '+': 9, '-': 9, '*': 10, '/': 10, '%': 10,
+}
+
+CHAR_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', '0': '\0'}
+
+# Line number in a lexer message
+MESSAGE_LINE = re.compile(r"line (\d+)")
+
+
+class PreprocessorError(Exception):
+    pass
+
+
+def directive_name(token):
+    # '#  define' -> 'define'
+    return token['value'][1:].strip()
+
+
+def directive_end(tokens, start):
+    # Index just past the directive starting at `start`; a directive runs
+    # to the end of its line, and on over lines joined by backslash-newline
+    line = tokens[start]['line']
+    end = start + 1
+    while end < len(tokens):
+        token = tokens[end]
+        if token['line'] != line:
+            if 'continues' not in token:
+                break
+            line = token['line']
+        end += 1
+    return end
+
+
+def in_skipped(line, regions):
+    # Whether `line` lies inside one of the (after line, before line)
+    # regions left out by #if
+    return line is not None and any(after < line < before for after, before in regions)
+
+
+def parse_declarations(tokens):
+    # Parses a header on its own: (ast, [(name, type, value)], errors)
+    symbol_table = SymbolTable()
+    parser = SyntaxParser(symbol_table)
+    ast = parser.parse(tokens)
+    symbols = [(entry['name'], entry['type'], entry['value']) for entry in symbol_table.table]
+    errors = list(parser.errors)
+    if ast is None and not errors:
+        errors.append("Syntax errors detected!")
+    return ast, symbols, errors
+
+
+class Header:
+    # A lexed header file. Nothing here depends on where the file lives or
+    # on the macros in effect, so every copy of the same content shares one
+    # entry.
+
+    def __init__(self, key, tokens, errors):
+        self.key = key
+        self.tokens = tokens
+        self.errors = errors
+        self.pragma_once = False
+        # Macro of a classic #ifndef/#define/#endif guard around the file
+        self.guard = None
+        self.body = self.strip_guards(tokens)
+        # Plain headers have no directives except leading #includes; when
+        # none of their identifiers is a macro their parse can be reused
+        self.plain, self.includes, self.declaration_tokens = self.split_includes(self.body)
+        self.identifiers = frozenset(token['value'] for token in self.declaration_tokens
+                                     if token['type'] == 'IDENTIFIER')
+        self.parsed = None
+
+    def strip_guards(self, tokens):
+        body = []
+        i = 0
+        while i < len(tokens):
+            end = directive_end(tokens, i) if tokens[i]['type'] == 'PREPROCESSOR' else i + 1
+            directive = tokens[i:end]
+            if (directive[0]['type'] == 'PREPROCESSOR' and directive_name(directive[0]) == 'pragma'
+                    and [t['value'] for t in directive[1:]] == ['once']):
+                self.pragma_once = True
+            else:
+                body.extend(directive)
+            i = end
+
+        # #ifndef G / #define G as the first two directives and the #endif
+        # closing the #ifndef as the last
+        if len(body) < 5 or body[0]['type'] != 'PREPROCESSOR' or directive_name(body[0]) != 'ifndef':
+            return body
+        define_at = directive_end(body, 0)
+        if define_at != 2 or body[1]['type'] != 'IDENTIFIER':
+            return body
+        guard = body[1]['value']
+        define_end = directive_end(body, define_at) if body[define_at]['type'] == 'PREPROCESSOR' else define_at
+        if (directive_name(body[define_at]) != 'define' or define_end != define_at + 2
+                or body[define_at + 1]['value'] != guard):
+            return body
+        last = body[-1]
+        if last['type'] != 'PREPROCESSOR' or directive_name(last) != 'endif':
+            return body
+        depth = 0
+        for token in body[:-1]:
+            if token['type'] != 'PREPROCESSOR':
+                continue
+            name = directive_name(token)
+            if name in ('if', 'ifdef', 'ifndef'):
+                depth += 1
+            elif name in ('elif', 'else') and depth == 1:
+                return body
+            elif name == 'endif':
+                depth -= 1
+                if depth == 0:
+                    return body  # the #ifndef closes before the end of the file
+        self.guard = guard
+        return body[define_end:-1]
+
+    def split_includes(self, body):
+        includes = []
+        i = 0
+        while i < len(body) and body[i]['type'] == 'PREPROCESSOR':
+            if directive_name(body[i]) != 'include':
+                return False, [], body
+            end = directive_end(body, i)
+            includes.append(body[i:end])
+            i = end
+        if any(token['type'] == 'PREPROCESSOR' for token in body[i:]):
+            return False, [], body
+        return True, includes, body[i:]
+
+    def parse(self):
+        if self.parsed is None:
+            self.parsed = parse_declarations(self.declaration_tokens)
+        return self.parsed
+
+
+class Macro:
+    __slots__ = ('name', 'params', 'body')
+
+    def __init__(self, name, params, body):
+        self.name = name
+        self.params = params  # None for object-like macros
+        self.body = body
+
+    def signature(self):
+        return self.params, [(token['type'], token['value']) for token in self.body]
+
+
+class Preprocessor:
+    # Token-level preprocessor run between the lexer and the parser.
+    # Handles #define/#undef (object- and function-like macros, # to
+    # stringize a parameter), #if/#ifdef/#ifndef/#elif/#else/#endif,
+    # #error, #warning, #pragma once, include guards and, given a
+    # project.HeaderCache, quoted #include.
+    #
+    # Headers are parsed on their own and their declarations put ahead of
+    # the unit's, so `declarations` holds the included AST after process().
+
+    def __init__(self, headers=None, defines=None, memoize=True, cancel=None):
+        self.headers = headers
+        self.cancel = cancel or NEVER_CANCELLED
+        self.macros = {}
+        self.memoize = memoize
+        # (macro, argument token signature, disabled macros) -> [(type, value)]
+        self.memo = {}
+        # Identifiers the memoized expansions depend on; redefining one of
+        # them invalidates the memo
+        self.memo_names = set()
+        self.memo_hits = 0
+        self.memo_misses = 0
+        self.messages = []      # (path, phase, severity, message)
+        self.includes = []      # (including file, header)
+        self.declarations = []
+        self.once = set()
+        self.skipped_includes = 0
+        self.stack = []
+        # (after line, before line) of each region of the unit left out by #if
+        self.skipped = []
+        self.symbol_table = None
+        for name, value in (defines or {}).items():
+            body = LexicalAnalyzer(SymbolTable()).tokenize(str(value))
+            self.define(Macro(name, None, body), None, 0)
+
+    def process(self, tokens, path=None, symbol_table=None):
+        # Preprocessed tokens of one translation unit
+        self.symbol_table = symbol_table
+        self.stack = [path]
+        out = []
+        self.skipped = self.run(tokens, path, out)
+        return out
+
+    def skips(self, line):
+        # Whether a line of the unit is in a region left out by #if, where
+        # lexical errors do not count
+        return in_skipped(line, self.skipped)
+
+    def error(self, path, line, message, severity='error'):
+        self.messages.append((path, 'preprocessor', severity, f"Preprocessor {severity} at line {line}: {message}"))
+
+    def run(self, tokens, path, out):
+        # Returns the regions left out, as (after line, before line)
+        if not self.macros and not any(token['type'] == 'PREPROCESSOR' for token in tokens):
+            out.extend(tokens)
+            return []
+        skipped = []
+        # [enclosing branch active, this branch active, a branch was taken, #else seen, line]
+        conditions = []
+        active = True
+        start = 0  # first token of the current run of ordinary tokens
+        check = self.cancel.check
+        i = 0
+        while i < len(tokens):
+            check()
+            token = tokens[i]
+            if token['type'] != 'PREPROCESSOR':
+                i += 1
+                continue
+            if active and start < i:
+                out.extend(self.expand(tokens[start:i], path))
+            end = directive_end(tokens, i)
+            self.directive(token, tokens[i + 1:end], path, conditions, active, out)
+            was_active = active
+            active = not conditions or (conditions[-1][0] and conditions[-1][1])
+            if was_active and not active:
+                skip_after = tokens[end - 1]['line']
+            elif active and not was_active:
+                skipped.append((skip_after, token['line']))
+            i = start = end
+        if not active:
+            skipped.append((skip_after, float('inf')))
+        elif start < len(tokens):
+            out.extend(self.expand(tokens[start:], path))
+        for condition in conditions:
+            self.error(path, condition[4], "unterminated conditional directive")
+        return skipped
+
+    def directive(self, token, args, path, conditions, active, out):
+        name = directive_name(token)
+        line = token['line']
+        try:
+            if name in ('if', 'ifdef', 'ifndef'):
+                # Pushed before evaluating, so a bad expression still pairs with its #endif
+                conditions.append([active, False, False, False, line])
+                taken = active and self.condition(name, args, line)
+                conditions[-1][1] = conditions[-1][2] = taken
+            elif name in ('elif', 'else', 'endif'):
+                if not conditions:
+                    raise PreprocessorError(f"#{name} without #if")
+                condition = conditions[-1]
+                if name == 'endif':
+                    conditions.pop()
+                elif condition[3]:
+                    raise PreprocessorError(f"#{name} after #else")
+                elif name == 'else':
+                    condition[1] = condition[0] and not condition[2]
+                    condition[2] = condition[3] = True
+                else:
+                    taken_before, condition[1] = condition[2], False
+                    condition[1] = condition[0] and not taken_before and self.condition('if', args, line)
+                    condition[2] = taken_before or condition[1]
+            elif not active:
+                return
+            elif name == 'define':
+                self.define(self.parse_define(args, line), path, line)
+            elif name == 'undef':
+                if not args or args[0]['type'] != 'IDENTIFIER':
+                    raise PreprocessorError("macro name must be an identifier")
+                self.undefine(args[0]['value'])
+            elif name == 'include':
+                self.include(args, path, line)
+            elif name == 'pragma':
+                if [t['value'] for t in args] == ['once']:
+                    self.once.add(path)
+            elif name in ('error', 'warning'):
+                text = " ".join(t['value'] for t in args)
+                self.error(path, line, text or f"#{name}", 'error' if name == 'error' else 'warning')
+            else:
+                raise PreprocessorError(f"unknown directive '#{name}'")
+        except PreprocessorError as e:
+            self.error(path, line, str(e))
+
+    # Macros
+
+    def parse_define(self, args, line):
+        if not args or args[0]['type'] != 'IDENTIFIER':
+            raise PreprocessorError("macro name must be an identifier")
+        name = args[0]
+        # Function-like only when '(' follows the name without a space
+        if (len(args) > 1 and args[1]['value'] == '(' and args[1]['type'] == 'DELIMITER'
+                and args[1]['col'] == name['col'] + len(name['value'])):
+            params = []
+            i = 2
+            while i < len(args) and args[i]['value'] != ')':
+                if args[i]['type'] != 'IDENTIFIER':
+                    raise PreprocessorError(f"expected a parameter name in macro '{name['value']}'")
+                params.append(args[i]['value'])
+                i += 1
+                if i < len(args) and args[i]['value'] == ',':
+                    i += 1
+            if i >= len(args):
+                raise PreprocessorError(f"missing ')' in macro '{name['value']}'")
+            return Macro(name['value'], params, args[i + 1:])
+        return Macro(name['value'], None, args[1:])
+
+    def define(self, macro, path, line):
+        old = self.macros.get(macro.name)
+        if old is not None and old.signature() != macro.signature():
+            self.error(path, line, f"macro '{macro.name}' redefined", 'warning')
+        self.invalidate(macro.name)
+        self.macros[macro.name] = macro
+
+    def undefine(self, name):
+        self.invalidate(name)
+        self.macros.pop(name, None)
+
+    def invalidate(self, name):
+        if name in self.memo_names:
+            self.memo.clear()
+            self.memo_names.clear()
+
+    def expand(self, tokens, path, disabled=frozenset()):
+        macros = self.macros
+        if not macros:
+            return tokens
+        out = []
+        check = self.cancel.check
+        i = 0
+        while i < len(tokens):
+            check()
+            token = tokens[i]
+            macro = macros.get(token['value']) if token['type'] == 'IDENTIFIER' else None
+            if macro is None or macro.name in disabled:
+                out.append(token)
+                i += 1
+                continue
+            if macro.params is None:
+                args = ()
+                i += 1
+            elif i + 1 < len(tokens) and tokens[i + 1]['value'] == '(' and tokens[i + 1]['type'] == 'DELIMITER':
+                args, i = self.arguments(tokens, i + 1)
+                if args is None:
+                    self.error(path, token['line'], f"unterminated call to macro '{macro.name}'")
+                    return out
+                if not macro.params and args == [[]]:
+                    args = []
+                if len(args) != len(macro.params):
+                    self.error(path, token['line'], f"macro '{macro.name}' takes {len(macro.params)} "
+                                                    f"arguments, {len(args)} given")
+                    continue
+            else:
+                # A function-like macro name without arguments is left alone
+                out.append(token)
+                i += 1
+                continue
+            out.extend(self.substitute(macro, args, disabled, token, path))
+        return out
+
+    def arguments(self, tokens, open_paren):
+        # Comma-separated argument token lists and the index past ')'
+        args = [[]]
+        depth = 0
+        i = open_paren + 1
+        while i < len(tokens):
+            token = tokens[i]
+            value = token['value'] if token['type'] == 'DELIMITER' else None
+            if value == '(':
+                depth += 1
+            elif value == ')':
+                if depth == 0:
+                    return args, i + 1
+                depth -= 1
+            elif value == ',' and depth == 0:
+                args.append([])
+                i += 1
+                continue
+            args[-1].append(token)
+            i += 1
+        return None, i
+
+    def substitute(self, macro, args, disabled, at, path):
+        # The expansion takes the position of the macro name it replaces
+        if self.memoize:
+            key = (macro.name, tuple(tuple((t['type'], t['value']) for t in arg) for arg in args), disabled)
+            shape = self.memo.get(key)
+            if shape is None:
+                self.memo_misses += 1
+                shape = self.expansion(macro, args, disabled, path)
+                self.memo[key] = shape
+                self.memo_names.update(value for kind, value in shape if kind == 'IDENTIFIER')
+            else:
+                self.memo_hits += 1
+        else:
+            shape = self.expansion(macro, args, disabled, path)
+        line, col = at['line'], at['col']
+        return [{'type': kind, 'value': value, 'line': line, 'col': col} for kind, value in shape]
+
+    def expansion(self, macro, args, disabled, path):
+        self.memo_names.add(macro.name)
+        if macro.params is None:
+            body = macro.body
+        else:
+            params = {name: index for index, name in enumerate(macro.params)}
+            body = []
+            for token in macro.body:
+                if token['type'] == 'IDENTIFIER' and token['value'] in params:
+                    body.extend(self.expand(args[params[token['value']]], path, disabled))
+                elif token['type'] == 'PREPROCESSOR' and directive_name(token) in params:
+                    body.append(self.stringize(args[params[directive_name(token)]], token))
+                else:
+                    body.append(token)
+        return [(token['type'], token['value']) for token in self.expand(body, path, disabled | {macro.name})]
+
+    def stringize(self, arg, at):
+        text = " ".join(token['value'] for token in arg).replace("\\", "\\\\").replace('"', '\\"')
+        return {'type': 'STRING', 'value': f'"{text}"', 'line': at['line'], 'col': at['col']}
+
+    # Conditionals
+
+    def condition(self, name, args, line):
+        if name != 'if':
+            if not args or args[0]['type'] != 'IDENTIFIER':
+                raise PreprocessorError(f"#{name} expects a macro name")
+            return (args[0]['value'] in self.macros) == (name == 'ifdef')
+        if not args:
+            raise PreprocessorError("#if with no expression")
+        items = []
+        i = 0
+        # defined X / defined(X) are resolved before macros are expanded
+        while i < len(args):
+            token = args[i]
+            if token['type'] == 'IDENTIFIER' and token['value'] == 'defined':
+                paren = i + 1 < len(args) and args[i + 1]['value'] == '('
+                j = i + 2 if paren else i + 1
+                if j >= len(args) or args[j]['type'] != 'IDENTIFIER':
+                    raise PreprocessorError("'defined' expects a macro name")
+                if paren and (j + 1 >= len(args) or args[j + 1]['value'] != ')'):
+                    raise PreprocessorError("missing ')' after 'defined'")
+                value = '1' if args[j]['value'] in self.macros else '0'
+                items.append({'type': 'INTEGER', 'value': value, 'line': line, 'col': token['col']})
+                i = j + 2 if paren else j + 1
+            else:
+                items.append(token)
+                i += 1
+        return IfExpression(self.expand(items, None)).evaluate() != 0
+
+    # Includes
+
+    def include(self, args, path, line):
+        if not args:
+            raise PreprocessorError('#include expects "FILENAME"')
+        if args[0]['type'] != 'STRING' or self.headers is None:
+            # <system> headers are built in; quoted ones need a header cache
+            return
+        name = args[0]['value'][1:-1]
+        directory = os.path.dirname(path) if path else os.getcwd()
+        target = self.headers.resolve(name, directory)
+        if target is None:
+            raise PreprocessorError(f"cannot find include file '{name}'")
+        self.includes.append((path, target))
+        if target in self.once:
+            self.skipped_includes += 1
+            return
+        try:
+            header = self.headers.load(target)
+        except OSError as e:
+            raise PreprocessorError(f"{e.strerror}: {target}")
+        if header.guard is not None and header.guard in self.macros:
+            # Guarded and already included: the file would expand to nothing
+            self.skipped_includes += 1
+            return
+        if len(self.stack) > MAX_INCLUDE_DEPTH:
+            raise PreprocessorError(f"#include nested too deeply including '{name}'")
+        self.stack.append(target)
+        try:
+            self.include_header(header, target)
+        finally:
+            self.stack.pop()
+
+    def include_header(self, header, path):
+        skipped = []
+        if header.pragma_once:
+            self.once.add(path)
+        if header.guard is not None:
+            self.macros[header.guard] = Macro(header.guard, None, [])
+        if header.plain:
+            for directive in header.includes:
+                try:
+                    self.include(directive[1:], path, directive[0]['line'])
+                except PreprocessorError as e:
+                    self.error(path, directive[0]['line'], str(e))
+            if header.identifiers.isdisjoint(self.macros):
+                self.add_lexer_errors(header, path, skipped)
+                self.add_declarations(header.parse(), path)
+                return
+            tokens = self.expand(header.declaration_tokens, path)
+        else:
+            tokens = []
+            skipped = self.run(header.body, path, tokens)
+        self.add_lexer_errors(header, path, skipped)
+        self.add_declarations(parse_declarations(tokens), path)
+
+    def add_lexer_errors(self, header, path, skipped):
+        for message in header.errors:
+            location = MESSAGE_LINE.search(message)
+            if not in_skipped(location and int(location.group(1)), skipped):
+                self.messages.append((path, 'lexer', 'error', message))
+
+    def add_declarations(self, parsed, path):
+        ast, symbols, errors = parsed
+        for message in errors:
+            self.messages.append((path, 'parser', 'error', message))
+        if self.symbol_table is not None:
+            for symbol in symbols:
+                self.symbol_table.add_symbol(*symbol)
+        if ast:
+            self.declarations.extend(ast)
+
+    def stats(self):
+        return {
+            'macros': len(self.macros),
+            'memo_hits': self.memo_hits,
+            'memo_misses': self.memo_misses,
+            'skipped_includes': self.skipped_includes,
+        }
+
+
+class IfExpression:
+    # Integer constant expression of an #if, after macro expansion.
+    # Identifiers left over evaluate to 0, as in C.
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def evaluate(self):
+        value = self.binary(1)
+        if self.pos < len(self.tokens):
+            raise PreprocessorError(f"unexpected '{self.tokens[self.pos]['value']}' in #if")
+        return value
+
+    def peek(self):
+        return self.tokens[self.pos]['value'] if self.pos < len(self.tokens) else None
+
+    def binary(self, min_precedence):
+        left = self.unary()
+        while True:
+            op = self.peek()
+            precedence = IF_PRECEDENCE.get(op)
+            if precedence is None or precedence < min_precedence:
+                return left
+            self.pos += 1
+            right = self.binary(precedence + 1)
+            left = self.apply(op, left, right)
+
+    def apply(self, op, left, right):
+        if op in ('/', '%'):
+            if right == 0:
+                raise PreprocessorError("division by zero in #if")
+            quotient = abs(left) // abs(right) * (1 if (left < 0) == (right < 0) else -1)
+            return quotient if op == '/' else left - quotient * right
+        if op == '&&':
+            return int(bool(left) and bool(right))
+        if op == '||':
+            return int(bool(left) or bool(right))
+        if op in ('<', '>', '<=', '>=', '==', '!='):
+            return int({'<': left < right, '>': left > right, '<=': left <= right,
+                        '>=': left >= right, '==': left == right, '!=': left != right}[op])
+        return {'+': left + right, '-': left - right, '*': left * right, '<<': left << right,
+                '>>': left >> right, '&': left & right, '^': left ^ right, '|': left | right}[op]
+
+    def unary(self):
+        if self.pos >= len(self.tokens):
+            raise PreprocessorError("incomplete #if expression")
+        token = self.tokens[self.pos]
+        self.pos += 1
+        value, kind = token['value'], token['type']
+        if value == '(' and kind == 'DELIMITER':
+            result = self.binary(1)
+            if self.peek() != ')':
+                raise PreprocessorError("missing ')' in #if")
+            self.pos += 1
+            return result
+        if value == '!':
+            return int(not self.unary())
+        if value == '-':
+            return -self.unary()
+        if value == '+':
+            return self.unary()
+        if value == '~':
+            return ~self.unary()
+        if kind == 'INTEGER':
+            return int(value)
+        if kind == 'CHAR':
+            text = value[1:-1]
+            return ord(CHAR_ESCAPES.get(text[1], text[1]) if text.startswith('\\') else text)
+        if kind in ('IDENTIFIER', 'TYPE', 'KEYWORD'):
+            return 1 if value == 'true' else 0
+        raise PreprocessorError(f"unexpected '{value}' in #if")
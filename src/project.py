@@ -0,0 +1,229 @@
+import hashlib
+import json
+import os
+import sys
+import time
+
+from lexer import LexicalAnalyzer
+from pipeline import CompileResult, CompilerPipeline, expand_patterns, output_path
+from preprocessor import Header
+from symbol_table import SymbolTable
+
+
+def content_hash(data):
+    if isinstance(data, str):
+        data = data.encode()
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_hash(path):
+    try:
+        with open(path, 'rb') as f:
+            return content_hash(f.read())
+    except OSError:
+        return None
+
+
+class HeaderCache:
+    # Resolves quoted includes and keeps every header it has loaded, keyed
+    # by content hash, so a header shared by many translation units is
+    # lexed once per process, and parsed once as long as no macro changes
+    # its meaning (see preprocessor.Header).
+
+    def __init__(self, include_paths=()):
+        self.include_paths = list(include_paths)
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, name, directory):
+        # The including file's directory first, then the search paths
+        for base in [directory] + self.include_paths:
+            candidate = os.path.normpath(os.path.join(base, name))
+            if os.path.isfile(candidate):
+                return candidate
+        return None
+
+    def load(self, path):
+        with open(path) as f:
+            source = f.read()
+        key = content_hash(source)
+        header = self.entries.get(key)
+        if header is None:
+            self.misses += 1
+            lexer = LexicalAnalyzer(SymbolTable())
+            header = Header(key, lexer.tokenize(source), lexer.errors)
+            self.entries[key] = header
+        else:
+            self.hits += 1
+        return header
+
+    def stats(self):
+        return {'headers': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+
+class DependencyGraph:
+    # file -> files it includes directly, for every translation unit built
+
+    def __init__(self, edges=None):
+        self.edges = {path: set(deps) for path, deps in (edges or {}).items()}
+
+    def set_unit(self, unit, includes):
+        # `includes` are the (including, included) pairs of one compile; they
+        # replace whatever was recorded for the files that compile reached
+        edges = {unit: set()}
+        for including, included in includes:
+            edges.setdefault(including, set()).add(included)
+            edges.setdefault(included, set())
+        self.edges.update(edges)
+
+    def dependencies(self, path):
+        # Every file reachable from `path`, not counting itself
+        found = set()
+        stack = [path]
+        while stack:
+            for dep in self.edges.get(stack.pop(), ()):
+                if dep not in found:
+                    found.add(dep)
+                    stack.append(dep)
+        found.discard(path)
+        return found
+
+    def affected(self, units, changed):
+        # Translation units that are, or transitively include, a changed file
+        changed = set(changed)
+        return [unit for unit in units if unit in changed or self.dependencies(unit) & changed]
+
+    def to_dict(self):
+        return {path: sorted(deps) for path, deps in self.edges.items()}
+
+
+class Project:
+    # Builds a set of translation units, recompiling only those whose
+    # source or included headers changed since the last build. The state
+    # (content hashes, the include graph and a hash of the options) is
+    # kept in a JSON file; changing an option rebuilds everything.
+
+    def __init__(self, sources, include_paths=(), output_dir=None, state_path=None, optimize=True,
+                 defines=None):
+        self.sources = [os.path.normpath(path) for path in sources]
+        self.output_dir = output_dir
+        self.state_path = state_path
+        self.headers = HeaderCache(include_paths)
+        self.pipeline = CompilerPipeline(optimize, headers=self.headers, defines=defines)
+        # Everything besides file contents that changes the output
+        self.options = content_hash(json.dumps([sorted((defines or {}).items()), optimize,
+                                                list(include_paths)]))
+        self.hashes = {}
+        self.graph = DependencyGraph()
+        self.built_options = None
+        self.load_state()
+
+    def load_state(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+            self.hashes = state['hashes']
+            self.graph = DependencyGraph(state['graph'])
+            self.built_options = state.get('options')
+        except (OSError, ValueError, KeyError):
+            # A damaged state file only costs a full rebuild
+            self.hashes = {}
+            self.graph = DependencyGraph()
+
+    def save_state(self):
+        if not self.state_path:
+            return
+        temp_path = self.state_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({'hashes': self.hashes, 'graph': self.graph.to_dict(), 'options': self.options}, f, indent=1)
+        os.replace(temp_path, self.state_path)
+
+    def changed_files(self):
+        # Files whose content differs from the last build, by hash
+        current = {}
+        for path in set(self.hashes) | set(self.sources):
+            current[path] = file_hash(path)
+        return {path for path, digest in current.items() if digest != self.hashes.get(path)}, current
+
+    def out_of_date(self):
+        if self.built_options != self.options:
+            return list(self.sources), {}
+        changed, current = self.changed_files()
+        stale = set(self.graph.affected(self.sources, changed))
+        for unit in self.sources:
+            if unit not in self.graph.edges or not os.path.exists(output_path(unit, self.output_dir)):
+                stale.add(unit)
+        return [unit for unit in self.sources if unit in stale], current
+
+    def build(self, force=False):
+        # Returns (results of the units compiled, units that were up to date)
+        if force:
+            stale, current = list(self.sources), {}
+        else:
+            stale, current = self.out_of_date()
+        results = []
+        for unit in stale:
+            try:
+                result = self.pipeline.compile_file(unit, output_path(unit, self.output_dir))
+            except OSError as e:
+                result = CompileResult(unit)
+                result.add_messages('io', 'error', [f"{e.strerror}: {e.filename}"])
+            result.discard_artifacts()
+            results.append(result)
+            if result.succeeded:
+                self.graph.set_unit(unit, result.includes)
+                for path in [unit] + sorted(self.graph.dependencies(unit)):
+                    self.hashes[path] = current.get(path) or file_hash(path)
+            else:
+                # Rebuilt next time whatever changes
+                self.hashes.pop(unit, None)
+        self.built_options = self.options
+        self.save_state()
+        up_to_date = [unit for unit in self.sources if unit not in stale]
+        return results, up_to_date
+
+
+def main(argv=None):
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description="Build a multi-file mini C++ project incrementally")
+    arg_parser.add_argument('sources', nargs='+', help="translation units or glob patterns")
+    arg_parser.add_argument('-I', '--include', action='append', default=[], dest='include_paths',
+                            help="add a directory to the include search path")
+    arg_parser.add_argument('-D', '--define', action='append', default=[], dest='defines', metavar='NAME[=VALUE]',
+                            help="predefine a macro (VALUE defaults to 1)")
+    arg_parser.add_argument('-o', '--output-dir', help="directory for the .s files")
+    arg_parser.add_argument('--state', help="build state file (default: .mini_cpp_build.json in the output "
+                                            "directory or the current directory)")
+    arg_parser.add_argument('--rebuild', action='store_true', help="ignore the build state and compile everything")
+    arg_parser.add_argument('--no-optimize', action='store_true', help="disable the peephole optimizer")
+    args = arg_parser.parse_args(argv)
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    state_path = args.state or os.path.join(args.output_dir or os.curdir, '.mini_cpp_build.json')
+    defines = dict((item.split('=', 1) + ['1'])[:2] for item in args.defines)
+    project = Project(expand_patterns(args.sources), args.include_paths, args.output_dir,
+                      state_path, not args.no_optimize, defines)
+
+    start = time.perf_counter()
+    results, up_to_date = project.build(force=args.rebuild)
+    elapsed = time.perf_counter() - start
+
+    failed = 0
+    for result in results:
+        failed += not result.succeeded
+        for entry in result.diagnostics:
+            where = (entry['file'] or result.path) + (f":{entry['line']}" if entry['line'] else "")
+            print(f"{where}: {entry['severity']}: {entry['message']}", file=sys.stderr)
+    stats = project.headers.stats()
+    print(f"{len(results) - failed}/{len(results)} compiled, {len(up_to_date)} up to date in {elapsed:.2f}s "
+          f"(headers parsed {stats['misses']}, reused {stats['hits']})", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,23 @@
+from cancel import NEVER_CANCELLED
+from value_types import is_float
+
+
 class SemanticAnalyzer:
-    def __init__(self, symbol_table):
+    def __init__(self, symbol_table, cancel=None):
         self.symbol_table = symbol_table
+        self.cancel = cancel or NEVER_CANCELLED
         self.errors = []
         self.warnings = []
+        self.functions = {}
         
     def analyze(self, ast):
         self.errors = []
         self.warnings = []
+        # Calls may come before the definition they refer to
+        self.functions = {node[2]: node for node in ast if node[0] == 'function'}
         
         for node in ast:
+            self.cancel.check()
             if node[0] == 'function':
                 self.symbol_table.enter_scope(node[2])
                 self.check_function(node)
@@ -28,10 +37,37 @@ class SemanticAnalyzer:
                 
         # Check function body
         for stmt in body:
-            if stmt[0] == 'declaration':
-                self.check_declaration(stmt)
-            elif stmt[0] == 'return':
-                self.check_return(stmt, return_type)
+            self.check_statement(stmt, return_type)
+                
+    def check_statement(self, stmt, return_type):
+        self.cancel.check()
+        if stmt[0] == 'declaration':
+            self.check_declaration(stmt)
+        elif stmt[0] == 'return':
+            self.check_return(stmt, return_type)
+        elif stmt[0] == 'if':
+            _, condition, body, else_body = stmt
+            self.infer_expression_type(condition)
+            for inner in body + (else_body or []):
+                self.check_statement(inner, return_type)
+        elif stmt[0] == 'while':
+            _, condition, body = stmt
+            self.infer_expression_type(condition)
+            for inner in body:
+                self.check_statement(inner, return_type)
+        elif stmt[0] == 'for':
+            _, init, condition, updates, body = stmt
+            for inner in init:
+                self.check_statement(inner, return_type)
+            for expr in ([condition] if condition else []) + updates:
+                self.infer_expression_type(expr)
+            for inner in body:
+                self.check_statement(inner, return_type)
+        elif stmt[0] == 'expression':
+            self.infer_expression_type(stmt[1])
+        elif stmt[0] == 'print':
+            for item in stmt[1]:
+                self.infer_expression_type(item)
                 
     def check_declaration(self, node):
         _, var_type, var_name, expr = node
@@ -39,18 +75,25 @@ class SemanticAnalyzer:
         if expr:
             # Check expression types
             expr_type = self.infer_expression_type(expr)
-            if expr_type and expr_type != var_type:
+            if expr_type and not self.assignable(expr_type, var_type):
                 self.errors.append(f"Type error: Cannot assign {expr_type} to {var_type} variable '{var_name}'")
                 
     def check_return(self, node, expected_type):
         _, expr = node
         if expr:
             expr_type = self.infer_expression_type(expr)
-            if expr_type != expected_type:
+            if not self.assignable(expr_type, expected_type):
                 self.errors.append(f"Return type mismatch: Expected {expected_type}, got {expr_type}")
         elif expected_type != 'void':
             self.errors.append(f"Non-void function must return a value")
                 
+    def assignable(self, value_type, target_type):
+        # An int is promoted where a float or double is expected, as the
+        # generated code converts it; float and double are the same type
+        if value_type == target_type:
+            return True
+        return is_float(target_type) and (value_type == 'int' or is_float(value_type))
+
     def infer_expression_type(self, expr_node):
         if expr_node[0] == 'literal':
             return expr_node[1]  # 'int', 'float', etc.
@@ -58,18 +101,44 @@ class SemanticAnalyzer:
             symbol = self.symbol_table.lookup(expr_node[1])
             return symbol['type'] if symbol else None
         elif expr_node[0] == 'assignment':
-            return self.infer_expression_type(expr_node[1])
+            target_type = self.infer_expression_type(expr_node[1])
+            value_type = self.infer_expression_type(expr_node[2])
+            # As in declarations, a float is not stored in an int
+            if (target_type and value_type and 'float' in (target_type, value_type)
+                    and not self.assignable(value_type, target_type)):
+                self.errors.append(f"Type error: Cannot assign {value_type} to {target_type} variable '{expr_node[1][1]}'")
+            return target_type
         elif expr_node[0] == 'binary_op':
             left_type = self.infer_expression_type(expr_node[2])
             right_type = self.infer_expression_type(expr_node[3])
             
+            if expr_node[1] == '%' and 'float' in [left_type, right_type]:
+                self.errors.append("Type error: Operator '%' requires int operands")
             # For arithmetic operations, promote to float if either is float
-            if expr_node[1] in ['+', '-', '*', '/']:
+            if expr_node[1] in ['+', '-', '*', '/', '%']:
                 if 'float' in [left_type, right_type]:
                     return 'float'
                 return 'int'
             return 'bool'  # For comparisons
         elif expr_node[0] == 'unary_op':
             return self.infer_expression_type(expr_node[2])
+        elif expr_node[0] == 'call':
+            return self.check_call(expr_node)
             
-        return None
\ No newline at end of file
+        return None
+        
+    def check_call(self, node):
+        _, name, args = node
+        arg_types = [self.infer_expression_type(arg) for arg in args]
+        function = self.functions.get(name)
+        if function is None:
+            self.errors.append(f"Undefined function '{name}'")
+            return None
+        params = function[3]
+        if len(args) != len(params):
+            self.errors.append(f"Function '{name}' expects {len(params)} argument(s), got {len(args)}")
+        else:
+            for position, ((p_type, p_name), arg_type) in enumerate(zip(params, arg_types), 1):
+                if arg_type and not self.assignable(arg_type, p_type):
+                    self.errors.append(f"Type error: Argument {position} of '{name}' expects {p_type}, got {arg_type}")
+        return function[1]
\ No newline at end of file
@@ -1,67 +1,79 @@
 class SymbolTable:
     def __init__(self):
-        self.table = []
+        # (scope name, symbol name) -> entry, in the order they were added,
+        # so adding and looking up a symbol never scans the table
+        self.symbols = {}
         self.scope_stack = [{"name": "global", "level": 0}]
-        
+        self.lookups = 0
+
+    @property
+    def table(self):
+        return list(self.symbols.values())
+
+    def __len__(self):
+        return len(self.symbols)
+
     def enter_scope(self, scope_name):
         level = len(self.scope_stack)
-        self.scope_stack.append({"name": scope_name, "level": level})
-        
+        self.scope_stack.append({"name": scope_name, "level": level, "keys": []})
+
     def exit_scope(self):
         if len(self.scope_stack) > 1:
-            # Remove all symbols from current scope
-            scope_name = self.current_scope()["name"]
-            self.table = [entry for entry in self.table if entry['scope'] != scope_name]
-            self.scope_stack.pop()
-            
+            # Remove all symbols added in the current scope
+            for key in self.scope_stack.pop()["keys"]:
+                self.symbols.pop(key, None)
+
     def current_scope(self):
         return self.scope_stack[-1]
-    
+
     def add_symbol(self, name, symbol_type, value=None):
-        current_scope = self.current_scope()["name"]
-        
+        scope = self.current_scope()
+        key = (scope["name"], name)
+
         # Check for existing symbol in current scope
-        for entry in self.table:
-            if entry['name'] == name and entry['scope'] == current_scope:
-                return  # Skip duplicate
-                
-        self.table.append({
+        entry = self.symbols.get(key)
+        if entry is not None:
+            # The lexer registers names as plain identifiers; a later
+            # declaration supplies the real type
+            if entry['type'] == "identifier" and symbol_type != "identifier":
+                entry['type'] = symbol_type
+                entry['value'] = value
+            return  # Skip duplicate
+
+        self.symbols[key] = {
             'name': name,
             'type': symbol_type,
             'value': value,
-            'scope': current_scope
-        })
-        
+            'scope': scope["name"]
+        }
+        if "keys" in scope:
+            scope["keys"].append(key)
+
     def lookup(self, name):
+        self.lookups += 1
         # Search from current scope outwards
         for scope in reversed(self.scope_stack):
-            scope_name = scope["name"]
-            for entry in reversed(self.table):
-                if entry['name'] == name and entry['scope'] == scope_name:
-                    return entry
+            entry = self.symbols.get((scope["name"], name))
+            if entry is not None:
+                return entry
         return None
-        
+
     def update_value(self, name, value):
         symbol = self.lookup(name)
         if symbol:
             symbol['value'] = value
             return True
         return False
-        
+
+    def rows(self):
+        # [name, type, value, scope] strings for each symbol
+        return [[entry['name'], entry['type'], str(entry['value']), entry['scope']]
+                for entry in self.symbols.values()]
+
     def __str__(self):
-        headers = ["Name", "Type", "Value", "Scope"]
-        rows = [headers]
-        for entry in self.table:
-            rows.append([
-                entry['name'],
-                entry['type'],
-                str(entry['value']),
-                entry['scope']
-            ])
-        
+        rows = [["Name", "Type", "Value", "Scope"]] + self.rows()
+
         # Format as table
-        col_widths = [max(len(str(item)) for item in col) for col in zip(*rows)]
-        output = ""
-        for row in rows:
-            output += " | ".join(str(item).ljust(width) for item, width in zip(row, col_widths)) + "\n"
-        return output
\ No newline at end of file
+        col_widths = [max(len(item) for item in col) for col in zip(*rows)]
+        return "".join(" | ".join(item.ljust(width) for item, width in zip(row, col_widths)) + "\n"
+                       for row in rows)
@@ -0,0 +1,261 @@
+from collections import Counter
+
+from cancel import NEVER_CANCELLED
+from instrument import count_ast_nodes
+from loops import assignments, runs_once, walk
+from value_types import may_be_float
+
+COMMUTATIVE = {'+', '*', '==', '!='}
+# a > b is numbered as b < a
+SWAPPED = {'>': '<', '>=': '<='}
+
+
+def pure(expr):
+    # Whether evaluating `expr` has no effects
+    return not any(node[0] in ('call', 'assignment') for node in walk(expr))
+
+
+def pure_statement(stmt):
+    # Whether the statement's only effect is the assignment or declaration
+    # at its top, so its expressions can be read before it runs
+    kind = stmt[0]
+    if kind == 'declaration':
+        return stmt[3] is None or pure(stmt[3])
+    if kind == 'expression':
+        expr = stmt[1]
+        if expr[0] == 'assignment' and expr[1] and expr[1][0] == 'variable':
+            return pure(expr[2])
+        return pure(expr)
+    if kind == 'return':
+        return stmt[1] is None or pure(stmt[1])
+    if kind == 'print':
+        return all(pure(item) for item in stmt[1])
+    if kind == 'if':
+        return pure(stmt[1])
+    return False
+
+
+class ValueNumbering:
+    # Common subexpression elimination on a function body, before code
+    # generation.
+    #
+    # Every value gets a number: a variable's number changes when it is
+    # assigned, and an operation's number is looked up (hash-consed) from
+    # its operator and operand numbers, so `a + b`, `b + a` and `c + b`
+    # after `c = a;` all share one. Numbers are scoped by the dominator
+    # tree: a block sees what was computed before it on every path, the
+    # arms of an if see what was computed before the if, and what an arm
+    # computes is forgotten after it. Assignments inside an arm or a loop
+    # give the variable a new number after it; a loop also gives them one
+    # at its top, so inside the loop only values invariant in it are
+    # reused from outside. A call may assign any global in `global_names`.
+    # Assigning a value that may be converted between int and float, to or
+    # from a name in `float_names`, gives the variable a new number.
+    #
+    # A recomputed value is replaced by a variable already holding it, or
+    # by a temporary declared before the statement that first computes it,
+    # when that saves more than the temporary's store and loads cost.
+    # Loop conditions and updates are left alone, as they run more than
+    # once per statement.
+    #
+    # The body is walked twice in the same order: the first walk counts
+    # how often each first computation is reused (reuses of an operand
+    # inside a reused operation do not count), the second rewrites.
+
+    def __init__(self, stats=None, global_names=(), float_names=(), cancel=None):
+        self.stats = Counter() if stats is None else stats
+        self.cancel = cancel or NEVER_CANCELLED
+        self.global_names = set(global_names)
+        self.float_names = set(float_names)
+        self.temp_count = 0
+
+    def optimize(self, body):
+        self.reuses = Counter()
+        self.rewriting = False
+        self.walk_body(body)
+        self.rewriting = True
+        return self.walk_body(body)
+
+    def walk_body(self, body):
+        self.next_number = 0
+        self.next_site = 0
+        # name -> number of its current value
+        self.variables = {}
+        # operator and operand numbers -> number
+        self.operations = {}
+        # number -> variable that held it when it was computed, or a temporary
+        self.holders = {}
+        # number -> (first computation site, AST size) for values computed here
+        self.sites = {}
+        # Reuse events of the first walk: a site per reuse
+        self.events = []
+        # Temporaries the current statement needs declared before it
+        self.pending = []
+        body = self.block(body)
+        if not self.rewriting:
+            self.reuses = Counter(self.events)
+        return body
+
+    def new_number(self):
+        self.next_number += 1
+        return self.next_number
+
+    def kill(self, names):
+        for name in names:
+            self.variables[name] = self.new_number()
+
+    def kill_effects(self, node):
+        # New numbers for whatever `node` may assign
+        self.kill(assignments(node))
+        if any(item[0] == 'call' for item in walk(node)):
+            self.kill(self.global_names)
+
+    def block(self, body):
+        # A nested scope: values computed inside are forgotten after it
+        saved = (dict(self.variables), dict(self.operations), dict(self.holders), dict(self.sites))
+        new_body = []
+        for stmt in body:
+            new_body += self.statement(stmt)
+        self.variables, self.operations, self.holders, self.sites = saved
+        self.kill(assignments(body))
+        if any(item[0] == 'call' for item in walk(body)):
+            self.kill(self.global_names)
+        return new_body
+
+    def statement(self, stmt):
+        self.cancel.check()
+        kind = stmt[0]
+        if kind in ('while', 'for'):
+            return [self.loop(stmt)]
+        if not pure_statement(stmt):
+            self.kill_effects(stmt)
+            return [stmt]
+        self.pending = []
+        if kind == 'declaration':
+            _, var_type, name, expr = stmt
+            if expr is None:
+                self.variables[name] = self.new_number()
+            else:
+                expr, number = self.value(expr)
+                self.assign(name, number, expr)
+            stmt = (kind, var_type, name, expr)
+        elif kind == 'expression' and stmt[1][0] == 'assignment':
+            _, target, expr = stmt[1]
+            expr, number = self.value(expr)
+            self.assign(target[1], number, expr)
+            stmt = (kind, ('assignment', target, expr))
+        elif kind in ('expression', 'return'):
+            stmt = (kind, self.value(stmt[1])[0] if stmt[1] is not None else None)
+        elif kind == 'print':
+            stmt = (kind, [self.value(item)[0] for item in stmt[1]])
+        elif kind == 'if':
+            _, condition, body, else_body = stmt
+            condition = self.value(condition)[0]
+            # Declared before the if, so both arms can use them
+            pending, self.pending = self.pending, []
+            stmt = (kind, condition, self.block(body), self.block(else_body) if else_body is not None else None)
+            return pending + [stmt]
+        return self.pending + [stmt]
+
+    def assign(self, name, number, expr):
+        if name in self.float_names or may_be_float(expr, self.float_names):
+            self.variables[name] = self.new_number()
+            return
+        self.variables[name] = number
+        holder = self.holders.get(number)
+        if holder is None or self.variables.get(holder) != number:
+            self.holders[number] = name
+
+    def loop(self, stmt):
+        saved = (dict(self.variables), dict(self.operations), dict(self.holders), dict(self.sites))
+        if stmt[0] == 'while':
+            _, condition, body = stmt
+            init, updates = [], []
+        else:
+            _, init, condition, updates, body = stmt
+        new_init = []
+        for inner in init:
+            new_init += self.statement(inner)
+        # The loop's own assignments make its values differ per iteration;
+        # a block that runs once has no iterations
+        if not (condition is None and runs_once(body)):
+            self.kill_effects([condition, updates, body])
+        body = self.block(body)
+        self.variables, self.operations, self.holders, self.sites = saved
+        self.kill_effects([init, condition, updates, body])
+        if stmt[0] == 'while':
+            return ('while', condition, body)
+        return ('for', new_init, condition, updates, body)
+
+    def value(self, expr):
+        # (expr rewritten, number of its value)
+        kind = expr[0]
+        if kind == 'literal':
+            return expr, self.number(('literal', expr[1], expr[2]))
+        if kind == 'variable':
+            name = expr[1]
+            if name not in self.variables:
+                self.variables[name] = self.new_number()
+            return expr, self.variables[name]
+
+        mark = len(self.events)
+        if kind == 'unary_op':
+            operand, number = self.value(expr[2])
+            key = (expr[1], number)
+            new_expr = (kind, expr[1], operand)
+        elif kind == 'binary_op':
+            _, op, left, right = expr
+            left, left_number = self.value(left)
+            right, right_number = self.value(right)
+            new_expr = (kind, op, left, right)
+            if op in SWAPPED:
+                op, left_number, right_number = SWAPPED[op], right_number, left_number
+            elif op in COMMUTATIVE and right_number < left_number:
+                left_number, right_number = right_number, left_number
+            key = (op, left_number, right_number)
+        else:
+            return expr, self.new_number()
+
+        number = self.number(key)
+        if number in self.sites:
+            # Computed before on every path here
+            site, size = self.sites[number]
+            holder = self.holders.get(number)
+            held = holder is not None and self.variables.get(holder) == number
+            if not self.rewriting:
+                # Reuses inside this one are part of it, and a variable
+                # holding it needs no temporary
+                del self.events[mark:]
+                if not held:
+                    self.events.append(site)
+                return new_expr, number
+            if held:
+                self.stats['common-subexpression'] += 1
+                return ('variable', holder), number
+            return new_expr, number
+
+        self.next_site += 1
+        size = count_ast_nodes(expr)
+        self.sites[number] = (self.next_site, size)
+        if self.rewriting:
+            holder = self.holders.get(number)
+            if holder is not None and self.variables.get(holder) == number:
+                # A variable holds it already, e.g. after `x = a + b;`
+                self.stats['common-subexpression'] += 1
+                return ('variable', holder), number
+            reuses = self.reuses[self.next_site]
+            # Computing it once, storing it and loading it at every use
+            # must beat computing it at every use
+            if reuses * (size - 1) > 2:
+                self.temp_count += 1
+                temp = f".cse{self.temp_count}"
+                self.pending.append(('declaration', 'auto', temp, new_expr))
+                self.variables[temp] = number
+                self.holders[number] = temp
+                return ('variable', temp), number
+        return new_expr, number
+
+    def number(self, key):
+        if key not in self.operations:
+            self.operations[key] = self.new_number()
+        return self.operations[key]
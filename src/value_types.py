@@ -0,0 +1,56 @@
+FLOAT_TYPES = {'float', 'double'}
+COMPARISONS = {'<', '>', '<=', '>=', '==', '!='}
+
+
+def is_float(var_type):
+    # float and double are both 64-bit doubles, as in the VM
+    return var_type in FLOAT_TYPES
+
+
+def expression_type(expr, variable_type, return_type):
+    # 'float' or 'int' for the value of `expr`; variable_type(name) and
+    # return_type(name) give declared types. Arithmetic is float when
+    # either operand is; comparisons and ! give an int 0 or 1.
+    kind = expr[0]
+    if kind == 'literal':
+        return 'float' if expr[1] == 'float' else 'int'
+    if kind == 'variable':
+        return 'float' if is_float(variable_type(expr[1])) else 'int'
+    if kind == 'assignment':
+        target = expr[1]
+        if target and target[0] == 'variable':
+            return expression_type(target, variable_type, return_type)
+        return expression_type(expr[2], variable_type, return_type)
+    if kind == 'unary_op':
+        if expr[1] == '!':
+            return 'int'
+        return expression_type(expr[2], variable_type, return_type)
+    if kind == 'binary_op':
+        if expr[1] in COMPARISONS:
+            return 'int'
+        if 'float' in (expression_type(expr[2], variable_type, return_type),
+                       expression_type(expr[3], variable_type, return_type)):
+            return 'float'
+        return 'int'
+    if kind == 'call':
+        return 'float' if is_float(return_type(expr[1])) else 'int'
+    return 'int'
+
+
+def may_be_float(expr, float_names):
+    # Whether `expr` could involve a float, for passes that do not track
+    # scopes: `float_names` holds every name declared float anywhere
+    kind = expr[0]
+    if kind == 'literal':
+        return expr[1] == 'float'
+    if kind == 'variable':
+        return expr[1] in float_names
+    if kind == 'call':
+        return True
+    if kind == 'assignment' and expr[1] and may_be_float(expr[1], float_names):
+        return True
+    if kind in ('unary_op', 'assignment'):
+        return may_be_float(expr[2], float_names)
+    if kind == 'binary_op':
+        return may_be_float(expr[2], float_names) or may_be_float(expr[3], float_names)
+    return False
@@ -0,0 +1,214 @@
+import math
+import time
+from bytecode import (MOVE, LOAD_GLOBAL, STORE_GLOBAL, ADD, SUB, MUL, DIV, MOD, LT, GT, LE, GE,
+                      EQ, NE, NEG, NOT, JUMP, JUMP_IF_FALSE, JUMP_IF_TRUE, PRINT, RETURN, CALL, TO_FLOAT)
+
+INT_MIN = -(1 << 63)
+INT_MAX = (1 << 63) - 1
+# How many instructions run between limit checks
+CHECK_INTERVAL = 1 << 14
+# Calls deeper than this are reported as a stack overflow
+MAX_CALL_DEPTH = 100_000
+
+
+class VMError(Exception):
+    pass
+
+
+class ExecutionLimitError(VMError):
+    pass
+
+
+def wrap_int(value):
+    # Two's complement wrap-around, matching the 64-bit native code
+    return ((value - INT_MIN) & ((1 << 64) - 1)) + INT_MIN
+
+
+def format_value(value):
+    if isinstance(value, float):
+        return f"{value:g}"
+    return str(value)
+
+
+class VirtualMachine:
+    def __init__(self, max_instructions=50_000_000, time_limit=5.0):
+        self.max_instructions = max_instructions
+        self.time_limit = time_limit
+        self.output = []
+        self.instructions_executed = 0
+        self.elapsed = 0.0
+        self.return_value = None
+        self.exit_code = None
+
+    def run(self, program):
+        self.output = []
+        self.instructions_executed = 0
+        self.return_value = None
+        self.exit_code = None
+        start = time.perf_counter()
+        self.deadline = start + self.time_limit if self.time_limit else None
+        try:
+            globals_ = [0] * program.num_globals
+            self.execute(program, program.init, globals_)
+            value = self.execute(program, program.functions['main'], globals_)
+        finally:
+            self.elapsed = time.perf_counter() - start
+        self.return_value = value
+        # The process exit status only keeps the low byte
+        self.exit_code = int(value) & 0xFF
+        return self.exit_code
+
+    def execute(self, program, function, globals_, args=()):
+        # The array is the compact storage format; dispatching over a list
+        # avoids re-boxing every opcode and operand on access.
+        code = program.code.tolist()
+        functions = program.function_table
+        # Per function: its registers, followed by its constant pool in
+        # reverse so that negative register numbers index constants. A call
+        # copies the template.
+        templates = [self.frame(callee) for callee in functions]
+        regs = self.frame(function)
+        regs[:len(args)] = args
+        # (registers, return pc, destination register) of each caller
+        frames = []
+        output = self.output
+        pc = function.entry
+        # Instructions are counted per straight-line segment when control
+        # transfers, so the common path pays nothing for the limits.
+        count = self.instructions_executed
+        segment = pc
+        next_check = self.next_check(count)
+
+        while True:
+            op = code[pc]
+            a = code[pc + 1]
+            b = code[pc + 2]
+            c = code[pc + 3]
+            pc += 4
+
+            if op == MOVE:
+                regs[a] = regs[b]
+            elif op == ADD:
+                r = regs[b] + regs[c]
+                if not INT_MIN <= r <= INT_MAX and type(r) is int:
+                    r = wrap_int(r)
+                regs[a] = r
+            elif op == SUB:
+                r = regs[b] - regs[c]
+                if not INT_MIN <= r <= INT_MAX and type(r) is int:
+                    r = wrap_int(r)
+                regs[a] = r
+            elif op == MUL:
+                r = regs[b] * regs[c]
+                if not INT_MIN <= r <= INT_MAX and type(r) is int:
+                    r = wrap_int(r)
+                regs[a] = r
+            elif op == JUMP_IF_FALSE:
+                if not regs[a]:
+                    count += (pc - segment) >> 2
+                    if count >= next_check:
+                        next_check = self.check_limits(count)
+                    pc = segment = b
+            elif op == JUMP_IF_TRUE:
+                if regs[a]:
+                    count += (pc - segment) >> 2
+                    if count >= next_check:
+                        next_check = self.check_limits(count)
+                    pc = segment = b
+            elif op == JUMP:
+                count += (pc - segment) >> 2
+                if count >= next_check:
+                    next_check = self.check_limits(count)
+                pc = segment = a
+            elif op == LT:
+                regs[a] = int(regs[b] < regs[c])
+            elif op == GT:
+                regs[a] = int(regs[b] > regs[c])
+            elif op == LE:
+                regs[a] = int(regs[b] <= regs[c])
+            elif op == GE:
+                regs[a] = int(regs[b] >= regs[c])
+            elif op == EQ:
+                regs[a] = int(regs[b] == regs[c])
+            elif op == NE:
+                regs[a] = int(regs[b] != regs[c])
+            elif op == DIV or op == MOD:
+                x = regs[b]
+                y = regs[c]
+                if type(x) is int and type(y) is int:
+                    if y == 0:
+                        raise VMError("Division by zero")
+                    # C division truncates toward zero
+                    q = abs(x) // abs(y)
+                    if (x < 0) != (y < 0):
+                        q = -q
+                    regs[a] = wrap_int(q) if op == DIV else x - q * y
+                elif op == DIV:
+                    if y == 0:
+                        # IEEE result, as divsd gives in native code
+                        if x == 0 or x != x:
+                            regs[a] = math.nan
+                        else:
+                            regs[a] = math.copysign(math.inf, x) * math.copysign(1.0, y)
+                    else:
+                        regs[a] = x / y
+                else:
+                    raise VMError("Invalid operands to '%'")
+            elif op == LOAD_GLOBAL:
+                regs[a] = globals_[b]
+            elif op == STORE_GLOBAL:
+                globals_[a] = regs[b]
+            elif op == NEG:
+                r = -regs[b]
+                if r > INT_MAX and type(r) is int:
+                    r = wrap_int(r)
+                regs[a] = r
+            elif op == NOT:
+                regs[a] = int(not regs[b])
+            elif op == TO_FLOAT:
+                regs[a] = float(regs[b])
+            elif op == PRINT:
+                output.append(format_value(regs[a]))
+            elif op == CALL:
+                callee = functions[b]
+                frame = templates[b][:]
+                frame[:callee.num_params] = regs[c:c + callee.num_params]
+                if len(frames) >= MAX_CALL_DEPTH:
+                    raise VMError(f"Stack overflow: calls nested deeper than {MAX_CALL_DEPTH}")
+                frames.append((regs, pc, a))
+                regs = frame
+                count += (pc - segment) >> 2
+                if count >= next_check:
+                    next_check = self.check_limits(count)
+                pc = segment = callee.entry
+            elif op == RETURN:
+                count += (pc - segment) >> 2
+                if not frames:
+                    self.instructions_executed = count
+                    return regs[a]
+                value = regs[a]
+                regs, pc, a = frames.pop()
+                regs[a] = value
+                segment = pc
+            else:
+                raise VMError(f"Invalid opcode {op} at {pc - 4}")
+
+    def frame(self, function):
+        return [0] * function.num_registers + function.constants[::-1]
+
+    def next_check(self, count):
+        target = count + CHECK_INTERVAL
+        if self.max_instructions:
+            target = min(target, self.max_instructions)
+        return target
+
+    def check_limits(self, count):
+        self.instructions_executed = count
+        if self.max_instructions and count >= self.max_instructions:
+            raise ExecutionLimitError(f"Instruction limit of {self.max_instructions} exceeded")
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise ExecutionLimitError(f"Time limit of {self.time_limit:g}s exceeded")
+        return self.next_check(count)
+
+    def get_output(self):
+        return "".join(self.output)